@@ -6,6 +6,8 @@
 #
 # sudo apt-get install libportaudio2 libportaudiocpp0 portaudio19-dev
 # pip3 install pyaudio
+# sudo apt-get install python3-numpy (meter_level.py 用)
+# sudo apt-get install python3-scipy (truepeak, lufs_* 使用時)
 # 参考文献：https://www.s-toki.net/it/raspi-import-error/
 #
 # 【こんなときは】
@@ -13,43 +15,183 @@
 # レベルが小さいとき：amixer でマイク音量を上げる
 
 import datetime
+import argparse
 from time import sleep			# スリープ実行モジュールの取得
-import pyaudio
-from math import log10
 import sys
+try:
+	import pyaudio
+except ImportError:
+	pyaudio = None				# PCM入力(-i)のみ使用可
+import meter_level						# レベル演算エンジン(NumPy)
+import meter_display					# 演算・表示処理(スペクトラム含む)
+import meter_silence					# 無音検出(audio/meter/pico, パスは meter_display で追加)
+import meter_input						# 標準入力・FIFO・UNIXソケットからのPCM入力
+import meter_history					# レベル履歴の記録(1秒・1分・1時間)
 sys.path.append('../../radio/pi')	# audio/radio/pi/raspi_lcd #################
 import raspi_lcd
 
-raspiLcd = raspi_lcd.RaspiLcd(ignoreError=True,x=16,reset=16)	# raspiLcdの生成
+CHUNK = 1024					# Frames per buffer サンプル数
+FORMAT = pyaudio.paInt16 if pyaudio else None	# Sampling size and format paInt8/16/24/32
+CHANNELS = 1					# Number of channels モノラル=1、ステレオ=2、3以上は DISPLAYS で振り分け
+RATE  = 44100					# Sampling rate サンプリング周波数(Hz)
+ARECCARD = 0					# None uses default device. 入力カード番号
+CAPTURE = 'callback'			# コールバック方式=callback,従来方式=blocking
+STATS_INTERVAL = 10				# 処理時間の要約を表示する間隔(秒)、0で表示しない
+STATS_FILE = None				# Prometheus textfile の出力先(例 '/var/lib/prometheus/node-exporter/meter.prom')
+STATS_UDP = None				# 上記と同じ内容の UDP 送信先(例 ('127.0.0.1', 9100))
+HISTORY_FILE = None				# レベル履歴の記録先(例 '/home/pi/meter_history.dat')、局・曲毎に分けて指定可
+SILENCE_DB = -60				# 無音と判定するレベル(dB)、None で無効 (power,voltage,vu,ppm のみ)
+SILENCE_SEC = 2					# 無音と判定するまでの時間(秒)、無音中は表示を書込まない
+DISPLAY_FPS = 20				# LCDの目標フレームレート(書込みが遅い時は自動で下げる)、0で毎チャンク表示
+DISPLAYS = None					# 複数の液晶へ振り分ける時の設定(None:1台のみ) 例↓
+# DISPLAYS = [					# sda:I2C SDA(SCL=SDA+1), addr:I2Cアドレス, reset:リセット用GPIO
+# 	{'sda': 2, 'reset': 16, 'channels': [0, 1]},	# 1台目 ch1,ch2
+# 	{'sda': 5, 'reset': 26, 'channels': [2, 3]},	# 2台目 ch3,ch4 (GPIO5,6)
+# 	{'sda': 22, 'reset': 27, 'channels': [4, 5]},	# 3台目 ch5,ch6 (GPIO22,23)
+# 	{'sda': 24, 'reset': 13, 'channels': [6, 7]}	# 4台目 ch7,ch8 (GPIO24,25)
+# ]
+
+peakMode = 'power'				# power,voltage,vu,ppm,truepeak,lufs_m,lufs_s,lufs_i,spectrum,stereo
+
+# 起動オプション(-i を指定すると録音デバイスの代わりにPCMを受け取る)
+#   例 ffmpeg -re -i music.flac -f alsa default -f s16le -ac 2 -ar 44100 - | ./meter.py -i - -c 2
+parser = argparse.ArgumentParser(description='Audio Peak Meter')
+parser.add_argument('-i', '--input', help="PCM input: '-' (stdin), FIFO path or unix:SOCKET_PATH")
+parser.add_argument('-f', '--format', default='s16le', choices=list(meter_input.FORMATS),
+	help='PCM format without WAV header (default: s16le)')
+parser.add_argument('-c', '--channels', type=int, default=CHANNELS)
+parser.add_argument('-r', '--rate', type=int, default=RATE)
+parser.add_argument('-n', '--chunk', type=int, default=CHUNK, help='frames per chunk')
+parser.add_argument('-m', '--mode', default=peakMode, help='peakMode')
+parser.add_argument('--no-realtime', action='store_true', help='do not pace file input')
+parser.add_argument('--history', default=HISTORY_FILE, help='level history file (meter_history.py)')
+args = parser.parse_args()
+CHUNK = args.chunk
+CHANNELS = args.channels
+RATE = args.rate
+peakMode = args.mode
+dispAcRangeDb = meter_level.DISP_RANGE_DB.get(peakMode, 80) # 表示範囲(dB) meter_level.py 参照
+if args.input is not None:
+	CAPTURE = 'pcm'				# 標準入力・FIFO・UNIXソケット
+elif pyaudio is None:
+	print('ERROR: pyaudio is required without -i option')
+	sys.exit()
+
+lcds = []						# raspi_lcd常駐(液晶毎)
+for conf in (DISPLAYS or [{}]):
+	lcds.append(raspi_lcd.RaspiLcd(ignoreError=True,x=16,reset=conf.get('reset',16),daemon=True,
+		sda=conf.get('sda',0),addr=conf.get('addr',0)))
+raspiLcd = lcds[0]
 
 date=datetime.datetime.today()									# 日付を取得
 print(date.strftime('%Y/%m/%d %H:%M:%S'), "Example for AQM1602A/Y/Grove ----------")
-raspiLcd.print('Audio Peak Meter by bokunimo.net')
+for lcd in lcds:
+	lcd.print('Audio Peak Meter by bokunimo.net')
 sleep(5)
 
-CHUNK = 1024					# Frames per buffer サンプル数
-FORMAT = pyaudio.paInt16		# Sampling size and format サンプリング形式
-CHANNELS = 1					# Number of channels モノラル=1、ステレオ=2
-RATE  = 44100					# Sampling rate サンプリング周波数(Hz)
-ARECCARD = 0					# None uses default device. 入力カード番号
-
-peakMode = 'power'				# 電力尖頭値=power,電圧尖頭値=voltage
-if peakMode == 'power':
-	dispAcRangeDb = 40			# レベルメータ表示範囲(dB)
-elif peakMode == 'voltage':
-	dispAcRangeDb = 32			# レベルメータ表示範囲(dB)
+if CAPTURE == 'pcm':			# WAVヘッダがあればチャンネル数等はヘッダに従う
+	pcmIn = meter_input.PcmInput(args.input, CHANNELS, RATE, args.format, CHUNK, not args.no_realtime)
+	CHANNELS = pcmIn.channels
+	RATE = pcmIn.rate
+	BITS = pcmIn.bits
 else:
-	dispAcRangeDb = 80			# レベルメータ表示範囲(dB)
+	BITS = {
+		pyaudio.paInt8: 8,
+		pyaudio.paInt16: 16,
+		pyaudio.paInt24: 24,
+		pyaudio.paInt32: 32
+	}.get(FORMAT)
+	if BITS is None:
+		print('ERROR: FORMAT',FORMAT,)
+		sys.exit()
 
-if CHANNELS < 0 or CHANNELS > 2:
+if CHANNELS < 1:
 	print('ERROR: range of CHANNELS',CHANNELS,)
-	exit
+	sys.exit()
+if CHANNELS > 2 and DISPLAYS is None:
+	print('WARN: CHANNELS',CHANNELS,'shows ch1,ch2 only; set DISPLAYS')
+
+workers = None					# 液晶毎の表示スレッド(DISPLAYS 使用時)
+if DISPLAYS is not None:
+	workers = [meter_display.DisplayWorker(lcd, conf.get('channels',[0,1]), DISPLAY_FPS) for lcd, conf in zip(lcds, DISPLAYS)]
+stats = meter_display.Stats(meter_display.STAGES, STATS_INTERVAL * 1000) # 処理時間の集計
+meterDisplay = meter_display.MeterDisplay(raspiLcd, peakMode, dispAcRangeDb, CHANNELS, BITS, RATE, stats, workers, DISPLAY_FPS)
+display = meterDisplay.display	# 1チャンク分の演算と表示
+if SILENCE_DB is not None and peakMode in ('power', 'voltage', 'vu', 'ppm'):
+	silenceAc = 100 * 10 ** (SILENCE_DB / 20)	# 交流分(%)、復帰は2倍(+6dB)
+	meterDisplay.silence = meter_silence.SilenceDetector(silenceAc, silenceAc * 2, max(int(SILENCE_SEC * RATE / CHUNK), 1))
+history = None					# レベル履歴(1秒・1分・1時間毎の最小/最大/平均)
+if args.history:
+	history = meter_history.History(args.history, CHANNELS, interval=CHUNK / RATE if args.no_realtime else None,
+		chunk_sec=CHUNK / RATE)
+	meterDisplay.history = history
+
+def report(capture=None):		# 処理時間の要約を定期的に出力する
+	if DISPLAY_FPS > 0:
+		frames, unchanged, merged = meterDisplay.counts()
+		stats.count('lcd', frames)				# LCDへ書込んだ回数
+		stats.count('unchanged', unchanged)		# 表示パターンが同じで省略した回数
+		stats.count('held', merged)				# 表示せずに最大値へまとめたチャンク数
+	if meterDisplay.silence is not None:
+		stats.count('silent', meterDisplay.silence.windows)	# 無音のため演算・表示を省略したチャンク数
+	if capture is not None:
+		stats.count('overrun', capture.overflow)	# PortAudio の入力オーバーフロー
+		stats.count('dropped', capture.ring.dropped // capture.bytes) # 読み飛ばしたチャンク
+	if not stats.due():
+		return
+	print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), stats.summary())
+	try:
+		if STATS_FILE:
+			stats.write_textfile(STATS_FILE)
+		if STATS_UDP:
+			stats.send_udp(STATS_UDP)
+	except OSError as e:
+		print('WARN: stats', e)
 
-BITS = 8
-if FORMAT == pyaudio.paInt16:
-	BITS = 16					# 現状、未対応
+if CAPTURE == 'pcm':			# 再生の時計に合わせて読み出す(遅れた時は読み捨て)
+	while True:
+		t = stats.start()
+		data = pcmIn.read()
+		stats.stop('read', t)
+		if data is None:		# 入力の終了
+			break
+		if pcmIn.changed:		# 再接続した入力の形式が異なる
+			pcmIn.changed = False
+			print('PCM', pcmIn.channels, 'ch', pcmIn.bits, 'bit', pcmIn.rate, 'Hz')
+			meterDisplay.reformat(pcmIn.channels, pcmIn.bits, pcmIn.rate)
+			if history is not None and history.channels != pcmIn.channels:
+				print('WARN: history stopped, CHANNELS', pcmIn.channels)
+				history.close()	# 記録ファイルのチャンネル数は変えられない
+				history = meterDisplay.history = None
+		display(data)
+		stats.count('dropped', pcmIn.dropped)
+		report()
+	pcmIn.close()
+	meterDisplay.close()
+	if history is not None:
+		history.close()
+	sys.exit()
 
 pyAudio = pyaudio.PyAudio() 	# Instantiate PyAudio and initialize PortAudio
+
+if CAPTURE == 'callback':		# PortAudioのスレッドがリングバッファへ書き込む
+	import meter_capture		# コールバック方式の音声取得
+	capture = meter_capture.CallbackCapture(pyAudio, FORMAT, CHANNELS, RATE, ARECCARD, CHUNK)
+	while capture.is_active():
+		t = stats.start()
+		data = capture.read()	# 1チャンク分が揃うまで待つ(CPUを使わない)
+		stats.stop('read', t)
+		if data is None:
+			continue
+		display(data)
+		report(capture)
+	capture.close()
+	meterDisplay.close()
+	if history is not None:
+		history.close()
+	pyAudio.terminate()
+	sys.exit()
+
 stream = pyAudio.open(			# Open stream
 	format = FORMAT,			# Sampling size and format. 
 	channels = CHANNELS,		# Number of channels
@@ -59,86 +201,18 @@ stream = pyAudio.open(			# Open stream
 	frames_per_buffer = CHUNK	# Specifies the number of frames per buffer
 )
 
-def calc_volt2db(volt): 		# dB電圧を0～100の表示尺で応答する
-	if(volt <= 0):
-		return 0
-	i = int((20 * log10(volt/100) + dispAcRangeDb)/dispAcRangeDb * 100)
-	if i < 0:
-		i = 0
-	if i > 100:
-		i = 100
-	return i
-
-peak_i = 0
-peakLv = [0, 0]
-peakDb = [0, 0]
-vu_filter = [[],[]]
-
 while stream.is_active():		# Wait for stream to finish
-	vals = [[],[]]
-	valSum = [0.0, 0.0]
-	valDc = [0.0, 0.0]
-	valAc = [0.0, 0.0]
-	voltDc = [0.0, 0.0]
-	voltAc = [0.0, 0.0]
+	t = stats.start()
 	while stream.get_read_available() < CHUNK:
 		sleep(1e-6)
 	data = stream.read(CHUNK, exception_on_overflow=False)
+	stats.stop('read', t)
 	stream.stop_stream()
-	i=0
-	ib=0
-	prev=0
-	val=0
-	for sample in data:
-		if BITS == 16:
-			ib=int(not ib)
-			if ib:
-				prev = sample
-				continue
-			val = sample * 256 + prev 	# for little Endian
-			if val >= 32768:			# if a >= 2 ** (bytes * 8):
-				val -= 65536			# a -= 2 ** (bytes * 8)
-			val = float(val) / 65536.	# ±0.5 
-		else:
-			val = sample
-			if val >= 128:
-				val -= 256
-			val = float(val) / 256.		# ±0.5 
-		valSum[i] += val
-		vals[i].append(val)			   	# ADCから値を取得して変数valに代入
-		if CHANNELS == 2:
-			i=int(not i)
-		peak_i += 1
-	# print('DEBUG sampling, length =',len(vals[0]),len(vals[1]))
-	# print('DEBUG valSum =', valSum[0], valSum[1])
-	# print('DEBUG vals[0][0:4] =', vals[0][0:4])
-	# print('DEBUG vals[1][0:4] =', vals[1][0:4])
-	level = list()
-	for ch in range(CHANNELS):
-		valDc[ch] = valSum[ch] / float(CHUNK)
-		if peakMode == 'power': 					# 尖頭電力メータ
-			acSum = 0
-			for i in range(CHUNK):					# 区間エネルギー計算
-				acSum += abs(vals[ch][i] - valDc[ch])
-			valAc[ch] = acSum / float(CHUNK)		# サンプル数で除算しPowerに
-		elif peakMode == 'voltage': 				# 尖頭電圧メータ
-			acVpp = 0
-			for i in range(CHUNK - 1): # ピーク演算（簡易ノイズフィルタ付）
-				vpp = abs(vals[ch][i] + vals[ch][i+1] - 2 * valDc[ch])
-				if vpp > acVpp:
-					acVpp = vpp
-			valAc[ch] = acVpp / 2 / 1.41421356
-		voltDc[ch] = valDc[ch] * 100.				# 直流分ADC値を百分率(%)に変換
-		voltAc[ch] = valAc[ch] * 100.				# 交流分ADC値を百分率(%)に変換
-		if peak_i > 16:
-			peakLv[ch] = voltAc[ch]
-			if ch >= CHANNELS - 1:
-				peak_i = 0
-		if peakLv[ch] < voltAc[ch]:
-			peakLv[ch] = voltAc[ch]
-		level.append(calc_volt2db(voltAc[ch]))
-		# print('AC(%)='+str(round(voltAc[ch])),'Peak(%)='+str(round(peakLv[ch])),'Lv='+str(level))
-	raspiLcd.printBar(level)
+	display(data)
+	report()
 	stream.start_stream()
 stream.close()
+meterDisplay.close()
+if history is not None:
+	history.close()
 pyAudio.terminate()
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 オフライン再生ベンチマーク
+###############################################################################
+# マイクや LCD を接続せずに、試験信号(または WAV ファイル)をチャンク毎に
+# 演算・表示処理へ入力し、処理速度と表示内容を確認します。
+#
+#   Raspberry Pi 版  meter_display.MeterDisplay (全 peakMode)
+#                    入力は FakePyAudio → meter_capture.CallbackCapture 経由
+#                    (PyAudio が無い時は直接入力)、表示は FakeLcd で記録
+#   Pico 版          ../pico の MeterCalc, bar_row, Aqm1602 (power/voltage/vu/ppm)
+#                    I2C は FakeI2C で記録 (sim/ のスタンドインを使用)
+#
+# 試験信号：silence(無音), sweep(20Hz～20kHz対数掃引), pink(ピンクノイズ),
+#           square(クリップした1kHz矩形波), wide(Rch が逆相寄りのステレオ)
+# 組み合わせ：モノラル/ステレオ × 8/16ビット × CHUNK 256/1024/4096
+# 追加の組み合わせ(Pi版)：
+#   s24le/s32le/f32le    一時ファイルへ書き、meter_input.PcmInput 経由で変換
+#   20fps                DisplayWorker(meter_sched)経由の表示、時刻は FakeClock
+#                        (チャンク毎に再生時間だけ進める)で、表示回数も比較
+#   silence              無音検出(meter_silence)あり、gap(途中1秒が無音)等で
+#                        省略したチャンク数も比較
+#
+# 結果として、chunks/s(1秒あたりの処理チャンク数)、1チャンクあたりの処理時間の
+# パーセンタイル(μs)、1チャンクあたりの一時メモリ確保量(tracemalloc, KiB)を表示し、
+# LCD へ送った内容のCRC32を meter_bench_golden.json と比較します。
+# 演算結果を意図して変更した時は --update で golden を作り直してください。
+# (NumPy/SciPy の版によって浮動小数点の丸めが変わり、不一致となる場合があります)
+#
+# 使い方：
+#   $ cd audio/meter/pi
+#   $ ./meter_bench.py                  全ての組み合わせ
+#   $ ./meter_bench.py --quick          CHUNK=1024 のみ
+#   $ ./meter_bench.py --update         golden を更新
+#   $ ./meter_bench.py music.wav        WAV ファイルを全 peakMode で処理(golden比較なし)
+#   (その他 --no-alloc: メモリ計測なし, --pi: Pi版のみ, --pico: Pico版のみ)
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import os
+import sys
+import json
+import wave
+import zlib
+import tempfile
+import tracemalloc
+from time import perf_counter_ns
+from array import array
+import numpy as np
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(DIR, '../../radio/pi'))	# audio/radio/pi/raspi_lcd
+sys.path.append(os.path.join(DIR, '../pico'))			# audio/meter/pico
+sys.path.append(os.path.join(DIR, '../pico/sim'))		# machine, utime 等の代用
+import raspi_lcd
+import meter_display
+import meter_input
+import meter_sched
+import meter_stats
+import meter_silence
+try:
+	import meter_capture								# PyAudio が必要
+except ImportError:
+	meter_capture = None
+try:
+	import scipy										# lufs_* で必要
+except ImportError:
+	scipy = None
+from meter_calc import MeterCalc,meter_conf				# Pico版 レベル演算
+from meter_lvtable import make_thresholds,make_patterns,bar_row
+from meter_lcd import Aqm1602
+
+GOLDEN = os.path.join(DIR, 'meter_bench_golden.json')
+PEAK_MODES = ['power', 'voltage', 'vu', 'ppm', 'truepeak', 'lufs_m', 'lufs_s', 'lufs_i', 'spectrum', 'stereo']
+PICO_MODES = ['power', 'voltage', 'vu', 'ppm']
+SIGNALS = ['silence', 'sweep', 'pink', 'square', 'wide']
+PCM_SIGNALS = ['sweep', 'square']						# PcmInput 経由(24/32ビット)
+PCM_FORMATS = ['s24le', 's32le', 'f32le']
+SCHED_FPS = 20											# DisplayWorker 経由の表示
+SILENCE_SIGNALS = ['silence', 'gap']					# 無音検出あり
+SILENCE_MODES = ['power', 'voltage', 'vu', 'ppm']		# meter.py と同じ対象
+SILENCE_DB = -60										# meter.py と同じ判定レベル
+SILENCE_SEC = 0.25										# 試験信号に合わせて meter.py より短く
+CHUNKS = [256, 1024, 4096]
+RATE = 44100
+PICO_RATE = 20000										# Pico の ADC サンプリング周波数
+PICO_MAX_MV = 1000										# Pico の dispAcMaxMv
+ALLOC_CHUNKS = 32										# メモリ計測するチャンク数
+
+###############################################################################
+# 試験信号 (チャンネル×フレーム, ±1.0)
+
+def make_signal(name, channels, rate, sec):
+	n = int(rate * sec)
+	t = np.arange(n) / rate
+	if name == 'silence':
+		x = np.zeros(n)
+	elif name == 'sweep':								# 対数掃引 -6dBFS
+		f0, f1 = 20., min(20000., rate / 2)
+		k = np.log(f1 / f0)
+		x = 0.5 * np.sin(2 * np.pi * f0 * sec / k * (np.exp(t / sec * k) - 1))
+	elif name == 'pink':								# 1/f 雑音 RMS -12dBFS
+		rng = np.random.default_rng(1)
+		spec = np.fft.rfft(rng.standard_normal(n))
+		f = np.arange(len(spec))
+		spec[1:] /= np.sqrt(f[1:])
+		spec[0] = 0
+		x = np.fft.irfft(spec, n)
+		x = np.clip(x * 0.25 / np.sqrt(np.mean(x * x)), -1, 1)
+	elif name == 'square':								# 1kHz 正弦波を +12dB でクリップ
+		x = np.clip(4 * np.sin(2 * np.pi * 1000 * t), -1, 1)
+	elif name == 'wide':								# Rch は逆相 -6dB に無相関の雑音を加算
+		rng = np.random.default_rng(2)
+		x = 0.5 * np.sin(2 * np.pi * 440 * t)
+		r = -0.5 * x + 0.1 * rng.standard_normal(n)
+		return np.vstack([x, r][0:channels])
+	elif name == 'gap':									# 掃引の途中 0.5～1.5秒を無音
+		x = make_signal('sweep', 1, rate, sec)[0]
+		x[int(rate * 0.5):int(rate * 1.5)] = 0
+	else:
+		raise Exception('ERROR: signal = ' + name)
+	x = np.vstack([x * (0.5 ** ch) for ch in range(channels)])	# Rch は -6dB
+	return x
+
+def encode_pcm(x, bits):								# ±1.0 → インターリーブしたバイト列
+	if bits == 8:
+		return np.round(x.T * 127).astype(np.int8).tobytes()
+	return np.round(x.T * 32767).astype('<i2').tobytes()
+
+def encode_fmt(x, fmt):									# ±1.0 → PcmInput の形式(s24le, s32le, f32le)
+	if fmt == 'f32le':
+		return x.T.astype('<f4').tobytes()
+	if fmt == 's24le':
+		v = np.round(x.T * 8388607).astype('<i4')
+		return v.reshape(-1, 1).view(np.uint8)[:, 0:3].tobytes()	# 下位3バイト
+	return np.round(x.T * 2147483647).astype('<i4').tobytes()
+
+def read_wav(path):										# WAV → (バイト列, チャンネル, ビット, 周波数)
+	with wave.open(path, 'rb') as w:
+		channels = w.getnchannels()
+		bits = w.getsampwidth() * 8
+		rate = w.getframerate()
+		data = w.readframes(w.getnframes())
+	if bits == 8:										# WAV の8ビットは符号なし
+		data = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128).astype(np.int8).tobytes()
+	elif bits != 16:
+		raise Exception('ERROR: WAV bits = ' + str(bits))
+	if channels > 2:
+		raise Exception('ERROR: WAV channels = ' + str(channels))
+	return data, channels, bits, rate
+
+###############################################################################
+# 代用品 (PyAudio, raspi_lcd 常駐プロセス, I2C)
+
+class FakeStdin:										# raspi_lcd -f の標準入力の代わり
+	def __init__(self):
+		self.crc = 0									# 送信内容のCRC32
+		self.frames = 0
+		self.last = b''
+
+	def write(self, data):
+		self.crc = zlib.crc32(data, self.crc)
+		self.frames += 1
+		self.last = data
+
+	def flush(self):
+		pass
+
+	def close(self):
+		pass
+
+class FakeProc:											# subprocess.Popen の代わり
+	pid = 0
+
+	def __init__(self):
+		self.stdin = FakeStdin()
+
+	def poll(self):
+		return None
+
+	def wait(self, timeout=None):
+		return 0
+
+	def kill(self):
+		pass
+
+class FakeLcd(raspi_lcd.RaspiLcd):						# 送信内容を記録する LCD
+	def __init__(self, x=16):
+		with open(os.devnull, 'w') as null:
+			stdout, sys.stdout = sys.stdout, null		# 起動時のログ表示を抑制
+			try:
+				super().__init__(ignoreError=True, x=x, daemon=True)
+			finally:
+				sys.stdout = stdout
+		self.proc = FakeProc()
+		self.record = self.proc.stdin
+
+	def open(self):
+		return self.proc
+
+	def close(self):
+		pass
+
+	def __del__(self):
+		pass
+
+class FakeStream:										# PyAudio のストリームの代わり
+	def __init__(self, callback):
+		self.callback = callback
+		self.active = True
+
+	def feed(self, data, frames):						# PortAudio のスレッドの代わりに呼び出す
+		self.callback(data, frames, {}, 0)
+
+	def is_active(self):
+		return self.active
+
+	def stop_stream(self):
+		self.active = False
+
+	def close(self):
+		pass
+
+class FakePyAudio:										# pyaudio.PyAudio の代わり
+	def open(self, stream_callback=None, **kwargs):
+		self.stream = FakeStream(stream_callback)
+		return self.stream
+
+	def terminate(self):
+		pass
+
+class FakeClock:										# ticks_us の代わり(再生時間で進める)
+	MODULES = [meter_sched, meter_stats, meter_display]	# ticks_us を参照するモジュール
+
+	def __init__(self):
+		self.us = 0
+		self.saved = []
+
+	def ticks_us(self):
+		return self.us
+
+	def advance(self, us):
+		self.us += us
+
+	def __enter__(self):
+		self.saved = [m.ticks_us for m in self.MODULES]
+		for m in self.MODULES:
+			m.ticks_us = self.ticks_us
+		return self
+
+	def __exit__(self, *exc):
+		for m, f in zip(self.MODULES, self.saved):
+			m.ticks_us = f
+
+class FakeI2C:											# machine.I2C の代わり(送信内容を記録)
+	def __init__(self):
+		self.crc = 0
+		self.bytes = 0
+
+	def writeto_mem(self, addr, memaddr, buf):
+		self.crc = zlib.crc32(bytes([addr, memaddr]) + bytes(buf), self.crc)
+		self.bytes += 2 + len(buf)
+
+###############################################################################
+# 計測
+
+def percentile(t, p):
+	return int(np.percentile(t, p) / 1000) if len(t) > 0 else 0	# ns → μs
+
+class PiRun:											# Raspberry Pi 版 1通りの実行
+	def __init__(self, peakMode, data, channels, bits, rate, chunk, clock=None, silence=False):
+		self.lcd = FakeLcd()
+		self.clock = clock								# FakeClock の時は DisplayWorker 経由で表示
+		fps = SCHED_FPS if clock is not None else 0
+		self.meter = meter_display.MeterDisplay(self.lcd, peakMode, None, channels, bits, rate,
+			fps=fps, threaded=False)
+		if silence:										# meter.py と同じ無音検出(判定時間のみ短縮)
+			silenceAc = 100 * 10 ** (SILENCE_DB / 20)
+			self.meter.silence = meter_silence.SilenceDetector(silenceAc, silenceAc * 2,
+				max(int(SILENCE_SEC * rate / chunk), 1))
+		self.bytes = chunk * channels * bits // 8
+		self.chunk = chunk
+		self.chunk_us = chunk * 1000000 // rate			# 1チャンクの再生時間(μs)
+		self.data = data
+		self.record = self.lcd.record
+		self.capture = None
+		self.stream = None
+		if meter_capture is not None and bits in (8, 16):
+			fmt = {8: meter_capture.pyaudio.paInt8, 16: meter_capture.pyaudio.paInt16}[bits]
+			self.capture = meter_capture.CallbackCapture(FakePyAudio(), fmt, channels, rate, None, chunk)
+			self.stream = self.capture.stream
+
+	def chunks(self):
+		for i in range(0, len(self.data) - self.bytes + 1, self.bytes):
+			yield self.data[i:i + self.bytes]
+
+	def step(self, data):								# 1チャンク分(取得・演算・表示)
+		if self.clock is not None:
+			self.clock.advance(self.chunk_us)
+		if self.capture is not None:
+			self.stream.feed(data, self.chunk)
+			data = self.capture.read(timeout=0)
+		self.meter.display(data)
+
+	def counts(self):									# golden に加える回数
+		res = {}
+		if self.clock is not None:						# 表示回数、省略回数、最大値保持したチャンク数
+			res['frames'] = list(self.meter.counts())
+		if self.meter.silence is not None:				# 無音のため省略したチャンク数
+			res['silent'] = self.meter.silence.windows
+		return res
+
+class PcmRun(PiRun):									# PCM入力(meter_input.PcmInput)経由の実行
+	def __init__(self, peakMode, path, channels, fmt, rate, chunk):
+		self.path = path
+		self.args = (channels, rate, fmt, chunk)
+		bits = meter_input.FORMATS[fmt][1]
+		super().__init__(peakMode, None, channels, bits, rate, chunk)
+
+	def chunks(self):
+		channels, rate, fmt, chunk = self.args
+		backlog = os.path.getsize(self.path) // self.bytes + 1	# 読み捨てない(golden 比較のため)
+		pcm = meter_input.PcmInput(self.path, channels, rate, fmt, chunk, realtime=False, backlog=backlog)
+		try:
+			while True:
+				data = pcm.read()
+				if data is None:
+					return
+				yield data
+		finally:
+			pcm.close()
+
+def run_timed(run):
+	t = []
+	for data in run.chunks():
+		t0 = perf_counter_ns()
+		run.step(data)
+		t.append(perf_counter_ns() - t0)
+	return t
+
+def run_alloc(run):										# 1チャンクあたりの一時メモリ確保量(KiB)
+	chunks = run.chunks()
+	total = 0
+	n = 0
+	for i, data in zip(range(4), chunks):				# 初回の生成処理を除外
+		run.step(data)
+	tracemalloc.start()
+	for data in chunks:
+		tracemalloc.reset_peak()
+		base = tracemalloc.get_traced_memory()[0]
+		run.step(data)
+		total += tracemalloc.get_traced_memory()[1] - base
+		n += 1
+		if n >= ALLOC_CHUNKS:
+			break
+	tracemalloc.stop()
+	return total / max(n, 1) / 1024
+
+class PicoRun:											# Pico 版 1通りの実行
+	def __init__(self, peakMode, x):
+		dispAcRangeDb, dispScale, self.window = meter_conf(peakMode)
+		self.meter = MeterCalc(peakMode, self.window)
+		self.lv_th = make_thresholds(PICO_MAX_MV, dispAcRangeDb)
+		self.lv_pat = memoryview(make_patterns(dispScale))
+		self.i2c = FakeI2C()
+		self.lcd = Aqm1602(self.i2c)
+		self.lcd.init()
+		self.lcd.set_fonts(dispScale)
+		self.ticks = self.window * 1000 / PICO_RATE
+		adc = np.clip(32768 + x.T * 20000, 0, 65535).astype(np.uint16) # ADC値(交互に格納)
+		self.bufs = [array('H', adc[i:i + self.window].tobytes())
+			for i in range(0, adc.shape[0] - self.window + 1, self.window)]
+		self.record = self.i2c
+
+	def chunks(self):
+		return iter(self.bufs)
+
+	def step(self, vals):
+		valAc = self.meter.calc(vals, self.ticks)
+		for ch in range(2):
+			self.lcd.print(ch, bar_row(self.lv_th, self.lv_pat, valAc[ch], self.meter.peakAc[ch]))
+
+def result(key, run, t, alloc, golden, update, out):
+	total = sum(t)
+	res = {
+		'crc': '%08x' % run.record.crc,
+		'level': [int(v) for v in run.meter.valAc] if isinstance(run, PicoRun) else
+			(bytes(b''.join(run.meter.level)).hex() if run.meter.rows is not None else run.meter.level)
+	}
+	if isinstance(run, PiRun):
+		res.update(run.counts())
+	if update:
+		golden[key] = res
+		check = 'UPDATE'
+	elif key not in golden:
+		check = '-'
+	elif golden[key] == res:
+		check = 'OK'
+	else:
+		check = 'NG'
+	print('%-34s %9.1f %7d %7d %7d %8s %s' % (key,
+		len(t) * 1e9 / total if total > 0 else 0,
+		percentile(t, 50), percentile(t, 95), percentile(t, 99),
+		('%.1f' % alloc) if alloc is not None else '-', check))
+	out[key] = check
+	return check
+
+def bench_extra(modes, chunks, sec, alloc, golden, update, out):	# Pi版 追加の組み合わせ
+	with tempfile.TemporaryDirectory() as tmp:			# PcmInput 経由(24/32ビット)
+		for name in PCM_SIGNALS:
+			for channels in (1, 2):
+				x = make_signal(name, channels, RATE, sec)
+				for fmt in PCM_FORMATS:
+					path = os.path.join(tmp, name + '.' + fmt)
+					with open(path, 'wb') as f:
+						f.write(encode_fmt(x, fmt))
+					for chunk in chunks:
+						for peakMode in modes:
+							key = '/'.join([name, peakMode, str(channels) + 'ch', fmt, str(chunk)])
+							run = PcmRun(peakMode, path, channels, fmt, RATE, chunk)
+							t = run_timed(run)
+							kib = None
+							if alloc:
+								kib = run_alloc(PcmRun(peakMode, path, channels, fmt, RATE, chunk))
+							result(key, run, t, kib, golden, update, out)
+	with FakeClock() as clock:							# DisplayWorker 経由の表示
+		for name in SIGNALS:
+			for channels in (1, 2):
+				data = encode_pcm(make_signal(name, channels, RATE, sec), 16)
+				for chunk in chunks:
+					for peakMode in modes:
+						key = '/'.join([name, peakMode, str(channels) + 'ch', '16bit', str(chunk), str(SCHED_FPS) + 'fps'])
+						run = PiRun(peakMode, data, channels, 16, RATE, chunk, clock=clock)
+						t = run_timed(run)
+						run.meter.close()
+						kib = None
+						if alloc:
+							run_a = PiRun(peakMode, data, channels, 16, RATE, chunk, clock=clock)
+							kib = run_alloc(run_a)
+							run_a.meter.close()
+						result(key, run, t, kib, golden, update, out)
+	for name in SILENCE_SIGNALS:						# 無音検出あり
+		for channels in (1, 2):
+			data = encode_pcm(make_signal(name, channels, RATE, sec), 16)
+			for chunk in chunks:
+				for peakMode in SILENCE_MODES:
+					key = '/'.join([name, peakMode, str(channels) + 'ch', '16bit', str(chunk), 'silence'])
+					run = PiRun(peakMode, data, channels, 16, RATE, chunk, silence=True)
+					t = run_timed(run)
+					kib = None
+					if alloc:
+						kib = run_alloc(PiRun(peakMode, data, channels, 16, RATE, chunk, silence=True))
+					result(key, run, t, kib, golden, update, out)
+
+def bench(argv):
+	quick = '--quick' in argv
+	update = '--update' in argv
+	alloc = '--no-alloc' not in argv
+	pi = '--pico' not in argv
+	pico = '--pi' not in argv
+	wavs = [a for a in argv if not a.startswith('--')]
+	sec = 2.0											# 試験信号の長さ(秒)
+	chunks = [1024] if quick else CHUNKS
+	golden = {}
+	if os.path.exists(GOLDEN):
+		with open(GOLDEN) as f:
+			golden = json.load(f)
+	out = {}
+	print('capture:', 'FakePyAudio + CallbackCapture' if meter_capture else 'direct (PyAudio not installed)')
+	print('%-34s %9s %7s %7s %7s %8s %s' % ('run', 'chunks/s', 'p50us', 'p95us', 'p99us', 'KiB/ch', 'golden'))
+	modes = [m for m in PEAK_MODES if scipy is not None or not m.startswith('lufs')]
+	if pi:
+		cases = []
+		for path in wavs:
+			data, channels, bits, rate = read_wav(path)
+			for chunk in chunks:
+				cases.append((os.path.basename(path), data, channels, bits, rate, chunk))
+		if not wavs:
+			for name in SIGNALS:
+				for channels in (1, 2):
+					x = make_signal(name, channels, RATE, sec)
+					for bits in (8, 16):
+						data = encode_pcm(x, bits)
+						for chunk in chunks:
+							cases.append((name, data, channels, bits, RATE, chunk))
+		for name, data, channels, bits, rate, chunk in cases:
+			for peakMode in modes:
+				key = '/'.join([name, peakMode, str(channels) + 'ch', str(bits) + 'bit', str(chunk)])
+				run = PiRun(peakMode, data, channels, bits, rate, chunk)
+				t = run_timed(run)
+				kib = None
+				if alloc:
+					kib = run_alloc(PiRun(peakMode, data, channels, bits, rate, chunk))
+				result(key, run, t, kib, golden, update and not wavs, out)
+		if not wavs:
+			bench_extra(modes, chunks, sec, alloc, golden, update, out)
+	if pico and not wavs:
+		for name in SIGNALS:
+			x = make_signal(name, 2, PICO_RATE, sec)
+			for peakMode in PICO_MODES:
+				key = '/'.join(['pico', name, peakMode])
+				run = PicoRun(peakMode, x)
+				t = run_timed(run)
+				kib = None
+				if alloc:
+					kib = run_alloc(PicoRun(peakMode, x))
+				result(key, run, t, kib, golden, update, out)
+	if update and not wavs:
+		with open(GOLDEN, 'w') as f:
+			f.write('{\n' + ',\n'.join([json.dumps(k) + ': ' + json.dumps(golden[k])
+				for k in sorted(golden)]) + '\n}\n')	# 1行に1通り
+		print('golden updated:', GOLDEN)
+	ng = [k for k in out if out[k] == 'NG']
+	print('runs =', len(out), ', NG =', len(ng))
+	return 1 if ng else 0
+
+if __name__ == "__main__":
+	sys.exit(bench(sys.argv[1:]))
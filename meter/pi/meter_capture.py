@@ -0,0 +1,105 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 コールバック方式の音声取得
+###############################################################################
+# PyAudio のストリーム・コールバック(PortAudio のスレッド)で受け取った音声を
+# あらかじめ確保したリングバッファへ書き込み、表示側のスレッドが自分のペースで
+# 読み出します。ストリームを止めないので、チャンク間の音声が欠落しません。
+#
+# リングバッファは書込み側1つ・読出し側1つ専用で、ロックを使用しません。
+# 書込み位置 w は書込み側だけが、読出し位置 r は読出し側だけが更新します。
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import threading
+import numpy as np
+import pyaudio
+
+class RingBuffer:
+
+	def __init__(self, size):
+		self.size = size								# バッファ長(バイト)
+		self.buf = np.zeros(size, dtype=np.uint8)		# 事前確保したバッファ
+		self.w = 0										# 書込み総バイト数(書込み側のみ更新)
+		self.r = 0										# 読出し総バイト数(読出し側のみ更新)
+		self.dropped = 0								# 読み飛ばしたバイト数
+
+	def write(self, data):								# 書込み側(コールバック)
+		src = np.frombuffer(data, dtype=np.uint8)
+		n = len(src)
+		if n > self.size:								# バッファより長い時は末尾のみ
+			src = src[n - self.size:]
+			self.w += n - self.size
+			n = self.size
+		i = self.w % self.size
+		j = min(n, self.size - i)
+		self.buf[i:i + j] = src[:j]
+		self.buf[:n - j] = src[j:]						# 折り返し分
+		self.w += n										# 書込み完了後に位置を公開
+
+	def available(self):
+		return self.w - self.r
+
+	def read(self, out, backlog=None):				# 読出し側 outへ len(out) バイト
+		n = len(out)
+		while True:
+			w = self.w
+			if w - self.r < n:
+				return False							# データ不足
+			if backlog is not None and w - self.r > backlog:
+				skip = (w - self.r - n) // n * n		# 遅延が大きい時は最新側へ
+				self.dropped += skip
+				self.r += skip
+			i = self.r % self.size
+			j = min(n, self.size - i)
+			out[:j] = self.buf[i:i + j]
+			out[j:] = self.buf[:n - j]
+			if self.w + n - self.r <= self.size:		# 読出し中に上書きされていない
+				self.r += n
+				return True
+			self.dropped += n							# 上書きされた(書込み中の1チャンク分を含む)
+			self.r += n
+
+class CallbackCapture:
+
+	def __init__(self, pyAudio, format, channels, rate, device, chunk, blocks=16, backlog=4):
+		self.chunk = chunk								# 1回あたりのフレーム数
+		self.bytes = chunk * channels * pyaudio.get_sample_size(format)
+		self.ring = RingBuffer(self.bytes * blocks)		# blocks チャンク分のバッファ
+		self.backlog = self.bytes * backlog			# 許容する遅延(バイト)
+		self.out = np.empty(self.bytes, dtype=np.uint8)	# 読出し用バッファ(再利用)
+		self.event = threading.Event()
+		self.overflow = 0								# PortAudio の入力オーバーフロー回数
+		self.stream = pyAudio.open(
+			format = format,
+			channels = channels,
+			rate = rate,
+			input_device_index = device,
+			input = True,
+			frames_per_buffer = chunk,
+			stream_callback = self.callback
+		)
+
+	def callback(self, in_data, frame_count, time_info, status):
+		if status & pyaudio.paInputOverflow:
+			self.overflow += 1
+		self.ring.write(in_data)
+		self.event.set()								# 読出し側を起こす
+		return (None, pyaudio.paContinue)
+
+	def is_active(self):
+		return self.stream.is_active()
+
+	def read(self, timeout=1.0):						# 1チャンク分を待って応答する
+		while not self.ring.read(self.out, self.backlog):
+			self.event.clear()
+			if self.ring.available() >= self.bytes:
+				continue
+			if not self.event.wait(timeout):			# データ待ち(CPUを使わない)
+				return None
+		return self.out
+
+	def close(self):
+		self.stream.stop_stream()
+		self.stream.close()
@@ -0,0 +1,216 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 演算・表示処理
+###############################################################################
+# 1チャンク分のバイト列から表示内容を求め、LCD へ出力します。
+# LCD は raspi_lcd.RaspiLcd と同じ printBar / printRaw / setFonts を持つもの
+# なら何でもよく、meter_bench.py では送信内容を記録する代用品を使います。
+# 変換(decode)・演算(analysis)・表示(display)の処理時間を stats へ集計します。
+#
+#   meterDisplay = meter_display.MeterDisplay(raspiLcd, 'vu', 24, 2, 16, 44100)
+#   meterDisplay.display(data)
+#
+# fps を指定すると、演算はチャンク毎に行い、表示は DisplayWorker のスレッドが
+# 目標のフレームレートで行います(meter_sched.py)。表示までの値は最大値で保持し、
+# I2C の書込み時間に応じて表示間隔を延ばし、表示パターンが同じ時は書込みません。
+# threaded=False の時はスレッドを使わず、display の中で表示します(meter_bench.py)。
+#
+# 3チャンネル以上の時は、全チャンネルをまとめて演算し、複数の液晶へ振り分けます。
+# 液晶毎に DisplayWorker のスレッドが表示するので、液晶を増やしても1チャンク
+# 当たりの処理時間は増えません。
+#
+#   workers = [DisplayWorker(lcd1, [0, 1]), DisplayWorker(lcd2, [2, 3])]
+#   meterDisplay = meter_display.MeterDisplay(lcd1, 'vu', 24, 4, 16, 44100, displays=workers)
+#
+# silence に無音検出(meter_silence.py)を設定すると、無音の間は各チャンクの先頭
+# だけを演算(probe)し、表示の書込みを止めます。有音に戻ったチャンクから通常の
+# 演算・表示を再開します。省略したチャンク数は silence.windows で分かります。
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import os
+import sys
+import threading
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../pico')) # meter_stats, meter_sched
+import meter_level						# レベル演算エンジン(NumPy)
+import meter_spectrum					# スペクトラム・アナライザ
+import meter_stereo						# ステレオ相関・バランス・M/S
+from meter_stats import Stats			# 処理時間の集計(audio/meter/pico と共用)
+from meter_sched import FrameScheduler,ticks_us,ticks_diff # 表示スケジューラ(同上)
+
+STAGES = ['read', 'decode', 'analysis', 'display']	# 計測する段階(read は呼び出し側)
+ROW_MODES = ('spectrum', 'stereo')			# 2行分のフォント番号列を表示する peakMode
+
+class DisplayWorker:									# 1台の液晶への表示を専用スレッドで行う
+
+	def __init__(self, lcd, channels=(0, 1), fps=20, raw=False, threaded=True, stats=None):
+		self.lcd = lcd
+		self.stats = stats								# 書込み時間を display に集計(Stats)
+		self.channels = list(channels)					# 表示するチャンネル番号(1行目, 2行目)
+		self.raw = raw									# 2行分のフォント番号列(スペクトラム)を表示
+		self.sched = FrameScheduler(len(self.channels), fps) # 最大値の保持と表示間隔の調整
+		self.running = True
+		self.cond = threading.Condition()
+		self.thread = None
+		if threaded:
+			self.thread = threading.Thread(target=self.run, daemon=True)
+			self.thread.start()
+
+	def post(self, level):								# 1チャンク分の表示内容を渡す(待たない)
+		with self.cond:
+			if self.raw:
+				self.sched.put(level)					# 減衰・ピーク保持は meter_spectrum 側
+			else:
+				self.sched.hold([level[ch] if ch < len(level) else 0 for ch in self.channels])
+			self.cond.notify()
+		if self.thread is None and self.sched.due():
+			self.show(list(self.sched.take()))
+
+	def run(self):
+		while True:
+			with self.cond:
+				while self.running and not self.sched.due():
+					self.cond.wait(self.sched.wait_us() / 1000000 if self.sched.held else None)
+				if not self.running:
+					return
+				level = list(self.sched.take())			# 複製してから post を受け付ける
+			self.show(level)							# 送信中も post は待たない
+
+	def show(self, level):
+		if self.raw:
+			key = tuple(level)
+		else:											# raspi_lcd.c lcd_bar_text と同じ刻み
+			key = tuple([int(v) * self.lcd.width // 50 for v in level])
+		if not self.sched.changed(key):
+			return										# 表示パターンが同じ時は書込まない
+		t = ticks_us()
+		if self.raw:
+			self.lcd.printRaw(level[0], 1)
+			self.lcd.printRaw(level[1], 2)
+		else:
+			self.lcd.printBar(level)
+		if self.stats is not None:
+			t_end = self.stats.stop('display', t)		# 実際の書込み時間
+		else:
+			t_end = ticks_us()
+		self.sched.done(ticks_diff(t_end, t))			# 書込み時間で表示間隔を調整
+
+	def stop(self):
+		with self.cond:
+			self.running = False
+			self.cond.notify()
+		if self.thread is not None:
+			self.thread.join(timeout=1)
+			self.thread = None
+
+class MeterDisplay:
+
+	def __init__(self, lcd, peakMode='power', dispAcRangeDb=None, channels=1, bits=16, rate=44100, stats=None, displays=None, fps=0, threaded=True):
+		if dispAcRangeDb is None:
+			dispAcRangeDb = meter_level.DISP_RANGE_DB.get(peakMode, 80)
+		self.lcd = lcd									# スペクトラム表示・単一の液晶
+		self.stats = stats if stats is not None else Stats(STAGES)
+		self.displays = displays or []					# 振り分け先の DisplayWorker
+		for worker in self.displays:
+			if worker.stats is None:
+				worker.stats = self.stats
+		self.fps = fps
+		self.threaded = threaded						# False:表示間隔の経過時に display の中で表示
+		self.auto = fps > 0 and not self.displays and peakMode not in ROW_MODES # 1台の液晶も専用スレッドで表示
+		if self.auto:
+			self.displays = [DisplayWorker(lcd, range(min(channels, 2)), fps, threaded=threaded, stats=self.stats)]
+		self.raw = None									# スペクトラム表示用の DisplayWorker
+		self.peakMode = peakMode
+		self.meterLevel = meter_level.MeterLevel(peakMode, dispAcRangeDb, channels, bits, rate)
+		self.spectrum = None
+		self.stereo = None
+		self.rows = None								# 2行分のフォント番号列を求める解析(spectrum, stereo)
+		self.level = None								# 直近の表示尺(0～100) または 2行分のフォント番号列
+		self.history = None								# レベル履歴の記録先(meter_history.History)
+		self.silence = None								# 無音検出(SilenceDetector, スペクトラム以外)
+		if peakMode == 'spectrum':
+			self.spectrum = meter_spectrum.Spectrum(rate, lcd.width, rangeDb=dispAcRangeDb)
+			self.rows = self.spectrum
+		elif peakMode == 'stereo':
+			self.stereo = meter_stereo.Stereo(rate, lcd.width, rangeDb=dispAcRangeDb)
+			self.rows = self.stereo
+		if self.rows is not None:
+			lcd.setFonts(self.rows.fonts)				# 縦棒・相関バー用フォントを転送
+			if fps > 0:
+				self.raw = DisplayWorker(lcd, fps=fps, raw=True, threaded=threaded, stats=self.stats)
+
+	def reformat(self, channels, bits, rate):			# 入力形式の変更(PCM入力の再接続時)
+		rangeDb = self.meterLevel.dispAcRangeDb
+		self.meterLevel = meter_level.MeterLevel(self.peakMode, rangeDb, channels, bits, rate)
+		if self.spectrum is not None:
+			self.spectrum = meter_spectrum.Spectrum(rate, self.lcd.width, rangeDb=rangeDb)
+			self.rows = self.spectrum
+		elif self.stereo is not None:
+			self.stereo = meter_stereo.Stereo(rate, self.lcd.width, rangeDb=rangeDb)
+			self.rows = self.stereo
+		if self.auto and len(self.displays[0].channels) != min(channels, 2):
+			self.displays[0].stop()						# 表示するチャンネル数を合わせる
+			self.displays = [DisplayWorker(self.lcd, range(min(channels, 2)), self.fps, threaded=self.threaded, stats=self.stats)]
+
+	def calc(self, data):								# 1チャンク分の演算
+		stats = self.stats
+		t = stats.start()
+		vals = self.meterLevel.decode(data)
+		t = stats.stop('decode', t)
+		if self.rows is not None:
+			self.level = self.rows.calc(vals)
+		else:
+			self.level = self.meterLevel.calc_vals(vals)	# DC/AC演算と表示尺(0～100)への変換
+		stats.stop('analysis', t)
+		return self.level
+
+	def display(self, data):							# 1チャンク分の演算と表示
+		silence = self.silence if self.rows is None else None
+		if silence is not None and silence.silent:		# 無音中はチャンクの先頭のみ演算
+			ml = self.meterLevel
+			t = self.stats.start()
+			probe = ml.probe(data)						# 有音時の voltAc と同じ peakMode 毎の値
+			self.stats.stop('analysis', t)
+			if silence.update(probe):					# 判定は1チャンクに1回
+				if self.history is not None:
+					self.history.add(np.zeros(ml.channels))	# 無音として記録
+				self.stats.frame()
+				return									# 表示は書込まない
+			frames = len(data) * 8 // (ml.bits * ml.channels)
+			self.level = level = ml.calc_level(probe, frames) # 有音に復帰(指示特性は probe で更新済み)
+		else:
+			level = self.calc(data)
+			if silence is not None and silence.update(self.meterLevel.voltAc):
+				level = [0] * len(level)				# 無音になった: レベル0を最後に表示
+		if self.history is not None and self.rows is None:
+			self.history.add(self.meterLevel.voltAc)	# チャンク毎のレベル(%)
+		if self.rows is not None and self.raw is not None:
+			self.raw.post(level)						# 書込み時間は DisplayWorker が集計
+		elif self.rows is None and self.displays:
+			for worker in self.displays:
+				worker.post(level)						# 各液晶のスレッドへ渡す
+		else:
+			t = self.stats.start()
+			if self.rows is not None:
+				self.lcd.printRaw(level[0], 1)
+				self.lcd.printRaw(level[1], 2)
+			else:
+				# print('AC(%)='+str(self.meterLevel.voltAc.round()),'Peak(%)='+str(self.meterLevel.peakLv.round()),'Lv='+str(level))
+				self.lcd.printBar(level)
+			self.stats.stop('display', t)
+		self.stats.frame()
+
+	def workers(self):									# 使用中の DisplayWorker
+		if self.rows is not None:
+			return [self.raw] if self.raw is not None else []
+		return self.displays
+
+	def counts(self):									# 表示回数、省略回数、最大値保持したチャンク数
+		scheds = [worker.sched for worker in self.workers()]
+		return sum([s.frames for s in scheds]), sum([s.unchanged for s in scheds]), sum([s.merged for s in scheds])
+
+	def close(self):
+		for worker in self.displays + ([self.raw] if self.raw is not None else []):
+			worker.stop()
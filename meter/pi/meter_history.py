@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 レベル履歴の記録 (1秒・1分・1時間毎の最小/最大/平均)
+###############################################################################
+# チャンク毎のレベル(dB)を配列のリングバッファに保持し、1秒・1分・1時間毎の
+# 最小値・最大値・平均値(電力平均)を逐次求めて、固定長レコードのファイルへ
+# メモリマップ(mmap)で書き込みます。レコードの位置は時刻から決まる(時刻÷分解能を
+# 件数で割った余り)ので、先頭位置などの管理情報を書き換えることがなく、書込み途中で
+# 停止しても他のレコードは壊れません。読み出しも時刻から位置を求めるだけで、
+# 生データを走査しません。SDカードへの書出し(flush)は FLUSH_SEC 毎に行います。
+#
+#   history = meter_history.History('/home/pi/meter_history.dat', 2)
+#   history.add(voltAc)                 # チャンク毎 (voltAc: チャンネル毎の%)
+#   recs = history.query(time() - 86400, time())  # 直近1日分(分解能は自動選択)
+#
+# 記録件数(初期値) 1秒毎:1日分, 1分毎:31日分, 1時間毎:366日分
+# 2チャンネル時のファイルサイズは約 4.5 MB です。
+#
+#   $ ./meter_history.py /home/pi/meter_history.dat 3600    # 直近1時間を表示
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import os
+import sys
+import datetime
+from time import time
+import numpy as np
+
+MAGIC = b'MTRHIST1'
+HEADER = 64												# ヘッダのバイト数
+RESOLUTIONS = (1, 60, 3600)								# 分解能(秒)
+CAPACITY = (86400, 44640, 8784)							# 記録件数 1日, 31日, 366日
+FLOOR_DB = -120.											# 無音時の値(dB)
+FLUSH_SEC = 60											# ファイルへの書出し間隔(秒)
+
+def record_dtype(channels):								# 固定長レコードの形式
+	return np.dtype([
+		('t', '<u4'),									# 区間の開始時刻(UNIX時間, 0:未使用)
+		('n', '<u4'),									# 区間内のチャンク数
+		('min', '<f4', (channels,)),					# 最小値(dB)
+		('max', '<f4', (channels,)),					# 最大値(dB)
+		('mean', '<f4', (channels,))					# 電力平均(dB)
+	])
+
+class Summary:											# 1つの分解能の集計(逐次)
+
+	def __init__(self, ring, res, channels):
+		self.ring = ring								# 記録先(mmap上のレコード配列)
+		self.res = res
+		self.t = None									# 集計中の区間の開始時刻
+		self.n = 0
+		self.min = np.zeros(channels)
+		self.max = np.zeros(channels)
+		self.power = np.zeros(channels)					# 電力の合計(チャンク数で重み付け)
+
+	def start(self, t):									# 新しい区間(前回の記録があれば続ける)
+		self.t = t
+		rec = self.ring[(t // self.res) % len(self.ring)]
+		if rec['t'] == t and rec['n'] > 0:				# 再起動前の同じ区間
+			self.n = int(rec['n'])
+			self.min[:] = rec['min']
+			self.max[:] = rec['max']
+			self.power[:] = 10 ** (rec['mean'] / 10) * self.n
+		else:
+			self.n = 0
+
+	def add(self, t, mn, mx, power, n=1):				# 区間外の時は True (先に write すること)
+		t = t - t % self.res
+		if self.t != t:
+			if self.t is not None and self.n > 0:
+				return True
+			self.start(t)
+		if self.n == 0:
+			self.min[:] = mn
+			self.max[:] = mx
+			self.power[:] = power
+		else:
+			np.minimum(self.min, mn, out=self.min)
+			np.maximum(self.max, mx, out=self.max)
+			self.power += power
+		self.n += n
+		return False
+
+	def mean(self):										# 電力平均(dB)
+		return np.maximum(10 * np.log10(np.maximum(self.power / self.n, 1e-30)), FLOOR_DB)
+
+	def write(self):									# 集計中の区間をレコードへ書込む
+		rec = self.ring[(self.t // self.res) % len(self.ring)]
+		rec['t'] = 0									# 書込み中は未使用とする
+		rec['n'] = self.n
+		rec['min'] = self.min
+		rec['max'] = self.max
+		rec['mean'] = self.mean()
+		rec['t'] = self.t
+
+	def next(self):										# 区間を閉じる
+		self.t = None
+		self.n = 0
+
+class History:
+
+	def __init__(self, path, channels=None, capacity=None, interval=None, raw_sec=60, chunk_sec=0.025):
+		self.path = path
+		self.channels = channels						# None:既存のファイルに従う
+		self.capacity = capacity
+		self.open()
+		channels = self.channels
+		self.summary = [Summary(ring, res, channels) for ring, res in zip(self.rings, RESOLUTIONS)]
+		self.interval = interval						# チャンクの時間(秒) 指定時は音声の時計で記録
+		self.clock = time()
+		self.t_flush = time()
+		n = max(int(raw_sec / chunk_sec), 1)			# チャンク毎のリングバッファ(メモリ上)
+		self.raw_t = np.zeros(n)
+		self.raw = np.full((n, channels), FLOOR_DB, dtype=np.float32)
+		self.raw_n = 0									# 書込んだチャンク数(累計)
+
+	def open(self):
+		if os.path.exists(self.path):					# 既存のファイルのチャンネル数・記録件数
+			with open(self.path, 'rb') as f:
+				head = f.read(24)
+			if len(head) < 24 or head[0:8] != MAGIC:
+				raise Exception('ERROR: history file format ' + self.path)
+			conf = np.frombuffer(head[8:24], dtype='<u4').tolist()
+			if self.channels is None:
+				self.channels = conf[0]
+			if self.capacity is None:
+				self.capacity = conf[1:4]
+		if self.channels is None:
+			self.channels = 1
+		if self.capacity is None:
+			self.capacity = CAPACITY
+		self.capacity = tuple(self.capacity)
+		self.dtype = record_dtype(self.channels)
+		size = HEADER + sum(self.capacity) * self.dtype.itemsize
+		header = np.zeros(HEADER, dtype=np.uint8)
+		header[0:8] = np.frombuffer(MAGIC, dtype=np.uint8)
+		header[8:24] = np.array((self.channels,) + self.capacity, dtype='<u4').view(np.uint8)
+		if not os.path.exists(self.path):				# 新規作成(ファイルの中身は0)
+			with open(self.path, 'wb') as f:
+				f.write(header.tobytes())
+				f.truncate(size)
+		self.mm = np.memmap(self.path, dtype=np.uint8, mode='r+')
+		if len(self.mm) != size or not np.array_equal(self.mm[0:24], header[0:24]):
+			del self.mm									# チャンネル数・記録件数が異なる
+			raise Exception('ERROR: history file format ' + self.path)
+		self.rings = []
+		offset = HEADER
+		for cap in self.capacity:
+			self.rings.append(self.mm[offset:offset + cap * self.dtype.itemsize].view(self.dtype))
+			offset += cap * self.dtype.itemsize
+
+	def add(self, voltAc, t=None):						# チャンク毎のレベル(%)を記録
+		if t is None:
+			if self.interval is not None:				# 音声の時計(ファイルの一括解析用)
+				t = self.clock
+				self.clock += self.interval
+			else:
+				t = time()
+		db = 20 * np.log10(np.maximum(np.asarray(voltAc, dtype=np.float64) / 100, 1e-10))
+		db = np.maximum(db, FLOOR_DB)
+		i = self.raw_n % len(self.raw)
+		self.raw_t[i] = t
+		self.raw[i] = db
+		self.raw_n += 1
+		sec = int(t)
+		s1 = self.summary[0]
+		if s1.add(sec, db, db, 10 ** (db / 10)):		# 1秒が経過した
+			self.roll()
+			s1.add(sec, db, db, 10 ** (db / 10))
+		if time() - self.t_flush >= FLUSH_SEC:
+			self.flush()
+
+	def roll(self):										# 1秒分を記録し、1分・1時間へ集計
+		rec = self.summary[0]
+		rec.write()
+		for s in self.summary[1:]:						# 1秒分を各分解能へ加える
+			if s.add(rec.t, rec.min, rec.max, rec.power, rec.n):
+				s.write()								# 区間の最終値
+				s.next()
+				s.add(rec.t, rec.min, rec.max, rec.power, rec.n)
+			s.write()									# 集計途中の値も記録(停止時の欠損は1秒分)
+		rec.next()
+
+	def recent(self, sec=10):							# 直近 sec 秒分のチャンク毎の値
+		n = min(self.raw_n, len(self.raw))
+		idx = (self.raw_n - n + np.arange(n)) % len(self.raw)
+		t = self.raw_t[idx]
+		if n > 0:
+			idx = idx[t >= t[-1] - sec]
+		return self.raw_t[idx], self.raw[idx]
+
+	def choose(self, t0, t1, points=2000):				# 範囲に合う分解能を選ぶ
+		for res, cap in zip(RESOLUTIONS, self.capacity):
+			if (t1 - t0) / res <= points and time() - t0 <= res * cap:
+				return res
+		return RESOLUTIONS[-1]
+
+	def query(self, t0, t1, res=None):					# t0～t1 の記録(レコード配列)を応答
+		if res is None:
+			res = self.choose(t0, t1)
+		k = RESOLUTIONS.index(res)
+		ring = self.rings[k]
+		b = np.arange(int(t0) // res, int(t1) // res + 1, dtype=np.int64)
+		b = b[-len(ring):]								# 記録件数より古い区間は残っていない
+		recs = ring[b % len(ring)]						# 時刻から位置を求める(走査しない)
+		return np.array(recs[recs['t'] == b * res])		# 上書き済み・未使用を除く
+
+	def flush(self):
+		self.mm.flush()
+		self.t_flush = time()
+
+	def close(self):
+		if self.summary[0].n > 0:
+			self.roll()
+		self.flush()
+
+def main():
+	if len(sys.argv) < 2:
+		print('Usage:', sys.argv[0], 'HISTORY_FILE [SECONDS [RESOLUTION]]')
+		return
+	path = sys.argv[1]
+	sec = int(sys.argv[2]) if len(sys.argv) >= 3 else 3600
+	res = int(sys.argv[3]) if len(sys.argv) >= 4 else None
+	if not os.path.exists(path):
+		print('ERROR: no such file', path)
+		return
+	history = History(path)
+	now = time()
+	for rec in history.query(now - sec, now, res):
+		date = datetime.datetime.fromtimestamp(int(rec['t'])).strftime('%Y/%m/%d %H:%M:%S')
+		print(date, int(rec['n']), ' '.join(['%.1f/%.1f/%.1f' % v for v in zip(rec['min'], rec['mean'], rec['max'])]))
+
+if __name__ == "__main__":
+	main()
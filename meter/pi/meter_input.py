@@ -0,0 +1,228 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 PCM入力 (標準入力 / 名前付きパイプ / UNIXソケット)
+###############################################################################
+# 録音デバイスを使わずに、ffmpeg などがデコードした PCM を直接受け取ります。
+# 再生中の音声を分岐させて計測できるので、折り返し用の録音デバイスが不要です。
+#
+#   入力元   '-'                 標準入力
+#            '/tmp/meter.fifo'   名前付きパイプ(mkfifo)や通常のファイル
+#            'unix:/tmp/meter.sock'  UNIXソケット(待ち受け、切断後は再接続を待つ)
+#   形式     WAV ヘッダ(RIFF)があれば、そのチャンネル数・周波数・形式を使用
+#            なければ指定値 (s8, u8, s16le, s24le, s32le, f32le)
+#
+# チャンク毎に readinto で事前確保したバッファへ読み込みます。
+# 再生の時計(フレーム数÷周波数)に合わせて読み出し、入力が早い時は待ち(書込み側
+# は自然に待たされる)、演算が遅れた時は古いチャンクを読み捨てて追いつきます。
+#
+# 例：再生と同時に計測する
+#   $ ffmpeg -re -i music.flac -f alsa default -f s16le -ac 2 -ar 44100 - | ./meter.py -i - -c 2
+#   $ ffmpeg -i music.flac -f s16le unix:/tmp/meter.sock  (./meter.py -i unix:/tmp/meter.sock)
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import os
+import io
+import sys
+import fcntl
+import socket
+import struct
+import termios
+from time import sleep,monotonic
+import numpy as np
+
+FORMATS = {												# 形式名 → (入力ビット数, 出力ビット数)
+	's8': (8, 8), 'u8': (8, 8), 's16le': (16, 16), 's24le': (24, 24),
+	's32le': (32, 32), 'f32le': (32, 32)
+}
+
+class PcmInput:
+
+	def __init__(self, source='-', channels=1, rate=44100, fmt='s16le', chunk=1024,
+		realtime=True, backlog=4):
+		if fmt not in FORMATS:
+			raise Exception('ERROR: PCM format ' + str(fmt))
+		self.source = source
+		self.channels = channels
+		self.rate = rate								# サンプリング周波数(Hz)
+		self.fmt = fmt
+		self.chunk = chunk								# 1回あたりのフレーム数
+		self.realtime = realtime						# 再生の時計に合わせる
+		self.backlog = backlog							# 許容する遅延(チャンク数)
+		self.dropped = 0								# 読み捨てたチャンク数
+		self.sock = None								# 待ち受け用ソケット
+		self.conn = None
+		self.f = None
+		self.pre = b''									# ヘッダ判定で読んだ先頭のバイト列
+		self.changed = False							# 再接続で形式が変わった(呼び出し側が戻す)
+		self.open()
+		self.header()
+		self.alloc()
+
+	def alloc(self):									# 形式に合わせてバッファを確保
+		chunk = self.chunk
+		channels = self.channels
+		self.bits = FORMATS[self.fmt][1]				# meter_level に渡すビット数
+		self.bytes = chunk * channels * FORMATS[self.fmt][0] // 8
+		self.buf = bytearray(self.bytes * self.backlog)	# 読込み用バッファ(再利用)
+		self.mv = memoryview(self.buf)
+		self.out = self.mv[:self.bytes]
+		if self.fmt == 'f32le':							# 浮動小数点は整数に変換して渡す
+			self.f32 = np.frombuffer(self.buf, dtype='<f4')[:chunk * channels]
+			self.s32 = np.empty(chunk * channels, dtype='<i4')
+			self.out = memoryview(self.s32).cast('B')
+		self.frames = 0									# 読込み済みフレーム数(読み捨て含む)
+		self.t0 = None									# 先頭フレームの時刻
+
+	def format(self):									# (チャンネル数, 形式, 周波数)
+		return (self.channels, self.fmt, self.rate)
+
+	def open(self):
+		if self.source == '-':
+			self.f = io.FileIO(sys.stdin.fileno(), 'rb', closefd=False)
+		elif self.source.startswith('unix:'):
+			if self.sock is None:
+				path = self.source[5:]
+				if os.path.exists(path):
+					os.unlink(path)
+				self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+				self.sock.bind(path)
+				self.sock.listen(1)
+			self.conn, addr = self.sock.accept()		# 接続を待つ
+			self.f = io.FileIO(self.conn.fileno(), 'rb', closefd=False)
+		else:
+			self.f = io.FileIO(self.source, 'rb')		# FIFO は書込み側を待つ
+
+	def reopen(self):									# 入力の終了後に再接続(標準入力は終了)
+		self.close_input()
+		if self.source == '-' or not (self.source.startswith('unix:') or
+			os.path.exists(self.source) and not os.path.isfile(self.source)):
+			return False
+		fmt = self.format()
+		self.open()
+		self.header()
+		self.t0 = None
+		if self.format() != fmt:						# 新しい接続元の形式でバッファを作り直す
+			self.alloc()
+			self.changed = True
+		return True
+
+	def header(self):									# WAV ヘッダがあれば形式を読み取る
+		self.pre = b''
+		head = self.read_exact(12)
+		if head is None or head[0:4] != b'RIFF' or head[8:12] != b'WAVE':
+			self.pre = head or b''
+			return
+		while True:
+			ck = self.read_exact(8)
+			if ck is None:
+				return
+			size = struct.unpack('<I', ck[4:8])[0]
+			if ck[0:4] == b'data':						# 以降が PCM (ストリームでは size 不定)
+				return
+			body = self.read_exact(size + (size & 1))
+			if ck[0:4] == b'fmt ' and body is not None:
+				tag, channels, rate = struct.unpack('<HHI', body[0:8])
+				bits = struct.unpack('<H', body[14:16])[0]
+				if tag == 0xFFFE and size >= 26:		# WAVE_FORMAT_EXTENSIBLE
+					tag = struct.unpack('<H', body[24:26])[0]
+				if tag == 3 and bits == 32:
+					self.fmt = 'f32le'
+				elif tag == 1 and bits in (8, 16, 24, 32):
+					self.fmt = {8: 'u8', 16: 's16le', 24: 's24le', 32: 's32le'}[bits]
+				else:
+					raise Exception('ERROR: WAV format ' + str(tag) + ' ' + str(bits) + 'bit')
+				self.channels = channels
+				self.rate = rate
+
+	def read_exact(self, n):
+		b = bytearray(n)
+		return bytes(b) if self.fill(memoryview(b)) else None
+
+	def fill(self, mv):									# mv を埋めるまで読む
+		n = 0
+		if self.pre:									# ヘッダ判定で読んだ分
+			k = min(len(self.pre), len(mv))
+			mv[0:k] = self.pre[0:k]
+			self.pre = self.pre[k:]
+			n = k
+		while n < len(mv):
+			k = self.f.readinto(mv[n:])
+			if not k:
+				return False							# 入力の終了
+			n += k
+		return True
+
+	def pending(self):									# 読み出し可能なバイト数
+		try:
+			b = fcntl.ioctl(self.f.fileno(), termios.FIONREAD, b'\0\0\0\0')
+			return struct.unpack('i', b)[0]
+		except OSError:
+			return 0
+
+	def read(self):										# 1チャンク分を応答(終了時は None)
+		while True:
+			if not self.fill(self.mv[:self.bytes]):
+				if not self.reopen():
+					return None
+				continue
+			self.frames += self.chunk
+			now = monotonic()
+			if self.t0 is None:
+				self.t0 = now - self.frames / self.rate
+			lag = now - (self.t0 + self.frames / self.rate)	# 再生の時計からの遅れ(秒)
+			if lag < 0:
+				if self.realtime:
+					sleep(-lag)							# 入力が早い時は時計に合わせる
+			elif lag > self.backlog * self.chunk / self.rate:
+				skip = min(int(lag * self.rate) // self.chunk, self.pending() // self.bytes)
+				if skip > 0 and not self.skip(skip):	# 古いチャンクを読み捨てる
+					if not self.reopen():				# 読み捨て中に入力が終了した
+						return None
+					continue
+				lag = monotonic() - (self.t0 + self.frames / self.rate)
+				if lag > self.backlog * self.chunk / self.rate:
+					self.t0 += lag						# 入力が途切れていた時は時計を合わせ直す
+			return self.convert()
+
+	def skip(self, n):									# 読込み済みを捨て、n チャンク先を読む(終了時は False)
+		blocks = len(self.buf) // self.bytes
+		rest = n - 1
+		while rest > 0:									# 大きな単位で読み捨てる
+			k = min(rest, blocks)
+			if not self.fill(self.mv[:k * self.bytes]):
+				return False
+			rest -= k
+		if not self.fill(self.mv[:self.bytes]):			# 最新のチャンク
+			return False
+		self.dropped += n
+		self.frames += n * self.chunk
+		return True
+
+	def convert(self):									# meter_level が扱える形式へ
+		if self.fmt == 'u8':							# 符号なし → 符号付き
+			a = np.frombuffer(self.buf, dtype=np.uint8)[:self.bytes]
+			np.bitwise_xor(a, 0x80, out=a)
+		elif self.fmt == 'f32le':
+			np.multiply(self.f32, 2147483648., out=self.f32)
+			np.clip(self.f32, -2147483648., 2147483520., out=self.f32) # float32 で表せる範囲
+			self.s32[:] = self.f32
+		return self.out
+
+	def close_input(self):
+		if self.f is not None:
+			self.f.close()
+			self.f = None
+		if self.conn is not None:
+			self.conn.close()
+			self.conn = None
+
+	def close(self):
+		self.close_input()
+		if self.sock is not None:
+			path = self.source[5:]
+			self.sock.close()
+			self.sock = None
+			if os.path.exists(path):
+				os.unlink(path)
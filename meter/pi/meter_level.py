@@ -0,0 +1,157 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 レベル演算エンジン (NumPy版)
+###############################################################################
+# PyAudio から受け取ったバイト列を NumPy 配列としてゼロコピーで読み込み、
+# 直流分(DC)、交流分(power / voltage)、dB表示尺への変換を配列演算で行います。
+# VU / PPM の指示特性とピークホールドは meter_ballistics.py を、
+# トゥルーピークとラウドネス(LUFS)は meter_loudness.py を使用します。
+#
+# NumPy のインストールが必要です
+# sudo apt-get install python3-numpy
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../pico'))
+from meter_ballistics import VuFilter,PpmFilter,PeakHold # audio/meter/pico と共用
+import meter_loudness									# SciPy は使用時のみ必要
+
+LOUDNESS_MODES = ('truepeak', 'lufs_m', 'lufs_s', 'lufs_i') # meter_loudness.py 使用
+PCM_SCALE = {8: 256., 16: 65536., 24: 16777216., 32: 4294967296.} # ±0.5 正規化
+DISP_RANGE_DB = {										# peakMode 毎の表示範囲(dB)
+	'power':    40,
+	'voltage':  32,
+	'vu':       24,
+	'ppm':      40,
+	'truepeak': 40,										# 4倍オーバーサンプリングの真のピーク(dBTP)
+	'lufs_m':   40,										# ラウドネス -40～0 LUFS
+	'lufs_s':   40,
+	'lufs_i':   40,
+	'spectrum': 48,										# スペクトラム表示範囲(dB)
+	'stereo':   60										# M/S レベルの表示範囲(dB)、相関は ±1
+}
+
+def pcm_decode(data, bits=16, channels=1):
+	# バイト列をチャンネル毎の配列(channels × frames, ±0.5)に変換する
+	if bits == 8:
+		a = np.frombuffer(data, dtype=np.int8)			# 符号付き8ビット
+	elif bits == 16:
+		a = np.frombuffer(data, dtype='<i2')			# for little Endian
+	elif bits == 24:
+		b = np.frombuffer(data, dtype=np.uint8)			# paInt24 は3バイト詰め
+		b = b[:len(b) - len(b) % 3].reshape(-1, 3)
+		a = b[:, 0].astype(np.int32)
+		a |= b[:, 1].astype(np.int32) << 8
+		a |= b[:, 2].view(np.int8).astype(np.int32) << 16	# 上位バイトで符号拡張
+	elif bits == 32:
+		a = np.frombuffer(data, dtype='<i4')
+	else:
+		raise Exception('ERROR: bits = ' + str(bits))
+	frames = len(a) // channels
+	vals = a[:frames * channels] / PCM_SCALE[bits]	# ±0.5 の float64 に変換
+	return vals.reshape(frames, channels).T				# インターリーブをストライドで分離
+
+def calc_dc(vals):										# 直流分
+	return vals.mean(axis=1)
+
+def calc_power(vals, dc):								# 尖頭電力(平均絶対偏差)
+	return np.abs(vals - dc[:, None]).mean(axis=1)
+
+def calc_voltage(vals, dc):								# 尖頭電圧(簡易ノイズフィルタ付)
+	ac = vals - dc[:, None]
+	if ac.shape[1] < 2:
+		return np.zeros(ac.shape[0])
+	vpp = np.abs(ac[:, :-1] + ac[:, 1:]).max(axis=1)
+	return vpp / 2 / 1.41421356
+
+def calc_volt2db(volt, dispAcRangeDb=40):				# dB電圧を0～100の表示尺で応答する
+	volt = np.asarray(volt, dtype=np.float64)
+	with np.errstate(divide='ignore'):
+		db = 20 * np.log10(np.maximum(volt, 0) / 100)	# volt <= 0 は -inf
+	i = (db + dispAcRangeDb) / dispAcRangeDb * 100
+	i = np.where(volt > 0, i, 0)
+	return np.clip(i, 0, 100).astype(np.int64)			# int() と同じ0方向への切り捨て
+
+class MeterLevel:
+
+	def __init__(self, peakMode='power', dispAcRangeDb=40, channels=1, bits=16, rate=44100):
+		if channels < 1:								# 3チャンネル以上は複数の液晶に振り分ける
+			raise Exception('ERROR: range of channels ' + str(channels))
+		self.peakMode = peakMode						# power,voltage,vu,ppm
+		self.dispAcRangeDb = dispAcRangeDb				# レベルメータ表示範囲(dB)
+		self.channels = channels
+		self.bits = bits
+		self.rate = rate								# サンプリング周波数(Hz)
+		self.filters = None								# VU/PPM 指示特性(初回に生成)
+		self.loudness = None							# TruePeak / Loudness (初回に生成)
+		self.peakHold = None							# ピークホールド(初回に生成)
+		self.peakLv = np.zeros(channels)				# ピーク値(%)
+		self.voltDc = np.zeros(channels)				# 直流分(%)
+		self.voltAc = np.zeros(channels)				# 交流分(%)
+
+	def decode(self, data):
+		return pcm_decode(data, self.bits, self.channels)
+
+	def calc_ac(self, vals):							# 交流分(±0.5尺)を求める
+		dc = calc_dc(vals)
+		if self.peakMode == 'power': 					# 尖頭電力メータ
+			ac = calc_power(vals, dc)
+		elif self.peakMode == 'voltage': 				# 尖頭電圧メータ
+			ac = calc_voltage(vals, dc)
+		elif self.peakMode == 'vu':						# VUメータ(300ms平均)
+			ac = self.ballistics(calc_power(vals, dc), vals.shape[1], VuFilter)
+		elif self.peakMode == 'ppm':					# PPM(尖頭値計)
+			ac = self.ballistics(calc_voltage(vals, dc), vals.shape[1], PpmFilter)
+		elif self.peakMode in LOUDNESS_MODES:			# dBTP / LUFS
+			ac = self.calc_loudness(vals)
+		else:
+			ac = np.zeros(len(dc))
+		return dc, ac
+
+	def calc_loudness(self, vals):						# 0dBTP / 0LUFS を 1.0 (100%) で応答
+		x = vals * 2.									# ±1.0 (フルスケール) に変換
+		if self.loudness is None:
+			if self.peakMode == 'truepeak':
+				self.loudness = meter_loudness.TruePeak(self.channels)
+			else:
+				self.loudness = meter_loudness.Loudness(self.channels, self.rate)
+		if self.peakMode == 'truepeak':
+			return self.loudness.calc(x)
+		self.loudness.calc(x)
+		if self.peakMode == 'lufs_m':					# momentary 400ms
+			db = self.loudness.momentary
+		elif self.peakMode == 'lufs_s':					# short-term 3s
+			db = self.loudness.shortterm
+		else:											# integrated
+			db = self.loudness.integrated()
+		return np.full(self.channels, 10 ** (db / 20))	# 全チャンネル共通の値
+
+	def ballistics(self, ac, frames, cls):				# チャンネル毎に指示特性を適用
+		if self.filters is None:
+			self.filters = [cls(frames / self.rate * 1000) for ch in range(len(ac))]
+		return np.array([f.update(v) for f, v in zip(self.filters, ac)])
+
+	def probe(self, data, frames=64):					# 無音検出用 先頭 frames 分の交流分(%)
+		vals = self.decode(data[0:frames * self.channels * self.bits // 8])
+		dc, ac = self.calc_ac(vals)						# peakMode 毎の演算(指示特性も1チャンク分進める)
+		return ac * 100.
+
+	def calc(self, data):								# バイト列から表示尺(0～100)を求める
+		return self.calc_vals(self.decode(data))
+
+	def calc_vals(self, vals):							# 変換済みの配列から表示尺を求める
+		dc, ac = self.calc_ac(vals)
+		self.voltDc = dc * 100.							# 直流分ADC値を百分率(%)に変換
+		return self.calc_level(ac * 100., vals.shape[1])	# 交流分ADC値を百分率(%)に変換
+
+	def calc_level(self, voltAc, frames):				# 交流分(%)からピーク値と表示尺を求める
+		self.voltAc = voltAc
+		if self.peakHold is None:
+			interval = frames / self.rate * 1000
+			self.peakHold = [PeakHold(interval) for ch in range(self.channels)]
+		self.peakLv = np.array([p.update(v) for p, v in zip(self.peakHold, self.voltAc)])
+		return calc_volt2db(self.voltAc, self.dispAcRangeDb).tolist()
@@ -0,0 +1,132 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 トゥルーピーク / ラウドネス(LUFS) 演算
+###############################################################################
+# ITU-R BS.1770 / EBU R128 に準じた下記の値を、チャンク毎に配列演算で求めます。
+#
+#   TruePeak     4倍オーバーサンプリング(ポリフェーズFIR)による真のピーク(dBTP)
+#   Loudness     K特性フィルタ(2段のバイクワッド)による
+#                  momentary(400ms), short-term(3s), integrated(ゲート付き) LUFS
+#
+# フィルタの状態はチャンク間で引き継ぐので、チャンクの境界で誤差が出ません。
+# K特性フィルタに SciPy を使用します
+# sudo apt-get install python3-scipy
+#
+# 参考文献
+# ・ITU-R BS.1770-4 Algorithms to measure audio programme loudness and
+#   true-peak audio level
+# ・EBU Tech 3341 Loudness Metering: 'EBU Mode' metering
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import numpy as np
+try:
+	from scipy.signal import sosfilt
+except ImportError:
+	sosfilt = None
+
+def k_weighting(rate):									# K特性フィルタの係数(sos形式)
+	# 1段目 高域シェルフ(頭部の音響効果)
+	f0 = 1681.974450955533
+	G = 3.999843853973347
+	Q = 0.7071752369554196
+	K = np.tan(np.pi * f0 / rate)
+	Vh = 10 ** (G / 20)
+	Vb = Vh ** 0.4996667741545416
+	a0 = 1 + K / Q + K * K
+	s1 = [(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0,
+		1, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+	# 2段目 高域通過(RLB特性)
+	f0 = 38.13547087602444
+	Q = 0.5003270373238773
+	K = np.tan(np.pi * f0 / rate)
+	a0 = 1 + K / Q + K * K
+	s2 = [1, -2, 1, 1, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+	return np.array([s1, s2])
+
+def oversampling_fir(ratio=4, taps=48):					# 補間用FIR(カイザー窓付sinc)
+	n = np.arange(taps) - (taps - 1) / 2
+	h = np.sinc(n / ratio) * np.kaiser(taps, 6.0)
+	return h / h.sum() * ratio
+
+def power2lufs(z):										# 平均二乗値をLUFSへ
+	with np.errstate(divide='ignore'):
+		return -0.691 + 10 * np.log10(z)
+
+class TruePeak:
+
+	def __init__(self, channels, ratio=4, taps=48):
+		h = oversampling_fir(ratio, taps)
+		self.phases = h.reshape(-1, ratio).T[:, ::-1].copy()	# 位相毎の係数(畳み込み順)
+		self.taps = self.phases.shape[1]				# 1位相あたりのタップ数
+		self.hist = np.zeros((channels, self.taps - 1))	# 前チャンクの末尾(状態)
+
+	def calc(self, x):									# x:チャンネル×フレーム(±1.0)
+		ext = np.concatenate((self.hist, x), axis=1)
+		self.hist = ext[:, ext.shape[1] - (self.taps - 1):]
+		win = np.lib.stride_tricks.sliding_window_view(ext, self.taps, axis=1)
+		y = win @ self.phases.T							# チャンネル×フレーム×位相
+		return np.abs(y).max(axis=(1, 2))				# チャンネル毎の真のピーク(線形)
+
+class Loudness:
+
+	def __init__(self, channels, rate, weights=None):
+		if sosfilt is None:
+			raise Exception('ERROR: scipy is required, sudo apt-get install python3-scipy')
+		self.sos = k_weighting(rate)
+		self.zi = np.zeros((self.sos.shape[0], channels, 2)) # フィルタ状態
+		if weights is None:
+			weights = [1.0] * channels					# L,R,C=1.0 (Ls,Rs=1.41)
+		self.weights = np.array(weights[0:channels])
+		self.step = int(rate / 10)						# 100ms(ブロックの重なり単位)
+		self.acc = np.zeros(channels)					# 100ms区間の二乗和
+		self.acc_n = 0
+		self.ring = np.zeros((30, channels))			# 直近3秒の100ms区間平均
+		self.ring_i = 0
+		self.ring_n = 0
+		self.hist_e = np.zeros(751)						# -70～+5 LUFS 0.1LU毎の
+		self.hist_n = np.zeros(751)						# ブロックのエネルギー和と個数
+		self.momentary = -np.inf
+		self.shortterm = -np.inf
+
+	def calc(self, x):									# x:チャンネル×フレーム(±1.0)
+		y, self.zi = sosfilt(self.sos, x, axis=1, zi=self.zi)
+		sq = y * y
+		pos = 0
+		while pos < sq.shape[1]:						# 100ms区間の境界で分割
+			n = min(sq.shape[1] - pos, self.step - self.acc_n)
+			self.acc += sq[:, pos:pos + n].sum(axis=1)
+			self.acc_n += n
+			pos += n
+			if self.acc_n >= self.step:
+				self.subblock(self.acc / self.acc_n)
+				self.acc[:] = 0
+				self.acc_n = 0
+
+	def subblock(self, ms):								# 100ms区間毎の処理(一定量)
+		self.ring[self.ring_i] = ms
+		self.ring_i = (self.ring_i + 1) % 30
+		self.ring_n = min(self.ring_n + 1, 30)
+		if self.ring_n < 4:
+			return
+		idx = (self.ring_i - 1 - np.arange(4)) % 30
+		z = self.weights @ self.ring[idx].mean(axis=0)	# 400ms ブロック
+		self.momentary = power2lufs(z)
+		z3 = self.weights @ self.ring[:self.ring_n].mean(axis=0)
+		self.shortterm = power2lufs(z3) if self.ring_n >= 30 else -np.inf
+		if self.momentary > -70:						# 絶対ゲート -70 LUFS
+			i = min(int((self.momentary + 70) * 10), 750)
+			self.hist_e[i] += z
+			self.hist_n[i] += 1
+
+	def integrated(self):								# ゲート付き積算ラウドネス
+		n = self.hist_n.sum()
+		if n == 0:
+			return -np.inf
+		gate = power2lufs(self.hist_e.sum() / n) - 10	# 相対ゲート -10 LU
+		i = max(int(np.ceil((gate + 70) * 10)), 0)
+		n = self.hist_n[i:].sum()
+		if n == 0:
+			return -np.inf
+		return power2lufs(self.hist_e[i:].sum() / n)
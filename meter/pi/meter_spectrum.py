@@ -0,0 +1,79 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 スペクトラム・アナライザ
+###############################################################################
+# チャンク毎に窓関数付きの実数FFTを行い(前回のチャンクと重ねて計算)、
+# 対数間隔の16バンド(8桁LCDの時は8バンド)にまとめて、2行分の縦棒で表示します。
+# 窓関数、バンド毎のFFTビン範囲、表示用フォントは起動時に1回だけ計算します。
+#
+# 縦棒用フォント(CGRAM)
+#   0x00～0x06  高さ1～7ドット
+#   0x07        ピークホールド位置(セル上端の1ドット)
+#   0xFF        高さ8ドット(全点灯)
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import numpy as np
+
+FONT_BAR = bytes([0x1F if 8 - r <= h else 0x00 for h in range(1, 8) for r in range(8)]) \
+	+ b'\x1F\x00\x00\x00\x00\x00\x00\x00'				# 縦棒とピーク位置のフォント
+FONT_FULL = 0xFF										# 全点灯(LCDの内蔵フォント)
+FONT_PEAK = 0x07
+FONT_NONE = 0x20										# 空白
+
+class Spectrum:
+
+	def __init__(self, rate, bands=16, size=2048, fmin=40, fmax=16000, rangeDb=48,
+		decayDb=1.5, hold=20):
+		self.size = size								# FFTのサンプル数
+		self.bands = bands								# 表示バンド数(=LCDの桁数)
+		self.rangeDb = rangeDb							# 表示範囲(dB)
+		self.decayDb = decayDb							# チャンクあたりの減衰量(dB)
+		self.hold = hold								# ピークを保持するチャンク数
+		self.fonts = FONT_BAR
+		self.window = np.hanning(size)
+		self.norm = 4. / (self.window.sum() ** 2)		# フルスケール正弦波で0dB
+		self.buf = np.zeros(size)						# 直近sizeサンプル(重ね合わせ用)
+		freqs = np.fft.rfftfreq(size, 1. / rate)
+		edges = np.geomspace(fmin, min(fmax, rate / 2), bands + 1)
+		start = np.searchsorted(freqs, edges[:-1])
+		for i in range(1, bands):						# 各バンドに1ビン以上を割り当て
+			start[i] = max(start[i], start[i - 1] + 1)
+		self.start = start								# np.add.reduceat 用の開始ビン
+		self.stop = min(np.searchsorted(freqs, edges[-1]), len(freqs))
+		self.level = np.zeros(bands)					# 平滑化後のレベル(0～16)
+		self.peak = np.zeros(bands)						# ピークホールド(0～16)
+		self.peak_n = np.zeros(bands, dtype=np.int64)
+
+	def calc(self, vals):								# vals:チャンネル×フレーム(±0.5)
+		x = vals.mean(axis=0) * 2.						# モノラル化 ±1.0
+		if len(x) >= self.size:
+			self.buf[:] = x[len(x) - self.size:]
+		else:											# 前回のデータと重ねる
+			self.buf[:self.size - len(x)] = self.buf[len(x):]
+			self.buf[self.size - len(x):] = x
+		spec = np.fft.rfft(self.buf * self.window)
+		power = (spec.real ** 2 + spec.imag ** 2)[:self.stop]
+		band = np.add.reduceat(power, self.start) * self.norm
+		with np.errstate(divide='ignore'):
+			db = 10 * np.log10(band)
+		lv = np.clip((db + self.rangeDb) / self.rangeDb * 16, 0, 16)
+		self.level = np.maximum(lv, self.level - self.decayDb / self.rangeDb * 16)
+		self.peak_n += 1
+		up = (self.level >= self.peak) | (self.peak_n > self.hold)
+		self.peak = np.where(up, self.level, self.peak)
+		self.peak_n[up] = 0
+		return self.render()
+
+	def render(self):									# 2行分のフォント番号列を応答
+		h = self.level.astype(np.int64)					# 高さ 0～16 ドット
+		p = self.peak.astype(np.int64)
+		rows = []
+		for base in (8, 0):								# 1行目(上半分)、2行目(下半分)
+			c = np.clip(h - base, 0, 8)
+			row = np.where(c >= 8, FONT_FULL, np.where(c > 0, c - 1, FONT_NONE))
+			pk = (p > h) & (p - 1 >= base) & (p - 1 < base + 8) & ((h - 1) // 8 != (p - 1) // 8)
+			row = np.where(pk & (c == 0), FONT_PEAK, row)	# 縦棒より上のセルにピーク
+			rows.append(bytes(row.astype(np.uint8)))
+		return rows
@@ -0,0 +1,107 @@
+# coding: utf-8
+###############################################################################
+# Audio Peak Meter 用 ステレオ相関・バランス・M/S 解析
+###############################################################################
+# Lch,Rch の2チャンネルを組にして、位相相関(モノラル互換性)、左右バランス、
+# Mid(L+R)/Side(L-R) のレベルを求めます。チャンク毎に、直流分を除くための和と
+# L･L, L･R, R･R の内積を1回の行列積(2×2 のグラム行列)でまとめて求め、
+# 時定数 tau の指数移動平均でチャンクをまたいで平滑化します。
+# M/S のエネルギーも同じ内積から求めるので、音声データの走査は1回だけです。
+#
+#   相関係数  r = LR / √(LL･RR)      +1:モノラル, 0:無相関, -1:逆相
+#   バランス  10･log10(LL / RR) dB   +:Lch が大きい
+#   Mid/Side  (LL ± 2LR + RR) / 4    フルスケール正弦波で 0 dB
+#
+# 1行目に M/S のレベルとバランスを文字で、2行目に相関係数を ±1 の目盛付き
+# バーで表示します。バーはレベルメータ用フォント(raspi_lcd.c の font_lv)を使い、
+# 中央(0)から右へ正、左へ負の相関を半セル単位で表示します。
+#
+#   1行目 M-12 S-35 L1.5dB
+#   2行目 |   |   |   |██     (目盛 -1, -0.5, 0, +0.5)
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import numpy as np
+
+FONT_LV = bytes([										# raspi_lcd.c font_lv と同じ
+	0x00,0x10,0x00,0x10,0x00,0x10,0x00,0x10,			# 0x00 非点灯
+	0x18,0x18,0x18,0x18,0x18,0x18,0x00,0x10,			# 0x01 左半分
+	0x1B,0x1B,0x1B,0x1B,0x1B,0x1B,0x00,0x10,			# 0x02 両側
+	0x03,0x13,0x03,0x13,0x03,0x13,0x00,0x10,			# 0x03 右半分
+	0x10,0x10,0x00,0x10,0x10,0x00,0x10,0x10,			# 0x04～0x07 目盛付き
+	0x18,0x18,0x18,0x18,0x18,0x18,0x10,0x10,
+	0x1B,0x1B,0x1B,0x1B,0x1B,0x1B,0x10,0x10,
+	0x13,0x13,0x03,0x13,0x13,0x03,0x10,0x10
+])
+FS_ENERGY = 8.											# ±0.5尺のフルスケール正弦波(0.125)を 1.0 に
+MIN_ENERGY = 1e-12										# これ未満は無音(相関 0)
+
+def make_bars(width):									# 相関(半セル単位 -width～+width)→フォント番号列
+	bars = []
+	for n in range(-width, width + 1):
+		lo, hi = min(width, width + n), max(width, width + n)	# 点灯する半セルの範囲
+		row = bytearray(width)
+		for i in range(width):
+			left = lo <= 2 * i < hi
+			right = lo <= 2 * i + 1 < hi
+			row[i] = 0x02 if left and right else 0x01 if left else 0x03 if right else 0x00
+			if width >= 16 and i % 4 == 0:
+				row[i] += 0x04							# 目盛 -1, -0.5, 0, +0.5
+		bars.append(bytes(row))
+	return bars
+
+class Stereo:
+
+	def __init__(self, rate, width=16, rangeDb=60, tau=0.3):
+		self.rate = rate								# サンプリング周波数(Hz)
+		self.width = width								# LCDの桁数
+		self.rangeDb = rangeDb							# M/S の表示範囲(dB)
+		self.tau = tau									# 平滑化の時定数(秒)
+		self.fonts = FONT_LV if width >= 16 else FONT_LV[0:32]
+		self.bars = make_bars(width)
+		self.cov = np.zeros((2, 2))						# 平滑化した共分散 [[LL, LR], [LR, RR]]
+		self.init = False
+		self.corr = 0.									# 相関係数(-1～+1)
+		self.balance = 0.								# バランス(dB, +:Lch)
+		self.mid = -rangeDb								# Mid レベル(dB)
+		self.side = -rangeDb							# Side レベル(dB)
+
+	def calc(self, vals):								# vals:チャンネル×フレーム(±0.5)
+		x = vals[0:2] if len(vals) >= 2 else vals[[0, 0]]	# モノラルは L=R
+		n = x.shape[1]
+		if n == 0:
+			return self.render()
+		s = x.sum(axis=1)
+		g = x @ x.T										# LL, LR, RR を1回の行列積で
+		cov = (g - np.outer(s, s) / n) / n				# 直流分を除いた1サンプルあたりの値
+		if self.init:
+			a = np.exp(-n / (self.rate * self.tau))		# チャンク長に応じた減衰率
+			self.cov = a * self.cov + (1. - a) * cov
+		else:
+			self.cov = cov
+			self.init = True
+		ll, lr, rr = self.cov[0, 0], self.cov[0, 1], self.cov[1, 1]
+		if ll * rr > MIN_ENERGY ** 2:
+			self.corr = float(np.clip(lr / np.sqrt(ll * rr), -1., 1.))
+		else:
+			self.corr = 0.
+		self.balance = float(10 * np.log10(max(ll, MIN_ENERGY) / max(rr, MIN_ENERGY)))
+		self.mid = self.level_db((ll + 2 * lr + rr) / 4)
+		self.side = self.level_db((ll - 2 * lr + rr) / 4)
+		return self.render()
+
+	def level_db(self, energy):
+		db = 10 * np.log10(max(energy * FS_ENERGY, MIN_ENERGY))
+		return int(round(min(max(db, -self.rangeDb), 9)))
+
+	def render(self):									# 2行分のフォント番号列を応答
+		bal = min(abs(self.balance), 9.9)
+		lr = 'C' if bal < 0.05 else 'L' if self.balance > 0 else 'R'
+		if self.width >= 16:
+			text = 'M%3d S%3d %s%.1fdB' % (self.mid, self.side, lr, bal)
+		else:
+			text = 'M%3dS%3d' % (self.mid, self.side)
+		row1 = text[0:self.width].ljust(self.width).encode()
+		row2 = self.bars[int(round(self.corr * self.width)) + self.width]
+		return [row1, row2]
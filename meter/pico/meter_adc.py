@@ -0,0 +1,309 @@
+###############################################################################
+# Audio Level Meter 用 ADC取得 (RP2040 ADC FIFO + DMA)
+###############################################################################
+# RP2040 の ADC をラウンドロビン(ADC0→ADC1→ADC0…)で連続変換し、FIFO から DMA で
+# 事前確保した array('H') へ転送します。変換間隔は ADC の DIV レジスタで決まる
+# ので、サンプリング周波数は一定で、両チャンネルとも同じになります。
+# rp2.DMA が無い環境(MicroPython 1.21 未満や Linux 上での試験)では、同じ
+# バッファへ read_u16() で順に取得します(サンプリング周波数は実測値)。
+#
+# 区間の合計・平均絶対偏差・尖頭値は @micropython.viper で処理します。
+# Linux 上では sim/ のスタンドイン(machine, micropython, utime)で動作します。
+#
+# ThreadCapture は _thread でコア1を使い、2つのバッファへ交互に取得し続けます。
+# DMA を2チャンネル確保できた時は、一方の完了で他方が起動するよう連鎖させ、
+# ADC を止めずに取得します(区間の間の欠落なし)。確保できない時は区間毎に
+# 取得を再開し、その間の停止時間を gap_us に積算して coverage() に含めます。
+# コア0は取得済みのバッファを受け取って演算・表示を行います。
+#   $ cd audio/meter/pico
+#   $ PYTHONPATH=sim python3 -c "import meter_adc; ..."
+#
+# 参考文献
+# ・RP2040 Datasheet 4.9 ADC and Temperature Sensor
+#   https://datasheets.raspberrypi.com/rp2040/rp2040-datasheet.pdf
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import sys
+import _thread
+import micropython
+from array import array
+from machine import ADC
+from utime import ticks_us,ticks_diff,sleep_ms
+
+if sys.implementation.name != 'micropython':     # Linux 上での試験用
+    def ptr16(buf):                             # viper の ptr16 の代用
+        return buf
+
+ADC_BASE = 0x4004C000                   # RP2040 ADC レジスタ
+ADC_CS   = ADC_BASE + 0x00              # 制御
+ADC_FCS  = ADC_BASE + 0x08              # FIFO 制御
+ADC_FIFO = ADC_BASE + 0x0C              # FIFO 読出し
+ADC_DIV  = ADC_BASE + 0x10              # 変換間隔(48MHz / (1 + INT + FRAC/256))
+DREQ_ADC = 36                           # DMA 転送要求番号
+ADC_CLK  = 48000000
+
+@micropython.viper
+def buf_sum(buf, n: int, ofs: int, step: int) -> int:  # 区間の合計
+    p = ptr16(buf)
+    s = 0
+    i = ofs
+    end = n * step
+    while i < end:
+        s += int(p[i])
+        i += step
+    return s
+
+@micropython.viper
+def buf_absdev(buf, n: int, ofs: int, step: int, dc: int) -> int: # 絶対偏差の合計
+    p = ptr16(buf)
+    s = 0
+    i = ofs
+    end = n * step
+    while i < end:
+        d = int(p[i]) - dc
+        if d < 0:
+            d = 0 - d
+        s += d
+        i += step
+    return s
+
+@micropython.viper
+def buf_vpp(buf, n: int, ofs: int, step: int, dc: int) -> int: # 尖頭値(簡易フィルタ付)
+    p = ptr16(buf)
+    m = 0
+    i = ofs
+    end = (n - 1) * step
+    dc2 = dc * 2
+    while i < end:
+        d = int(p[i]) + int(p[i + step]) - dc2
+        if d < 0:
+            d = 0 - d
+        if d > m:
+            m = d
+        i += step
+    return m
+
+@micropython.viper
+def buf_scale12(buf, n: int):           # 12ビット値を read_u16() と同じ尺に変換
+    p = ptr16(buf)
+    i = 0
+    while i < n:
+        v = int(p[i]) & 0x0FFF
+        p[i] = (v << 4) | (v >> 8)
+        i += 1
+
+class AdcCapture:
+    def __init__(self, window, rate=20000, channels=2, mode='dma'):
+        self.window = window            # 1回あたりの計測サンプル数(チャンネル毎)
+        self.channels = channels
+        self.buf = array('H', bytes(2 * window * channels)) # 交互に格納(事前確保)
+        self.adc = [ADC(ch) for ch in range(channels)]      # ADC端子の初期化
+        self.dma = None
+        if mode == 'dma':
+            try:
+                import rp2
+                from machine import mem32
+                self.dma = rp2.DMA()
+                self.mem32 = mem32
+            except (ImportError, AttributeError):
+                self.dma = None         # DMA非対応の環境
+        self.rate = rate                # 1チャンネルあたりのサンプリング周波数(Hz)
+        if self.dma is not None:
+            self.init_dma(rate)
+
+    def init_dma(self, rate):
+        mem32 = self.mem32
+        div = ADC_CLK * 256 // (rate * self.channels) - 256   # 整数部8ビット小数部
+        if div < 96 * 256 - 256:        # 変換時間(96クロック)より短くしない
+            div = 96 * 256 - 256
+        mem32[ADC_DIV] = div            # INT(ビット8～23), FRAC(ビット0～7)
+        self.rate = ADC_CLK * 256 / (div + 256) / self.channels
+        mem32[ADC_FCS] = (1 << 0) | (1 << 3) | (1 << 24)    # EN, DREQ_EN, THRESH=1
+        self.cs = (1 << 0) | (((1 << self.channels) - 1) << 16) # EN, RROBIN
+        mem32[ADC_CS] = self.cs
+        self.ctrl = self.dma.pack_ctrl(size=1, inc_read=False, inc_write=True,
+                                       treq_sel=DREQ_ADC)
+
+    def read(self):                     # 1区間分を取得して buf を応答
+        return self.read_into(self.buf)
+
+    def read_into(self, buf):           # 1区間分を buf へ取得する
+        if self.dma is not None:
+            return self.read_dma(buf)
+        adc0 = self.adc[0]
+        adc1 = self.adc[-1]
+        n = len(buf)
+        time_start = ticks_us()
+        if self.channels == 2:
+            for i in range(0, n, 2):
+                buf[i] = adc0.read_u16()
+                buf[i + 1] = adc1.read_u16()
+        else:
+            for i in range(n):
+                buf[i] = adc0.read_u16()
+        t = ticks_diff(ticks_us(), time_start)
+        if t > 0:
+            self.rate = (n // self.channels) * 1000000 / t # 実測のサンプリング周波数
+        return buf
+
+    def read_dma(self, buf):
+        mem32 = self.mem32
+        mem32[ADC_CS] = self.cs                     # 停止・AINSEL=0 から開始
+        while not mem32[ADC_FCS] & (1 << 8):        # FIFO を空にする
+            mem32[ADC_FIFO]
+        mem32[ADC_FCS] |= (1 << 10) | (1 << 11)     # UNDER/OVER を解除
+        self.dma.config(read=ADC_FIFO, write=buf, count=len(buf),
+                        ctrl=self.ctrl, trigger=True)
+        mem32[ADC_CS] = self.cs | (1 << 3)          # START_MANY 連続変換
+        while self.dma.active():
+            pass
+        mem32[ADC_CS] = self.cs
+        buf_scale12(buf, len(buf))
+        return buf
+
+    def ticks_ms(self):                 # 1区間あたりの計測時間(ms)
+        return self.window * 1000 / self.rate
+
+class ThreadCapture(AdcCapture):        # コア1で取得し続けるダブルバッファ
+    def __init__(self, window, rate=20000, channels=2, mode='dma'):
+        super().__init__(window, rate, channels, mode)
+        self.bufs = [self.buf, array('H', bytes(2 * window * channels))]
+        self.lock = _thread.allocate_lock() # 受け渡し状態の排他用
+        self.ready = -1                 # 取得済みのバッファ番号(-1:なし)
+        self.busy = -1                  # コア0が処理中のバッファ番号
+        self.swaps = 0                  # 取得を完了したバッファ数
+        self.overrun = 0                # コア0が受け取る前に上書きした数
+        self.gap_us = 0                 # 区間と区間の間で取得していなかった時間(μs, 累計)
+        self.fifo_over = 0              # ADC FIFO が溢れた回数(連鎖DMA時)
+        self.running = True
+        self.idle = False               # True:取得を休止する(無音時)
+        self.parked = False             # True:コア1が休止中
+        self.dmas = None                # 連鎖させる2つのDMA(確保できない時は None)
+        if self.dma is not None:
+            try:
+                import rp2
+                self.dmas = [self.dma, rp2.DMA()]
+            except (ImportError, OSError):
+                self.dmas = None        # 空きチャンネルなし(区間毎に再起動)
+        if self.dmas is not None:
+            self.chain = [self.dmas[k].pack_ctrl(size=1, inc_read=False, inc_write=True,
+                treq_sel=DREQ_ADC, chain_to=self.dmas[1 - k].channel) for k in range(2)]
+            _thread.start_new_thread(self.core1_chain, ())
+        else:
+            _thread.start_new_thread(self.core1, ())
+
+    def park(self):                     # 休止中は ADC・DMA を使わない
+        self.parked = True
+        sleep_ms(1)
+
+    def publish(self, i):               # 取得済みとして公開
+        self.lock.acquire()
+        if self.ready >= 0:             # 前のバッファは未処理のまま破棄
+            self.overrun += 1
+        self.ready = i
+        self.swaps += 1
+        self.lock.release()
+
+    def core1(self):                    # コア1 取得処理(区間毎に取得を再開)
+        i = 1
+        t_end = None                    # 前の区間の取得終了時刻
+        while self.running:
+            if self.idle:
+                t_end = None            # 休止中の時間は含めない
+                self.park()
+                continue
+            self.parked = False
+            self.lock.acquire()         # 書き込むバッファを選ぶ
+            if self.ready >= 0:
+                i = 1 - self.ready
+            elif self.busy >= 0:
+                i = 1 - self.busy
+            else:
+                i = 1 - i
+            if i == self.busy:          # 一方は処理中、もう一方は未処理の時
+                i = self.ready          # 未処理のバッファを取り下げて上書き
+                self.ready = -1
+                self.overrun += 1
+            self.lock.release()
+            t = ticks_us()
+            if t_end is not None:       # FIFO の排出・DMA の再起動などで止まっていた時間
+                self.gap_us += ticks_diff(t, t_end)
+            self.read_into(self.bufs[i])
+            t_end = ticks_us()
+            self.publish(i)
+
+    def core1_chain(self):              # コア1 取得処理(2つのDMAを交互に連鎖、ADCは止めない)
+        mem32 = self.mem32
+        dmas = self.dmas
+        n = len(self.buf)
+        while self.running:
+            if self.idle:
+                self.park()
+                continue
+            self.parked = False
+            mem32[ADC_CS] = self.cs                 # 停止・AINSEL=0 から開始
+            while not mem32[ADC_FCS] & (1 << 8):    # FIFO を空にする
+                mem32[ADC_FIFO]
+            mem32[ADC_FCS] |= (1 << 10) | (1 << 11) # UNDER/OVER を解除
+            for k in range(2):                      # 区間0の完了で区間1が起動する
+                dmas[k].config(read=ADC_FIFO, write=self.bufs[k], count=n,
+                               ctrl=self.chain[k], trigger=(k == 0))
+            mem32[ADC_CS] = self.cs | (1 << 3)      # START_MANY 連続変換
+            i = 0
+            while self.running and not self.idle:
+                while dmas[i].active():             # 区間 i の完了を待つ(次の区間は取得中)
+                    pass
+                dmas[i].config(write=self.bufs[i], count=n, ctrl=self.chain[i]) # 次々回用(起動しない)
+                if mem32[ADC_FCS] & (1 << 11):      # FIFO 溢れ(サンプルの欠落)
+                    mem32[ADC_FCS] |= (1 << 11)
+                    self.fifo_over += 1
+                    self.gap_us += 2 * 1000000 // int(self.rate) # 1サンプル分以上の欠落
+                self.lock.acquire()
+                if self.busy == i:                  # 処理中のバッファへ上書きした
+                    self.overrun += 1
+                self.lock.release()
+                buf_scale12(self.bufs[i], n)
+                self.publish(i)
+                i = 1 - i
+            mem32[ADC_CS] = self.cs                 # 休止・終了時は停止
+            for dma in dmas:
+                dma.active(0)
+
+    def get(self):                      # コア0 取得済みのバッファを受け取る
+        while True:
+            self.lock.acquire()
+            i = self.ready
+            if i >= 0:
+                self.ready = -1
+                self.busy = i
+            self.lock.release()
+            if i >= 0:
+                return self.bufs[i]
+            sleep_ms(0)
+
+    def release(self):                  # コア0 バッファの処理を完了した
+        self.busy = -1
+
+    def pause(self, idle):              # コア0 取得の休止(True)・再開(False)
+        if idle:
+            self.idle = True
+            while not self.parked:      # 取得中の区間の完了を待つ
+                sleep_ms(1)
+        else:
+            self.lock.acquire()
+            self.ready = -1             # 休止前の区間は破棄
+            self.lock.release()
+            self.parked = False
+            self.idle = False
+
+    def coverage(self):                 # 入力時間のうち演算できた割合(%)
+        window_us = self.window * 1000000 / self.rate   # 区間の間の停止時間と破棄した区間を含む
+        total = self.swaps * window_us + self.gap_us
+        if total <= 0:
+            return 100.0
+        return 100.0 * max(self.swaps - self.overrun, 0) * window_us / total
+
+    def stop(self):
+        self.running = False
@@ -10,178 +10,145 @@
 
 aqm1602 = 0x3E                          # LCD AQM1602のI2Cアドレス
 
-from machine import ADC,Pin,PWM,I2C     # ライブラリmachineのADC等を組み込む
-from utime import sleep,ticks_us,ticks_diff # μtimeからsleep等を組み込む
-from math import log10                  # 対数変換用モジュールを組み込む
+from machine import Pin,PWM,I2C,freq,lightsleep # ライブラリmachineのPin等を組み込む
+from utime import sleep,sleep_ms,ticks_ms,ticks_diff # μtimeからsleepを組み込む
+from array import array
+from meter_lvtable import make_thresholds,make_patterns,level_index,bar_index # (要転送)
+from meter_adc import AdcCapture,ThreadCapture # (要転送)
+from meter_calc import MeterCalc,meter_conf # レベル演算(要転送)
+from meter_lcd import Aqm1602           # LCD制御(要転送)
+from meter_stats import Stats           # 処理時間の集計(要転送)
+from meter_sched import FrameScheduler  # 表示スケジューラ(要転送)
+from meter_silence import SilenceDetector # 無音検出(要転送)
 
 window = 1024                           # 1回あたりの計測サンプル数
+adcRate = 20000                         # サンプリング周波数(Hz) DMA使用時
+adcMode = 'dma'                         # DMA転送=dma,read_u16()で取得=loop
+dualCore = True                         # コア1で取得し続ける=True
 display = 'AC'                          # メータ切り替え
 dispAcMaxMv = 1000                      # AC入力電圧(mV rms)
-peakMode = 'vu'                    # 電力尖頭値=power,電圧尖頭値=voltage
-if peakMode == 'power':
-    dispAcRangeDb = 40                  # レベルメータ表示範囲(dB)
-    dispScale = 4                       # 罫線のセル間隔(0～8,14,15)
-elif peakMode == 'voltage':
-    dispAcRangeDb = 32                  # レベルメータ表示範囲(dB)
-    dispScale = 5                       # 罫線のセル間隔(0～8,14,15)
-elif peakMode == 'vu':
-    dispAcRangeDb = 24                  # レベルメータ表示範囲(dB)
-    dispScale = 0                       # 罫線のセル間隔(0～8,14,15)
-    window = 512                        # 1回あたりの計測サンプル数
-else:
-    dispAcRangeDb = 80                  # レベルメータ表示範囲(dB)
-    dispScale = 2                       # 罫線のセル間隔(0～8,14,15)
+peakMode = 'vu'                         # power,voltage,vu,ppm(尖頭値計)
+verbose = False                         # 計測毎に値を表示する=True
+fps = 20                                # LCDの目標フレームレート(書込みが遅い時は自動で下げる)
+statsInterval = 5000                    # 処理時間の要約を表示する間隔(ms)、0で表示しない
+lowPower = True                         # 無音時は試験区間のみ取得し、クロックを下げて待機する
+silenceMv = 3                           # 無音と判定する入力(mV, peakMode 毎の交流分)、復帰は2倍
+silenceSec = 3                          # 無音と判定するまでの時間(秒)
+probeWindow = 64                        # 無音時の試験区間のサンプル数
+lowFreq = 48000000                      # 無音時のCPUクロック(Hz)
+dispAcRangeDb, dispScale, window = meter_conf(peakMode, window)
+# 表示範囲(dB), 罫線のセル間隔(0～8,14,15), 計測サンプル数 は meter_calc.py 参照
 
 # LED 初期化処理
 led = PWM(Pin(25, Pin.OUT))             # PWM出力用インスタンスledを生成
 led.freq(60)
 
-# ADC 初期化処理
-adc0 = ADC(0)                           # ADCポート0(Pin31)用adc0を生成
-adc1 = ADC(1)                           # ADCポート1(Pin32)用adc1を生成
+# ADC 初期化処理 ADCポート0(Pin31),ADCポート1(Pin32)を交互に取得
+if dualCore:
+    adc = ThreadCapture(window, adcRate, 2, adcMode) # コア1で取得を開始
+else:
+    adc = AdcCapture(window, adcRate, 2, adcMode)
 
 # LCD 初期化処理
 lcd_vdd = Pin(3, Pin.OUT)               # GP3をAQM1602のV+ピンに接続
 lcd_i2c = I2C(0, scl=Pin(5),sda=Pin(4)) # GP5をAQM1602のSCL,GP4をSDAに接続
-lcd_vdd.value(0)                        # V+に0Vを出力
-sleep(0.5)                              # リセット・ホールド
-lcd_vdd.value(1)                        # V+用に3.3Vを出力
-sleep(0.2)                              # 起動待ち時間
-lcd_i2c.writeto_mem(aqm1602, 0x00, b'\x39\x14\x73\x5E\x6C\x38\x0C') # 参考文献1
-font_lv = [[
-    b'\x00\x01\x00\x01\x00\x01\x00\x15',
-    b'\x18\x19\x18\x19\x18\x19\x18\x15',
-    b'\x1B\x1B\x1B\x1B\x1B\x1B\x1B\x15',
-    b'\x03\x03\x03\x03\x03\x03\x03\x15'
-],[
-    b'\x00\x10\x00\x10\x00\x10\x00\x10',
-    b'\x18\x18\x18\x18\x18\x18\x00\x10',
-    b'\x1B\x1B\x1B\x1B\x1B\x1B\x00\x10',
-    b'\x03\x13\x03\x13\x03\x13\x00\x10'
-],[
-    b'\x10\x10\x00\x10\x10\x00\x10\x10',
-    b'\x18\x18\x18\x18\x18\x18\x10\x10',
-    b'\x1B\x1B\x1B\x1B\x1B\x1B\x10\x10',
-    b'\x13\x13\x03\x13\x13\x03\x10\x10'
-]]                                      # 参考文献3
-lcd_i2c.writeto_mem(aqm1602, 0x00, bytes([0x40])) # CGRAM address
-if dispScale == 0:                      # スケール表示なしの時
-    for j in range(4):                  # LCD制御 フォント4文字の転送
-        lcd_i2c.writeto_mem(aqm1602, 0x40, font_lv[0][j]) # フォント
-else:                                   # スケール表示ありの時
-    for j in range(8):                  # LCD制御 フォント8文字の転送
-        lcd_i2c.writeto_mem(aqm1602, 0x40, font_lv[1 if j<4 else 2][j%4])
-
-def lcdPrint(y, text):                  # LCDに文字を表示する関数
-    if y == 0:                                      # LCDの1行目
-        lcd_i2c.writeto_mem(aqm1602, 0x00, b'\x80') # 1行目のアドレスを設定
-    else:                                           # LCDの2行目
-        lcd_i2c.writeto_mem(aqm1602, 0x00, b'\xC0') # 2行目のアドレスを設定
-    lcd_i2c.writeto_mem(aqm1602, 0x40, bytearray(text)) # バイト列に変換して転送
-
-def calc_volt2db(volt):                 # dB電圧を0～32の表示尺で応答する
-    i = int((20 * log10(volt/dispAcMaxMv) + dispAcRangeDb)/dispAcRangeDb * 32)
-    if i < 0:
-        i = 0
-    if i > 32:
-        i = 32
-    return i
+lcd = Aqm1602(lcd_i2c, aqm1602, lcd_vdd)
+lcd.init()                              # 電源リセットと初期化
+lcd.set_fonts(dispScale)                # レベルメータ用フォントの転送
+
+lv_th = make_thresholds(dispAcMaxMv, dispAcRangeDb) # ADC値→レベル(0～32)の閾値
+lv_pat = memoryview(make_patterns(dispScale))   # (レベル,ピーク)→表示パターン
 
 led.duty_u16(0xffff)
-lcdPrint(0, 'Audio Peak Meter')
-lcdPrint(1, 'by Wataru Kunino')
+lcd.print(0, 'Audio Peak Meter')
+lcd.print(1, 'by Wataru Kunino')
 sleep(3);
 led.duty_u16(0x0000)
 
-peak_i = 0
-peakLv = [0, 0]
-peakDb = [0, 0]
-vu_filter = [[],[]]
-text = bytearray(16)
+meter = MeterCalc(peakMode, window)     # レベル演算(フィルタは初回の計測時に生成)
+stats = Stats(['read', 'analysis', 'display'], statsInterval) # ticks_us で計測
+sched = FrameScheduler(4, fps)          # 表示までの交流分・ピーク値の最大値を保持
+held = [0] * 4                          # Lch,Rch の交流分, Lch,Rch のピーク値
+silenceAdc = silenceMv * 65535 // 3300  # 無音と判定するADC値
+silence = SilenceDetector(silenceAdc, silenceAdc * 2, max(int(silenceSec * 1000 / adc.ticks_ms()), 1))
+probeBuf = array('H', bytes(2 * probeWindow * 2)) # 試験区間(Lch,Rch交互)
+probeAc = [0]                           # 試験区間の交流分(全チャンネルの最大値)
+cpuFreq = freq()                        # 通常時のCPUクロック
+slept = 0                               # 無音時に待機した時間(ms, 累計)
+
+def report():                           # 一定間隔で要約を表示
+    stats.count('saved', lcd.saved_sum)         # 差分転送で削減したバイト数
+    stats.count('lcd', sched.frames)            # LCDへ書込んだ回数
+    stats.count('unchanged', sched.unchanged)   # 表示パターンが同じで省略した回数
+    stats.count('silent', silence.windows)      # 無音のため演算・表示を省略した区間
+    stats.count('sleep_ms', slept)              # 無音時に待機した時間(ms)
+    info = 'Fs(kHz)='+str(round(adc.rate / 1000,1)) + ' fps='+str(sched.fps())
+    if dualCore:
+        stats.count('swap', adc.swaps)
+        stats.count('overrun', adc.overrun)     # 演算が間に合わず破棄した区間
+        stats.count('gap_us', adc.gap_us)       # 区間の間で取得していなかった時間
+        info += ' coverage(%)='+str(round(adc.coverage(), 2)) # 入力時間のうち演算できた割合
+    print(stats.summary(), info)
+
 while True:                             # 繰り返し処理
-    vals = [[],[]]
-    valSum = [0, 0]
-    valDc = [0, 0]
-    valAc = [0, 0]
-    voltDc = [0.0, 0.0]
-    voltAc = [0.0, 0.0]
-    time_start = ticks_us()
-    for i in range(window):
-        adc = adc0.read_u16()
-        valSum[0] += adc
-        vals[0].append(adc)             # ADCから値を取得して変数valに代入
-        adc = adc1.read_u16()
-        valSum[1] += adc
-        vals[1].append(adc)             # ADCから値を取得して変数valに代入
-    ticks_adc = ticks_diff(ticks_us(),time_start) / 1000
-    freq_adc = round(window / ticks_adc,1)
-    peak_i += 1
-    for ch in range(2):
-        valDc[ch] = int(valSum[ch] / window + 0.5)
-        if peakMode == 'power':                     # 尖頭電力メータ
-            acSum = 0
-            for i in range(window):                 # 区間エネルギー計算
-                acSum += abs(vals[ch][i] - valDc[ch])
-            valAc[ch] = int(acSum / window + 0.5)   # サンプル数で除算しPowerに
-        elif peakMode == 'voltage':                 # 尖頭電圧メータ
-            acVpp = 0
-            for i in range(window - 1): # ピーク演算（簡易ノイズフィルタ付）
-                vpp = abs(vals[ch][i] + vals[ch][i+1] - 2 * valDc[ch])
-                if vpp > acVpp:
-                    acVpp = vpp
-            valAc[ch] = int(acVpp / 2 / 1.41421356 + 0.5)
-        elif peakMode == 'vu':                      # VUメータ
-            acSum = 0
-            for i in range(window):                 # 区間エネルギー計算
-                acSum += abs(vals[ch][i] - valDc[ch])
-            vu_filter[ch].append(int(acSum / window + 0.5))
-            i_num = len(vu_filter[ch])
-            while i_num > 1 and i_num > int(200/ticks_adc):
-                del vu_filter[ch][0]
-                i_num -= 1
-            valAc[ch] = 0
-            for i in range(i_num):
-                valAc[ch] += vu_filter[ch][i]
-            valAc[ch] //= i_num
-        voltDc[ch] = valDc[ch] * 3300 / 65535       # 直流分ADC値を電圧(mV)に変換
-        voltAc[ch] = valAc[ch] * 3300 / 65535       # 交流分ADC値を電圧(mV)に変換
-        if peak_i > 16:
-            peakLv[ch] = voltAc[ch]
-            if ch >= 1:
-                peak_i = 0
-        if peakLv[ch] < voltAc[ch]:
-            peakLv[ch] = voltAc[ch]
-            peakDb[ch] = calc_volt2db(voltAc[ch])
-        if display == 'AC':
-            level = calc_volt2db(voltAc[ch])
-            if level < 0:
-                level = 0
-            if level > dispAcRangeDb:
-                level = dispAcRangeDb
-            for i in range(16):
-                i22 = i * 2 + 1                 # セルの右側に相当するレベル値
-                if i < level // 2:              # セル位置がレベル未満の時
-                    text[i] = 0x02              # セルの両側を点灯
-                elif i == level // 2:           # セル位置がレベル位置の時
-                    if i22 == level or i22 == peakDb[ch]:   # セルの右までの時
-                        text[i] = 0x02          # セルの両側を点灯
-                    else:                       # (セルの左までの時)
-                        if i==0 and peakDb[ch] == 0:
-                            text[i] = 0x00      # レベルなし
-                        else:
-                            text[i] = 0x01      # セルの左側を点灯
-                elif i > 0 and i == peakDb[ch] // 2: # ピーク単独表示位置の時
-                    if i22 == peakDb[ch]:       # ピーク位置が右側のとき
-                        text[i] = 0x03          # セルの右側のみ単独点灯
-                    else:                       # (ピーク位置が左側の時)
-                        text[i] = 0x01          # セルの左側を点灯
-                else:                           # 点灯条件に該当しないとき
-                    text[i] = 0x00              # 非点灯表示
-                if dispScale > 0 and i % dispScale == 0 and text[i] < 0x04:
-                    text[i] += 0x04
-            lcdPrint(ch, text)
-            print('Fs(kHz)='+str(freq_adc),'AC(mV)='+str(round(voltAc[ch])),'Peak(mV)='+str(round(peakLv[ch])),'Lv='+str(level))
+    if silence.silent:                  # 無音中は1区間毎に試験区間のみ取得して判定
+        t = ticks_ms()
+        wait = int(adc.window * 1000 / adc.rate) - probeWindow * 1000 // int(adc.rate) # 1区間内に復帰
+        if dualCore:
+            sleep_ms(wait)              # コア1は休止中(lightsleep は使わない)
+        else:
+            lightsleep(wait)
+        slept += ticks_diff(ticks_ms(), t)
+        adc.read_into(probeBuf)
+        probeAc[0] = meter.probe(probeBuf, probeWindow)
+        if not silence.update(probeAc): # 有音に復帰
+            freq(cpuFreq)
+            if dualCore:
+                adc.pause(False)        # コア1の取得を再開
+        if stats.due():
+            report()
+        continue
+    t = stats.start()
+    if dualCore:
+        vals = adc.get()                # コア1が取得済みのバッファを受け取る
+    else:
+        vals = adc.read()               # Lch,Rchを交互に格納した array('H')
+    t = stats.stop('read', t)
+    ticks_adc = adc.ticks_ms()          # 1回あたりの計測時間(ms)
+    valAc = meter.calc(vals, ticks_adc) # 直流分・交流分・ピーク値(ADC値)
+    peakAc = meter.peakAc
+    if dualCore:
+        adc.release()                   # バッファをコア1へ返却(表示中も取得を継続)
+    t = stats.stop('analysis', t)
+    held[0] = valAc[0]; held[1] = valAc[1]; held[2] = peakAc[0]; held[3] = peakAc[1]
+    sched.hold(held)                    # 表示するまで最大値を保持(ピークを逃さない)
+    if display == 'AC' and sched.due(): # 目標のフレームレートで表示
+        vals_lv = sched.take()
+        p0 = bar_index(lv_th, vals_lv[0], vals_lv[2])  # 表示パターンの位置
+        p1 = bar_index(lv_th, vals_lv[1], vals_lv[3])
+        if sched.changed(p0 * 65536 + p1):  # 表示パターンが変わった時のみ書込む
+            lcd.print(0, lv_pat[p0:p0 + 16])
+            lcd.print(1, lv_pat[p1:p1 + 16])
+            sched.done(ticks_diff(stats.stop('display', t), t)) # 書込み時間で表示間隔を調整
+    stats.frame()
+    if lowPower and silence.update(valAc):  # 無音になった
+        p0 = bar_index(lv_th, 0, 0)     # レベル0を表示して書込みを止める
+        lcd.print(0, lv_pat[p0:p0 + 16])
+        lcd.print(1, lv_pat[p0:p0 + 16])
+        sched.changed(p0 * 65536 + p0)
+        led.duty_u16(0)
+        if dualCore:
+            adc.pause(True)             # コア1の取得を休止(ADC・DMAをコア0が使う)
+        freq(lowFreq)
+        continue
     led.duty_u16((valAc[0]+valAc[1])//2)                   # LEDを点灯する
+    if verbose:
+        freq_adc = round(adc.rate / 1000,1)
+        for ch in range(2):
+            level = level_index(lv_th, valAc[ch])
+            print('Fs(kHz)='+str(freq_adc),'AC(mV)='+str(valAc[ch] * 3300 // 65535),'Peak(mV)='+str(peakAc[ch] * 3300 // 65535),'Lv='+str(level),'Saved(B)='+str(lcd.saved))
+    if stats.due():                     # 一定間隔で要約を表示
+        report()
 
 ###############################################################################
 # ADC接続方法: 直流カットC=1u～10uFとプルアップ抵抗R=33kΩ経由で下記に接続する
@@ -0,0 +1,111 @@
+###############################################################################
+# Audio Level Meter Ballistics (VU / PPM / Peak Hold)
+###############################################################################
+# レベルメータの指示特性(動特性)を 1回の計測区間(window)ごとに処理します。
+# どのフィルタも 1回あたりの処理量は一定です(リスト全体の再計算をしない)。
+# Raspberry Pi Pico (MicroPython) と Raspberry Pi (Python3) の両方で使えます。
+#
+#   VuFilter    VU計 300 ms の移動平均(累積和＋循環バッファ)
+#   PpmFilter   PPM IEC 60268-10 Type I / Type II (1次IIRの立上り＋対数減衰)
+#   PeakHold    ピーク値を一定時間保持した後に dB/s で減衰
+#
+# update_int は Pico 用の整数演算版です(係数は16ビット固定小数点)。
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+from math import exp
+
+class VuFilter:                         # VU計 (区間値の移動平均)
+    def __init__(self, interval_ms, time_ms=300):
+        self.n = max(1, int(time_ms / interval_ms + 0.5)) # 平均する区間数
+        self.buf = [0] * self.n         # 循環バッファ
+        self.i = 0                      # 次に書き込む位置
+        self.num = 0                    # 有効な区間数(起動直後用)
+        self.sum = 0                    # 累積和
+        self.value = 0
+
+    def push(self, val):                # 循環バッファと累積和を更新
+        self.sum += val - self.buf[self.i]
+        self.buf[self.i] = val
+        self.i += 1
+        if self.i >= self.n:
+            self.i = 0
+        if self.num < self.n:
+            self.num += 1
+
+    def update(self, val):              # 区間の値(平均絶対値など)を入力
+        self.push(val)
+        self.value = self.sum / self.num
+        return self.value
+
+    def update_int(self, val, scale=1): # 整数演算版 区間の合計値を入力し scale で割った平均を応答
+        self.push(val)
+        d = self.num * scale
+        self.value = (self.sum + d // 2) // d   # 整数演算で四捨五入
+        return self.value
+
+PPM_TYPE = {                            # (積分時定数 ms, 減衰 dB, 減衰時間 s)
+    'I':  (4.5, 20, 1.7),               # Type I  (DIN)  10 ms で -1 dB
+    'II': (6.3, 24, 2.8)                # Type II (BBC)  10 ms で -2 dB
+}
+
+class PpmFilter:                        # PPM 尖頭値計 (準尖頭値)
+    def __init__(self, interval_ms, kind='I'):
+        tau, db, sec = PPM_TYPE[kind]
+        self.attack = 1 - exp(-interval_ms / tau)   # 1次IIRの係数(立上り)
+        self.decay = 10 ** (-db * interval_ms / 1000 / sec / 20) # 区間あたりの減衰
+        self.attack_q16 = int(self.attack * 65536 + 0.5)   # 整数演算版(16ビット固定小数点)
+        self.decay_q16 = int(self.decay * 65536 + 0.5)
+        self.value = 0
+
+    def update(self, val):              # 区間の尖頭値を入力
+        if val > self.value:
+            self.value += (val - self.value) * self.attack
+        else:
+            self.value *= self.decay
+            if self.value < val:
+                self.value = val
+        return self.value
+
+    def update_int(self, val):          # 整数演算版 区間の尖頭値(整数)を入力
+        v = self.value
+        if val > v:
+            v += ((val - v) * self.attack_q16 + 32768) >> 16
+        else:
+            v = (v * self.decay_q16) >> 16
+            if v < val:
+                v = val
+        self.value = v
+        return v
+
+class PeakHold:                         # ピークホールド
+    def __init__(self, interval_ms, hold_ms=1500, decay_db=20):
+        self.hold = max(1, int(hold_ms / interval_ms + 0.5)) # 保持する区間数
+        self.decay = 10 ** (-decay_db * interval_ms / 1000 / 20) # dB/s での減衰
+        self.decay_q16 = int(self.decay * 65536 + 0.5) # 整数演算版(16ビット固定小数点)
+        self.count = 0
+        self.value = 0
+
+    def update(self, val):
+        if val >= self.value:
+            self.value = val
+            self.count = 0
+        elif self.count < self.hold:    # 保持時間中
+            self.count += 1
+        else:                           # 保持時間後は減衰
+            self.value *= self.decay
+            if self.value < val:
+                self.value = val
+        return self.value
+
+    def update_int(self, val):          # 整数演算版 区間の値(整数)を入力
+        if val >= self.value:
+            self.value = val
+            self.count = 0
+        elif self.count < self.hold:    # 保持時間中
+            self.count += 1
+        else:                           # 保持時間後は減衰
+            v = (self.value * self.decay_q16) >> 16
+            self.value = v if v > val else val
+        return self.value
@@ -0,0 +1,81 @@
+###############################################################################
+# Audio Level Meter 用 レベル演算 (整数演算, Raspberry Pi Pico)
+###############################################################################
+# Lch,Rch を交互に格納した array('H') の1区間分から、チャンネル毎の直流分、
+# 交流分(power / voltage / vu / ppm)、ピークホールド値を ADC値(0～65535)で
+# 求めます。表示パターンは meter_lvtable.py の bar_row() で取得します。
+# ADC や LCD に依存しないので、Linux 上でも sim/ と共に読み込めます。
+#
+#   calc = MeterCalc('vu', 512)
+#   valAc = calc.calc(vals, adc.ticks_ms())
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+from meter_adc import buf_sum,buf_absdev,buf_vpp # (要転送)
+from meter_ballistics import VuFilter,PpmFilter,PeakHold # 指示特性(要転送)
+
+METER_CONF = {                          # (表示範囲dB, 罫線のセル間隔, 計測サンプル数)
+    'power':   (40, 4, 1024),
+    'voltage': (32, 5, 1024),
+    'vu':      (24, 0, 512),
+    'ppm':     (40, 5, 256)
+}
+
+def meter_conf(peakMode, window=1024):  # peakMode 毎の表示設定を応答
+    return METER_CONF.get(peakMode, (80, 2, window))
+
+class MeterCalc:
+    def __init__(self, peakMode, window, channels=2):
+        self.peakMode = peakMode        # power,voltage,vu,ppm(尖頭値計)
+        self.window = window            # 1回あたりの計測サンプル数
+        self.channels = channels
+        self.valDc = [0] * channels     # 直流分(ADC値)
+        self.valAc = [0] * channels     # 交流分(ADC値)
+        self.peakAc = [0] * channels    # ピーク値(ADC値)
+        self.peak_hold = None           # ピークホールド(初回の計測時に生成)
+        self.vu_filter = None           # VU計の移動平均
+        self.ppm_filter = None          # PPMの立上り・減衰
+
+    def calc(self, vals, ticks_adc):    # 1区間分を演算して交流分を応答
+        window = self.window
+        step = self.channels
+        if self.peak_hold is None:      # 1回あたりの計測時間からフィルタを生成
+            self.peak_hold = [PeakHold(ticks_adc) for ch in range(step)]
+            self.vu_filter = [VuFilter(ticks_adc) for ch in range(step)]
+            self.ppm_filter = [PpmFilter(ticks_adc) for ch in range(step)]
+        valDc = self.valDc
+        valAc = self.valAc
+        for ch in range(step):
+            valDc[ch] = (buf_sum(vals, window, ch, step) + window // 2) // window # 整数演算で四捨五入
+            valAc[ch] = self.level(vals, window, ch, valDc[ch])
+            self.peakAc[ch] = self.peak_hold[ch].update_int(valAc[ch]) # 保持後に減衰(整数演算)
+        return valAc
+
+    def level(self, vals, n, ch, dc):   # 先頭 n サンプルの交流分(ADC値, peakMode 毎)
+        step = self.channels
+        if self.peakMode == 'power':                # 尖頭電力メータ
+            acSum = buf_absdev(vals, n, ch, step, dc)   # 区間エネルギー計算
+            return (acSum + n // 2) // n            # サンプル数で除算しPowerに
+        if self.peakMode == 'voltage' or self.peakMode == 'ppm': # 尖頭電圧メータ
+            acVpp = buf_vpp(vals, n, ch, step, dc)  # ピーク演算（簡易ノイズフィルタ付）
+            if self.peakMode == 'ppm':              # PPM 立上り・減衰特性
+                acVpp = self.ppm_filter[ch].update_int(acVpp)
+            return (acVpp * 23170 + 32768) >> 16    # 1/2/√2 (16ビット固定小数点)
+        if self.peakMode == 'vu':                   # VUメータ
+            window = self.window
+            acSum = buf_absdev(vals, n, ch, step, dc)   # 区間エネルギー計算
+            if n != window:                         # 試験区間は1区間分に換算
+                acSum = acSum * window // n
+            return self.vu_filter[ch].update_int(acSum, window) # 300ms平均(整数演算)
+        return 0
+
+    def probe(self, vals, n):           # 無音検出用 先頭 n サンプルの交流分(ADC値, 全チャンネルの最大値)
+        step = self.channels            # calc と同じ peakMode 毎の値(指示特性も1区間分進める)
+        m = 0
+        for ch in range(step):
+            dc = (buf_sum(vals, n, ch, step) + n // 2) // n
+            ac = self.level(vals, n, ch, dc)
+            if ac > m:
+                m = ac
+        return m
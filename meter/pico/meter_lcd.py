@@ -0,0 +1,118 @@
+###############################################################################
+# Audio Level Meter 用 LCD制御 (AQM1602 / ST7032, I2C)
+###############################################################################
+# LCD の初期化、レベルメータ用フォント(CGRAM)の転送、差分転送による表示を
+# 行います。I2C は machine.I2C 互換の writeto_mem() を持つものなら何でもよく、
+# Linux 上では sim/machine.py の I2C (送信記録付き) で動作します。
+#
+# 表示内容をシャドウ(lcd_shadow)に保持し、変化したセルの範囲だけを
+# DDRAMアドレス設定＋データで転送します。
+# CGRAM のフォント8文字分も転送済みの内容を保持し、表示モード(text, bar, scale)
+# を切り替えた時は、不足しているフォントだけを転送します。
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+from utime import sleep
+
+font_lv = [[
+    b'\x00\x01\x00\x01\x00\x01\x00\x15',
+    b'\x18\x19\x18\x19\x18\x19\x18\x15',
+    b'\x1B\x1B\x1B\x1B\x1B\x1B\x1B\x15',
+    b'\x03\x03\x03\x03\x03\x03\x03\x15'
+],[
+    b'\x00\x10\x00\x10\x00\x10\x00\x10',
+    b'\x18\x18\x18\x18\x18\x18\x00\x10',
+    b'\x1B\x1B\x1B\x1B\x1B\x1B\x00\x10',
+    b'\x03\x13\x03\x13\x03\x13\x00\x10'
+],[
+    b'\x10\x10\x00\x10\x10\x00\x10\x10',
+    b'\x18\x18\x18\x18\x18\x18\x10\x10',
+    b'\x1B\x1B\x1B\x1B\x1B\x1B\x10\x10',
+    b'\x13\x13\x03\x13\x13\x03\x10\x10'
+]]                                      # 参考文献3 (meter_aqm1602.py)
+
+GLYPH_SETS = {                          # 表示モード → CGRAM 0～7 のフォント
+    'text':  [],                        # 文字表示はフォントを使用しない
+    'bar':   font_lv[0],                # レベルメータ(目盛なし)
+    'scale': font_lv[1] + font_lv[2]    # レベルメータ(目盛付き)
+}
+
+class Aqm1602:
+    def __init__(self, i2c, addr=0x3E, vdd=None):
+        self.i2c = i2c
+        self.addr = addr                # LCD AQM1602のI2Cアドレス
+        self.vdd = vdd                  # LCD電源用のPin(None:常時給電)
+        self.shadow = [bytearray(16), bytearray(16)] # 表示中の内容(差分転送用)
+        self.shadow_ok = [False, False] # False:表示内容が不明
+        self.cmd = bytearray(1)         # DDRAMアドレス設定コマンド
+        self.cgram = [None] * 8         # 転送済みのフォント(None:内容が不明)
+        self.mode = None                # 表示モード
+        self.saved = 0                  # 差分転送で削減したバイト数(直近)
+        self.saved_sum = 0              # 差分転送で削減したバイト数(累計)
+
+    def init(self):                     # 電源リセットと初期化
+        if self.vdd is not None:
+            self.vdd.value(0)           # V+に0Vを出力
+            sleep(0.5)                  # リセット・ホールド
+            self.vdd.value(1)           # V+用に3.3Vを出力
+            sleep(0.2)                  # 起動待ち時間
+            self.cgram = [None] * 8     # 電源リセット後のCGRAMは不定
+            self.mode = None
+        self.i2c.writeto_mem(self.addr, 0x00, b'\x39\x14\x73\x5E\x6C\x38\x0C') # 参考文献1
+        self.shadow_ok = [False, False]
+
+    def set_glyphs(self, glyphs):       # CGRAM 0～ へフォントを転送(転送済みは省略)
+        seq = False                     # True:CGRAMアドレスが連続(自動加算)
+        for j in range(len(glyphs)):
+            if self.cgram[j] == glyphs[j]:
+                self.saved_sum += 10    # フォント1文字分(I2Cアドレスを含む)
+                seq = False
+                continue
+            if not seq:
+                self.cmd[0] = 0x40 + j * 8  # CGRAM address
+                self.i2c.writeto_mem(self.addr, 0x00, self.cmd)
+                seq = True
+            self.cgram[j] = None        # 転送に失敗した時は不明のまま
+            self.i2c.writeto_mem(self.addr, 0x40, glyphs[j]) # フォント
+            self.cgram[j] = glyphs[j]
+
+    def set_mode(self, mode):           # 表示モード(text, bar, scale)の切り替え
+        if mode != self.mode:
+            self.set_glyphs(GLYPH_SETS[mode])
+            self.mode = mode
+
+    def set_fonts(self, dispScale):     # レベルメータ用フォントの転送
+        self.set_mode('bar' if dispScale == 0 else 'scale') # スケール表示なし/あり
+
+    def print(self, y, text):           # LCDに文字を表示する(変化分のみ転送)
+        if isinstance(text, str):       # 文字列のみバイト列に変換
+            text = memoryview(text.encode())
+        buf = text                      # memoryview 等はシャドウと直接比較(確保なし)
+        n = len(buf)
+        prev = self.shadow[y]
+        ok = self.shadow_ok[y]
+        full = 3 + 2 + n                # 全転送時のバイト数(I2Cアドレスを含む)
+        sent = 0
+        x = 0
+        while x < n:
+            if ok and x < 16 and buf[x] == prev[x]:
+                x += 1
+                continue
+            end = x + 1                 # 変化したセルの範囲 x～end-1
+            i = end
+            while i < n and i - end < 5: # アドレス設定より短い未変化区間は含める
+                if not ok or i >= 16 or buf[i] != prev[i]:
+                    end = i + 1
+                i += 1
+            self.cmd[0] = 0x80 + 0x40 * y + x           # DDRAMアドレスを設定
+            self.i2c.writeto_mem(self.addr, 0x00, self.cmd)
+            self.i2c.writeto_mem(self.addr, 0x40, buf[x:end]) # 変化したセルを転送
+            sent += 5 + end - x
+            i = min(end, 16)
+            if i > x:
+                prev[x:i] = buf[x:i]    # シャドウを更新
+            x = end
+        self.shadow_ok[y] = n >= 16
+        self.saved = full - sent
+        self.saved_sum += self.saved
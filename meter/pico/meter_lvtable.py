@@ -0,0 +1,86 @@
+###############################################################################
+# Audio Level Meter 表示用テーブル (整数演算用)
+###############################################################################
+# 起動時に下記の2つのテーブルを作成し、計測毎の log10 や除算、16桁分の条件分岐を
+# テーブル参照に置き換えます。Raspberry Pi Pico (MicroPython) 用です。
+#
+#   make_thresholds  交流分ADC値 → 表示レベル(0～32) の閾値(33個)
+#   level_index      上記の閾値を二分探索して表示レベルを応答
+#   make_patterns    (レベル, ピーク) 33×33 → 1行16バイトの表示パターン
+#   bar_index        交流分とピーク値(ADC値) → 上記の表示パターンの位置
+#   bar_row          交流分とピーク値(ADC値) → 上記の表示パターン(16バイト)
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+from math import log10
+
+def make_thresholds(dispAcMaxMv, dispAcRangeDb, adcMaxMv=3300, adcMax=65535):
+    th = [0]                            # レベル0は閾値なし
+    for i in range(1, 33):              # レベルiとなる最小のADC値
+        mv = dispAcMaxMv * 10 ** ((i / 32 * dispAcRangeDb - dispAcRangeDb) / 20)
+        v = int(mv * adcMax / adcMaxMv)
+        while v > 0 and calc_level(v - 1, dispAcMaxMv, dispAcRangeDb, adcMaxMv, adcMax) >= i:
+            v -= 1                      # 浮動小数点の誤差を補正
+        while calc_level(v, dispAcMaxMv, dispAcRangeDb, adcMaxMv, adcMax) < i:
+            v += 1
+        th.append(v)
+    return th
+
+def calc_level(adc, dispAcMaxMv, dispAcRangeDb, adcMaxMv=3300, adcMax=65535):
+    volt = adc * adcMaxMv / adcMax      # 従来の calc_volt2db と同じ計算
+    if volt <= 0:
+        return 0
+    i = int((20 * log10(volt/dispAcMaxMv) + dispAcRangeDb)/dispAcRangeDb * 32)
+    if i < 0:
+        i = 0
+    if i > 32:
+        i = 32
+    return i
+
+def level_index(th, val):               # 二分探索で表示レベル(0～32)を応答
+    lo = 0
+    hi = 32
+    while lo < hi:
+        mid = (lo + hi + 1) >> 1
+        if val >= th[mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def make_patterns(dispScale):           # (level, peak) → 16バイトの表示パターン
+    pat = bytearray(33 * 33 * 16)
+    for level in range(33):
+        for peak in range(33):
+            p = (level * 33 + peak) * 16
+            for i in range(16):
+                i22 = i * 2 + 1                 # セルの右側に相当するレベル値
+                if i < level // 2:              # セル位置がレベル未満の時
+                    c = 0x02                    # セルの両側を点灯
+                elif i == level // 2:           # セル位置がレベル位置の時
+                    if i22 == level or i22 == peak: # セルの右までの時
+                        c = 0x02                # セルの両側を点灯
+                    elif i == 0 and peak == 0:
+                        c = 0x00                # レベルなし
+                    else:
+                        c = 0x01                # セルの左側を点灯
+                elif i > 0 and i == peak // 2:  # ピーク単独表示位置の時
+                    if i22 == peak:             # ピーク位置が右側のとき
+                        c = 0x03                # セルの右側のみ単独点灯
+                    else:                       # (ピーク位置が左側の時)
+                        c = 0x01                # セルの左側を点灯
+                else:                           # 点灯条件に該当しないとき
+                    c = 0x00                    # 非点灯表示
+                if dispScale > 0 and i % dispScale == 0 and c < 0x04:
+                    c += 0x04
+                pat[p + i] = c
+    return pat
+
+def bar_index(th, val, peak):           # 交流分とピーク値から表示パターンの位置を応答
+    level = level_index(th, val)        # 閾値テーブルを二分探索
+    return (level * 33 + level_index(th, peak)) * 16
+
+def bar_row(th, pat, val, peak):        # 交流分とピーク値から表示パターンを応答
+    p = bar_index(th, val, peak)        # 表示パターンテーブルの位置
+    return pat[p:p + 16]
@@ -0,0 +1,89 @@
+###############################################################################
+# Audio Level Meter 用 表示スケジューラ
+###############################################################################
+# 演算は音声の区間毎に行い、LCD への表示は目標のフレームレート(fps)で行います。
+# 表示までの区間の値は最大値で保持(max-hold)するので、短いピークも表示されます。
+# 表示に掛かった時間(I2C の書込み時間)を平滑化して測り、表示の占める時間の割合が
+# duty(%) を超えないよう表示間隔を延ばします。表示内容が前回と同じ時は書込みません。
+# Raspberry Pi Pico (MicroPython) と Raspberry Pi (Python3) の両方で使えます。
+#
+#   sched = FrameScheduler(2, 20)       # 2値、20fps
+#   sched.hold(valAc)                   # 区間毎に最大値を保持
+#   if sched.due():                     # 表示間隔が経過した
+#       vals = sched.take()             # 保持した値(次の区間から保持し直す)
+#       if sched.changed(key):          # 表示パターンが前回と異なる時のみ書込む
+#           t = ticks_us()
+#           ...
+#           sched.done(ticks_diff(ticks_us(), t))
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+try:
+    from utime import ticks_us,ticks_diff
+except ImportError:                     # Raspberry Pi (Python3)
+    from time import perf_counter_ns
+    def ticks_us():
+        return perf_counter_ns() // 1000
+    def ticks_diff(a, b):
+        return a - b
+
+class FrameScheduler:
+    def __init__(self, n, fps=20, duty=50, min_fps=2):
+        self.vals = [0] * n             # 保持中の最大値
+        self.held = 0                   # 保持中の区間数
+        self.duty = duty                # 表示に使う時間の上限(%)
+        self.min_us = 1000000 // fps if fps > 0 else 0 # 目標の表示間隔(μs, 0:毎回)
+        self.max_us = 1000000 // min_fps # 書込みが遅い時でも、この間隔で表示
+        self.interval_us = self.min_us  # 現在の表示間隔(μs)
+        self.write_us = 0               # 1回の表示に掛かる時間(μs, 平滑値)
+        self.t_last = ticks_us()
+        self.key = None                 # 前回の表示パターン
+        self.frames = 0                 # 表示した回数(累計)
+        self.unchanged = 0              # 表示パターンが同じで書込まなかった回数(累計)
+        self.merged = 0                 # 表示せずに最大値へまとめた区間数(累計)
+
+    def hold(self, vals):               # 区間の値を最大値で保持
+        h = self.vals
+        if self.held == 0:
+            for i in range(len(h)):
+                h[i] = vals[i]
+        else:
+            for i in range(len(h)):
+                if vals[i] > h[i]:
+                    h[i] = vals[i]
+            self.merged += 1
+        self.held += 1
+
+    def put(self, vals):                # 最大値を取らずに最新の値で置き換える
+        if self.held > 0:
+            self.merged += 1
+        self.vals = vals
+        self.held += 1
+
+    def due(self):                      # 表示する時刻かどうか
+        return self.held > 0 and ticks_diff(ticks_us(), self.t_last) >= self.interval_us
+
+    def wait_us(self):                  # 次の表示までの時間(μs)
+        return max(self.interval_us - ticks_diff(ticks_us(), self.t_last), 0)
+
+    def take(self):                     # 保持した値を応答(次の hold で上書きされる)
+        self.held = 0
+        self.t_last = ticks_us()
+        return self.vals
+
+    def changed(self, key):             # 表示パターンが前回と異なるかどうか
+        if key == self.key:
+            self.unchanged += 1
+            return False
+        self.key = key
+        return True
+
+    def done(self, us):                 # 表示に掛かった時間(μs)から表示間隔を調整
+        self.write_us += (us - self.write_us) >> 2  # 1/4 の指数移動平均
+        interval = self.write_us * 100 // self.duty
+        self.interval_us = min(max(interval, self.min_us), self.max_us)
+        self.frames += 1
+
+    def fps(self):                      # 現在の表示間隔でのフレームレート
+        return 1000000 // max(self.interval_us, 1)
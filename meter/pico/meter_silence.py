@@ -0,0 +1,42 @@
+###############################################################################
+# Audio Level Meter 用 無音検出 (ヒステリシス付き)
+###############################################################################
+# 交流分(valAc / voltAc)が enter 未満の区間が hold 回続くと無音とし、leave 以上
+# (enter より大きい値)になった区間で直ちに復帰します。無音中は呼び出し側が
+# 短い試験区間(probe)だけを取得・演算し、表示の書込みを止めて省電力にします。
+# Raspberry Pi Pico (MicroPython) と Raspberry Pi (Python3) の両方で使えます。
+#
+#   silence = SilenceDetector(60, 120, 80)  # ADC値 60未満が80区間で無音
+#   if silence.update(valAc):           # True:無音中
+#       ...                             # 表示を止め、試験区間のみ演算
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+class SilenceDetector:
+    def __init__(self, enter, leave, hold):
+        self.enter = enter              # 無音と判定する値(未満)
+        self.leave = leave              # 無音から復帰する値(以上)
+        self.hold = hold                # 無音と判定するまでの区間数
+        self.count = 0                  # enter 未満が続いた区間数
+        self.silent = False             # True:無音中
+        self.windows = 0                # 無音中に省略した区間数(累計)
+        self.changes = 0                # 無音⇔有音の切り替え回数(累計)
+
+    def update(self, vals):             # 区間毎の値(チャンネル毎)で判定
+        m = max(vals)
+        if self.silent:
+            if m >= self.leave:         # 1区間で復帰
+                self.silent = False
+                self.count = 0
+                self.changes += 1
+            else:
+                self.windows += 1
+        elif m < self.enter:
+            self.count += 1
+            if self.count >= self.hold:
+                self.silent = True
+                self.changes += 1
+        else:
+            self.count = 0
+        return self.silent
@@ -0,0 +1,166 @@
+###############################################################################
+# Audio Level Meter 用 処理時間の計測と集計
+###############################################################################
+# 取得(read)・変換(decode)・演算(analysis)・表示(display) などの段階毎に処理時間
+# (μs)を計測し、固定長(2のべき乗区切り)のヒストグラムに集計します。
+# 計測毎にメモリを確保しないので、計測そのものの負荷は小さく一定です。
+# Raspberry Pi Pico (MicroPython) と Raspberry Pi (Python3) の両方で使えます。
+#
+#   stats = Stats(['read', 'analysis', 'display'])
+#   t = stats.start()
+#   ...
+#   t = stats.stop('read', t)           # 直前からの経過時間を read に加算
+#   stats.count('overrun', n)           # 回数(累計値)を設定
+#   if stats.due():                     # interval_ms 毎に要約を表示
+#       print(stats.summary())
+#
+# Raspberry Pi では Prometheus の textfile 形式でファイル出力(node_exporter の
+# textfile collector 用)、または同じ内容を UDP で送信できます。
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+try:
+    from utime import ticks_us,ticks_ms,ticks_diff
+except ImportError:                     # Raspberry Pi (Python3)
+    from time import perf_counter_ns
+    def ticks_us():
+        return perf_counter_ns() // 1000
+    def ticks_ms():
+        return perf_counter_ns() // 1000000
+    def ticks_diff(a, b):
+        return a - b
+
+BUCKETS = 20                            # 1μs～約0.5秒(2のべき乗区切り)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = [0] * buckets    # i番目: 2**(i-1) ≦ t < 2**i μs (累計)
+        self.last = [0] * buckets       # 前回の要約時の値(区間集計用)
+        self.sum = 0                    # 合計時間(μs, 累計)
+        self.max = 0                    # 区間内の最大値(μs)
+
+    def add(self, us):
+        i = 0
+        v = us
+        n = len(self.buckets) - 1
+        while v > 0 and i < n:          # ビット長 = 区切り番号
+            v >>= 1
+            i += 1
+        self.buckets[i] += 1
+        self.sum += us
+        if us > self.max:
+            self.max = us
+
+    def count(self):
+        return sum(self.buckets)
+
+    def interval(self):                 # 前回からの区間のヒストグラム
+        return [b - l for b, l in zip(self.buckets, self.last)]
+
+    def percentile(self, p, hist=None): # パーセンタイル(区切りの上限値, μs)
+        if hist is None:
+            hist = self.buckets
+        n = sum(hist)
+        if n == 0:
+            return 0
+        k = n * p / 100
+        c = 0
+        for i in range(len(hist)):
+            c += hist[i]
+            if c >= k:
+                return 1 << i
+        return 1 << (len(hist) - 1)
+
+    def mark(self):                     # 区間の区切り
+        self.last[:] = self.buckets
+        self.max = 0
+
+class Stats:
+    def __init__(self, stages, interval_ms=10000, prefix='meter'):
+        self.stages = stages            # 段階名のリスト(表示順)
+        self.hist = {}
+        for name in stages:
+            self.hist[name] = Histogram()
+        self.counters = {}              # 取得漏れ・破棄など(累計値)
+        self.counters_last = {}
+        self.interval_ms = interval_ms  # 要約を表示する間隔(0:表示しない)
+        self.prefix = prefix            # Prometheus のメトリクス名の接頭辞
+        self.frames = 0                 # 処理したチャンク数(累計)
+        self.frames_last = 0
+        self.t_last = ticks_ms()
+
+    def start(self):
+        return ticks_us()
+
+    def stop(self, name, t0):           # t0 からの経過時間を name に加算
+        t = ticks_us()
+        self.hist[name].add(ticks_diff(t, t0))
+        return t
+
+    def count(self, name, value):       # 回数(累計値)を設定
+        self.counters[name] = value
+
+    def frame(self):                    # 1チャンク分の処理を完了
+        self.frames += 1
+
+    def due(self):                      # 要約を表示する時刻かどうか
+        if self.interval_ms <= 0:
+            return False
+        return ticks_diff(ticks_ms(), self.t_last) >= self.interval_ms
+
+    def summary(self):                  # 前回からの区間の要約(1行)
+        t = ticks_ms()
+        sec = ticks_diff(t, self.t_last) / 1000
+        n = self.frames - self.frames_last
+        s = 'Stats ' + str(n) + ' chunks ' + str(round(n / sec, 1) if sec > 0 else 0) + '/s'
+        for name in self.stages:
+            h = self.hist[name]
+            hist = h.interval()
+            s += ' ' + name + '(us)=' + str(min(h.percentile(50, hist), h.max)) + '/' \
+                + str(min(h.percentile(99, hist), h.max)) + '/' + str(h.max)
+            h.mark()
+        for name in self.counters:
+            v = self.counters[name]
+            s += ' ' + name + '=' + str(v - self.counters_last.get(name, 0))
+            self.counters_last[name] = v
+        self.frames_last = self.frames
+        self.t_last = t
+        return s                        # 段階毎の p50/p99/最大 (μs)
+
+    def prometheus(self):               # Prometheus の textfile 形式
+        p = self.prefix
+        lines = [
+            '# HELP ' + p + '_stage_seconds Processing time per chunk and stage',
+            '# TYPE ' + p + '_stage_seconds histogram'
+        ]
+        for name in self.stages:
+            h = self.hist[name]
+            c = 0
+            for i in range(len(h.buckets)):
+                c += h.buckets[i]
+                le = '+Inf' if i == len(h.buckets) - 1 else str((1 << i) / 1000000)
+                lines.append(p + '_stage_seconds_bucket{stage="' + name + '",le="' + le + '"} ' + str(c))
+            lines.append(p + '_stage_seconds_sum{stage="' + name + '"} ' + str(h.sum / 1000000))
+            lines.append(p + '_stage_seconds_count{stage="' + name + '"} ' + str(c))
+        lines.append('# TYPE ' + p + '_chunks_total counter')
+        lines.append(p + '_chunks_total ' + str(self.frames))
+        for name in self.counters:
+            lines.append('# TYPE ' + p + '_' + name + '_total counter')
+            lines.append(p + '_' + name + '_total ' + str(self.counters[name]))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):     # 書き込み途中を読まれないよう置き換える
+        import os
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus())
+        os.rename(tmp, path)
+
+    def send_udp(self, addr):           # addr = (ホスト, ポート)
+        import socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(self.prometheus().encode(), addr)
+        finally:
+            sock.close()
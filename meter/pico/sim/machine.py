@@ -0,0 +1,76 @@
+###############################################################################
+# machine モジュールのスタンドイン (Linux 上での試験用)
+###############################################################################
+# Raspberry Pi Pico 用のプログラムを、実機なしで Python3 上で動かすための
+# 最小限の代用品です。ADC は ADC.signal(ch, t) の値を応答します。
+#   $ cd audio/meter/pico
+#   $ PYTHONPATH=sim python3 meter_aqm1602.py
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+from math import sin,pi
+
+def sine(ch, t):                        # 既定の入力信号 1kHz(Lch), 440Hz(Rch)
+    f = 1000 if ch == 0 else 440
+    return int(32768 + 3000 * sin(2 * pi * f * t))
+
+class ADC:
+    rate = 500000                       # 変換速度(回/秒) read_u16() 1回ごとに進む
+    signal = sine                       # 入力信号 signal(ch, t) → 0～65535
+    count = 0                           # 変換回数(全チャンネル共通)
+
+    def __init__(self, ch):
+        self.ch = ch
+
+    def read_u16(self):
+        ADC.count += 1
+        v = ADC.signal(self.ch, ADC.count / ADC.rate)
+        if v < 0:
+            v = 0
+        if v > 65535:
+            v = 65535
+        return v
+
+class Pin:
+    OUT = 1
+    IN = 0
+
+    def __init__(self, id, mode=-1):
+        self.id = id
+        self.val = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self.val
+        self.val = v
+
+class PWM:
+    def __init__(self, pin):
+        self.pin = pin
+        self.duty = 0
+
+    def freq(self, f=None):
+        pass
+
+    def duty_u16(self, v=None):
+        if v is None:
+            return self.duty
+        self.duty = v
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.log = []                   # (addr, memaddr, bytes) の送信記録
+        self.bytes = 0                  # 送信バイト数(I2Cアドレスを含む)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.log.append((addr, memaddr, bytes(buf)))
+        if len(self.log) > 1024:
+            del self.log[0]
+        self.bytes += 2 + len(buf)
+
+def freq(hz=None):                      # CPUクロック
+    return 125000000
+
+def lightsleep(ms=None):
+    pass
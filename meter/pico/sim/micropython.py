@@ -0,0 +1,13 @@
+###############################################################################
+# micropython モジュールのスタンドイン (Linux 上での試験用)
+###############################################################################
+# @micropython.viper / @micropython.native は通常の Python 関数として動作します。
+
+def viper(f):
+    return f
+
+def native(f):
+    return f
+
+def const(v):
+    return v
@@ -0,0 +1,26 @@
+###############################################################################
+# utime モジュールのスタンドイン (Linux 上での試験用)
+###############################################################################
+
+import time
+
+def sleep(s):
+    time.sleep(s)
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+def ticks_us():
+    return time.perf_counter_ns() // 1000
+
+def ticks_ms():
+    return time.perf_counter_ns() // 1000000
+
+def ticks_diff(a, b):
+    return a - b
+
+def ticks_add(a, b):
+    return a + b
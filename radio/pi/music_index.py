@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# coding: utf-8
+###############################################################################
+# Jukebox 用 楽曲メタデータ索引 music_index.py
+###############################################################################
+# 楽曲ファイル(*.flac, *.mp3)の ARTIST / TITLE を SQLite の索引に保存します。
+# ファイルのパス・サイズ・更新日時を記録し、新しいファイルや変更されたファイル
+# だけを ffmpeg で読み取ります(複数プロセスで並列処理)。
+# メタデータが UTF-8 でない時は Shift-JIS として読み取ります。
+# 曲番号(1～、更新日時の新しい順)から、パス・アーティスト・タイトルを引けます。
+# 索引の更新時に、シェルから sed -n "${n}p" で引ける一覧(index.tsv)も書き出します
+# (1行1曲、パス・アーティスト・タイトルをタブ区切り)。
+#
+# 使い方：
+#   $ ./music_index.py update /home/pi/Music /home/pi/Music/radio_sh_tmp/index.db
+#   (索引と一覧 index.tsv を更新し、曲数を表示する。--force で全ファイルを読み直す)
+#   $ sed -n "1p" /home/pi/Music/radio_sh_tmp/index.tsv
+#   (1曲目のパス、アーティスト、タイトルをタブ区切りで表示する)
+#   $ ./music_index.py info /home/pi/Music/radio_sh_tmp/index.db 1
+#   (1曲目のパス、アーティスト、タイトルを1行ずつ表示する)
+#
+# Python からの使い方：
+#   import music_index
+#   index = music_index.MusicIndex('/home/pi/Music/radio_sh_tmp/index.db')
+#   index.update('/home/pi/Music')
+#   track = index.get(1)        # {'path':..., 'artist':..., 'title':...}
+#
+#                                              Copyright (c) 2022 Wataru KUNINO
+###############################################################################
+
+import sys
+import os
+import sqlite3
+import subprocess
+import datetime
+from multiprocessing import Pool
+
+EXTENSIONS = ('.flac', '.mp3')							# 対象の拡張子
+LIST_EXT = '.tsv'										# シェル用の一覧の拡張子
+
+def log(*args):											# 標準エラー出力へログ表示
+	print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), *args, file=sys.stderr)
+
+def decode_text(data):									# UTF-8 以外は Shift-JIS
+	try:
+		return data.decode('utf-8')
+	except UnicodeDecodeError:
+		return data.decode('cp932', errors='replace')
+
+def parse_filename(path):								# "ARTIST - TITLE.ext" を分割
+	name = os.path.splitext(os.path.basename(path))[0]
+	words = name.split(' - ')
+	artist = words[0]
+	title = words[1] if len(words) >= 2 else words[0]
+	return artist, title.split('.')[0]
+
+def list_path(db):										# 索引に対応する一覧のパス
+	return os.path.splitext(db)[0] + LIST_EXT
+
+def field(text):										# 一覧の1項目(タブ・改行を除く)
+	return text.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+def extract(path):										# 1ファイル分のメタデータ取得
+	artist = None
+	title = None
+	try:
+		res = subprocess.run(
+			['ffmpeg', '-nostdin', '-i', path, '-f', 'ffmetadata', '-'],
+			stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60)
+		for line in decode_text(res.stdout).splitlines():
+			if '=' not in line:
+				continue
+			key, val = line.split('=', 1)
+			key = key.lower()
+			if artist is None and 'artist' in key and val:	# grep -i artist|head -1 相当
+				artist = val.strip()
+			if title is None and 'title' in key and val:
+				title = val.strip()
+	except (OSError, subprocess.TimeoutExpired):
+		pass
+	f_artist, f_title = parse_filename(path)
+	return path, artist or f_artist, title or f_title
+
+class MusicIndex:
+
+	def __init__(self, db):
+		self.list = list_path(db)						# シェル用の一覧 index.tsv
+		self.db = sqlite3.connect(db)
+		self.db.execute('''CREATE TABLE IF NOT EXISTS files (
+			path TEXT PRIMARY KEY, size INTEGER, mtime REAL, artist TEXT, title TEXT)''')
+		self.db.execute('''CREATE TABLE IF NOT EXISTS playlist (
+			num INTEGER PRIMARY KEY, path TEXT)''')		# 曲番号→パス
+		self.db.commit()
+
+	def scan(self, folder):								# 対象ファイルの一覧(新しい順)
+		files = []
+		for entry in os.scandir(folder):
+			if entry.is_file() and entry.name.lower().endswith(EXTENSIONS):
+				st = entry.stat()
+				files.append((entry.path, st.st_size, st.st_mtime))
+		files.sort(key=lambda f: f[2], reverse=True)	# ls -t と同じ順序
+		return files
+
+	def update(self, folder, force=False, jobs=None):	# 索引を更新し曲数を応答
+		files = self.scan(folder)
+		known = {}
+		for path, size, mtime in self.db.execute('SELECT path, size, mtime FROM files'):
+			known[path] = (size, mtime)
+		todo = [f for f in files if force or known.get(f[0]) != (f[1], f[2])]
+		current = set(f[0] for f in files)
+		removed = [p for p in known if p not in current]
+		if todo:
+			log('Metadata', len(todo), 'files to read')
+			stat = dict((f[0], f) for f in todo)
+			with Pool(jobs) as pool:					# CPUコア数のプロセスで並列処理
+				for path, artist, title in pool.imap_unordered(extract, [f[0] for f in todo]):
+					self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+						(path, stat[path][1], stat[path][2], artist, title))
+					log('Metadata', 'ARTIST', artist, 'TITLE', title)
+		for path in removed:
+			self.db.execute('DELETE FROM files WHERE path = ?', (path,))
+		changed = bool(todo or removed or self.count() != len(files))
+		if changed:
+			self.db.execute('DELETE FROM playlist')		# 曲番号を振り直す
+			self.db.executemany('INSERT INTO playlist VALUES (?, ?)',
+				[(i + 1, f[0]) for i, f in enumerate(files)])
+		self.db.commit()
+		if changed or not os.path.exists(self.list):
+			self.export()
+		return len(files)
+
+	def export(self):									# 曲番号順の一覧を書き出す
+		tmp = self.list + '~'
+		with open(tmp, 'w', encoding='utf-8') as fp:
+			for path, artist, title in self.db.execute('''SELECT playlist.path, artist, title
+				FROM playlist LEFT JOIN files ON files.path = playlist.path ORDER BY num'''):
+				f_artist, f_title = parse_filename(path)	# 空欄は read で詰まるため補う
+				fp.write(field(path) + '\t' + (field(artist or '') or f_artist or '-') + '\t'
+					+ (field(title or '') or f_title or '-') + '\n')
+		os.replace(tmp, self.list)						# 再生中の sed が途中の一覧を読まない
+
+	def count(self):
+		return self.db.execute('SELECT COUNT(*) FROM playlist').fetchone()[0]
+
+	def get(self, num):									# 曲番号からメタデータを応答
+		row = self.db.execute('''SELECT playlist.path, artist, title FROM playlist
+			LEFT JOIN files ON files.path = playlist.path WHERE num = ?''', (num,)).fetchone()
+		if row is None:
+			return None
+		return {'path': row[0], 'artist': row[1] or '', 'title': row[2] or ''}
+
+	def close(self):
+		self.db.close()
+
+def main():
+	if len(sys.argv) >= 4 and sys.argv[1] == 'update':
+		index = MusicIndex(sys.argv[3])
+		print(index.update(sys.argv[2], force='--force' in sys.argv[4:]))
+		index.close()
+		return 0
+	if len(sys.argv) >= 4 and sys.argv[1] == 'info' and sys.argv[3].isnumeric():
+		index = MusicIndex(sys.argv[2])
+		track = index.get(int(sys.argv[3]))
+		index.close()
+		if track is None:
+			return 1
+		print(track['path'])
+		print(track['artist'].replace('\n', ' '))
+		print(track['title'].replace('\n', ' '))
+		return 0
+	print('Usage:')
+	print('  ' + sys.argv[0] + ' update music_folder index.db [--force]')
+	print('  ' + sys.argv[0] + ' info index.db number')
+	return 1
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -100,6 +100,8 @@ export SDL_AUDIODRIVER=alsa # オーディオ出力にALSAを使用する設定
 export AUDIODEV="hw:0,0"    # aplay -lで表示されたカード番号とサブデバイス番号を入力する
 FILEPATH="/home/pi/Music"   # MusicBox用のファイルパス
 TEMP_DIR="/radio_sh_tmp"    # MusicBox用のファイルパス
+INDEX_DB="${FILEPATH}${TEMP_DIR}/index.db" # MusicBox用の索引ファイル
+INDEX_LIST="${FILEPATH}${TEMP_DIR}/index.tsv" # 索引から書き出した一覧(1行1曲)
 BUTTON_IO="27"              # ボタン操作する場合はIOポート番号を指定する(使用しないときは0)
 BUTTON_MODE_IO="22"         # モード切替ボタン(使用しないときは0)
 LCD_IO="16"                 # LCD用電源用IOポート番号を指定する
@@ -107,6 +109,7 @@ START_PRE=10                # 開始待機時間(OS起動待ち・インター
 
 AUDIO_APP="ffplay"                          # インストールした再生アプリ
 LCD_APP="/home/pi/audio/radio/pi/raspi_lcd" # LCD表示用。※要makeの実行
+INDEX_APP="/home/pi/audio/radio/pi/music_index.py" # Jukebox用メタデータ索引
 LOG="/home/pi/audio/radio/pi/radio.log"     # ログファイル名(/dev/stdoutでコンソール表示)
 
 if [ "$GPIO_LIB" = "RASPI" ]; then
@@ -178,6 +181,7 @@ lcd (){
         fi
     fi
     if [ -n "$LCD_APP" ]; then
+        # 初期化済みの液晶へは変化した文字だけを転送(raspi_lcd -f 常駐中は転送を依頼)
         if [ -n "${s2}" ]; then
             $LCD_APP -i -w16 ${s1} > /dev/null 2>&1
             $LCD_APP -i -w16 -y2 ${s2} > /dev/null 2>&1
@@ -209,8 +213,7 @@ radio (){
 music_box (){
     echo `date` "music_box" $1 >> $LOG 2>&1
     if [ $1 -ge 1 ] && [ $1 -le $file_max ]; then
-        lcd_s1=`grep -i artist "${FILEPATH}${TEMP_DIR}/${filen}.txt"|cut -d"=" -f2|head -1`
-        lcd_s2=`grep -i title "${FILEPATH}${TEMP_DIR}/${filen}.txt"|cut -d"=" -f2|head -1`
+        IFS=$'\t' read -r music_path lcd_s1 lcd_s2 < <(sed -n "${1}p" "${INDEX_LIST}" 2>> $LOG)
         if [ -z "${lcd_s1}" ]; then
             lcd_s1="Jukebox_File"${1}
         fi
@@ -220,7 +223,7 @@ music_box (){
         lcd "${lcd_s1}" "${lcd_s2}"
         if [ $AUDIO_APP = "ffplay" ]; then
             kill `pidof ffplay` &> /dev/null
-            ffplay -nodisp -autoexit ${FILEPATH}${TEMP_DIR}/${filen}.lnk &> /dev/null &
+            ffplay -nodisp -autoexit "${music_path}" &> /dev/null &
         fi
     else
         echo "ERROR music_box ch" $1 >> $LOG 2>&1
@@ -298,39 +301,21 @@ button_shutdown (){
     fi
 }
 
-# Jukebox用 ファイル用リンク作成
+# Jukebox用 楽曲メタデータ索引の更新(追加・変更されたファイルのみ読み取る)
 music_file_list (){
-    ls -1 -t ${FILEPATH}/*.flac ${FILEPATH}/*.mp3 > ${FILEPATH}${TEMP_DIR}/list.txt
+    ls -1 -t ${FILEPATH}/*.flac ${FILEPATH}/*.mp3 > ${FILEPATH}${TEMP_DIR}/list.txt 2> /dev/null
     i="none"
     if [ -e ${FILEPATH}${TEMP_DIR}/list.txt~ ]; then
         i=`diff ${FILEPATH}${TEMP_DIR}/list.txt ${FILEPATH}${TEMP_DIR}/list.txt~`
     fi
+    opt=""
+    if [ $# -ge 1 ]; then
+        opt="--force"                   # 全ファイルを読み直す
+    fi
     if [ "${i}" != "" ] || [ $# -ge 1 ] ; then
         lcd "ﾌｧｲﾙ_ﾘｽﾄ_ｻｸｾｲﾁｭｳ" "${FILEPATH}"
-        rm -f ${FILEPATH}${TEMP_DIR}/*.lnk ${FILEPATH}${TEMP_DIR}/[1-9]*.txt
-        i=1
-        SECONDS=0
-        ls -1 -t ${FILEPATH}/*.flac ${FILEPATH}/*.mp3 2> /dev/null | while read filename; do
-            name=`echo ${filename}|rev|cut -d'.' -f2|cut -d'/' -f1|rev`
-            ext=`echo ${filename}|rev|cut -d'.' -f1|rev`
-            ln -s "${filename}" "${FILEPATH}${TEMP_DIR}/${i}.lnk"
-            # https://www.ffmpeg.org/ffmpeg-formats.html#Metadata-1
-            ffmpeg -nostdin -i "${FILEPATH}${TEMP_DIR}/${i}.lnk" -f ffmetadata "${FILEPATH}${TEMP_DIR}/${i}.txt" &> /dev/null
-            type=`file "${FILEPATH}${TEMP_DIR}/${i}.txt"|cut -d" " -f2`
-            if [ "${type}" != "UTF-8" ] && [ "${type}" != "ASCII" ]; then
-                mv "${FILEPATH}${TEMP_DIR}/${i}.txt" "${FILEPATH}${TEMP_DIR}/${i}.txt~"
-                iconv -f sjis -t utf8 "${FILEPATH}${TEMP_DIR}/${i}.txt~" > "${FILEPATH}${TEMP_DIR}/${i}.txt"
-            fi
-            artist=`echo ${name}|sed "s/ - /|/g"|cut -d"|" -f1`
-            title=`echo ${name}|sed "s/ - /|/g"|cut -d"|" -f2|cut -d"." -f1`
-            echo "filename_artist="${artist} >> "${FILEPATH}${TEMP_DIR}/${i}.txt"
-            echo "filename_title="${title} >> "${FILEPATH}${TEMP_DIR}/${i}.txt"
-            echo `date` "Metadata" ${i} "ARTIST" `grep -i artist "${FILEPATH}${TEMP_DIR}/${i}.txt"|cut -d"=" -f2|head -1` >> $LOG 2>&1
-            echo `date` "Metadata" ${i} "TITLE" `grep -i title "${FILEPATH}${TEMP_DIR}/${i}.txt"|cut -d"=" -f2|head -1` >> $LOG 2>&1
-            i=$(( i + 1 ))
-        done
     fi
-    file_max=$((`ls -t ${FILEPATH}${TEMP_DIR}/*.lnk|head -1|rev|cut -d"/" -f1|rev|cut -d"." -f1`))
+    file_max=$((`$INDEX_APP update "${FILEPATH}" "${INDEX_DB}" ${opt} 2>> $LOG`))
     cp -f ${FILEPATH}${TEMP_DIR}/list.txt ${FILEPATH}${TEMP_DIR}/list.txt~
 }
 
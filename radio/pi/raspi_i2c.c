@@ -45,16 +45,11 @@ https://bokunimo.net/git/raspi_lcd/blob/master/raspi_i2c.h
 
 // #define RASPI_GPIO //【動作速度が、かなり遅い】
 
-#define I2C_lcd 0x3E						// LCD の I2C アドレス
 #define I2C_lcd_OSC			4				// OSC 0(低速)～7(高速)
 #define I2C_lcd_Contrast	33				// Cnt 0(淡)～63(濃)
 #define I2C_lcd_Booster		1				// Boost 0(OFF=5V時)～1(ON=3.3V時)
 
 #ifndef ARDUINO // Raspberry Pi, Linux
-	#define PORT_SCL	"/sys/class/gpio/gpio3/value"		// I2C SCLポート
-	#define PORT_SDA	"/sys/class/gpio/gpio2/value"		// I2C SDAポート
-	#define PORT_SDANUM	2									// I2C SDAポートの番号
-															// SCLはSDA+1(固定)
 	#define INPUT		"in"
 	#define OUTPUT		"out"
 	#define LOW			0
@@ -78,15 +73,27 @@ https://bokunimo.net/git/raspi_lcd/blob/master/raspi_i2c.h
 	unsigned long micros_prev;
 #else  // Raspberry Pi, Linux
 	typedef unsigned char byte; 
+	char PORT_SCL[48]="/sys/class/gpio/gpio3/value";	// I2C SCLポート
+	char PORT_SDA[48]="/sys/class/gpio/gpio2/value";	// I2C SDAポート
+	int PORT_SDANUM=2;									// I2C SDAポートの番号
+														// SCLはSDA+1(固定)
 	FILE *fgpio;
 	char buf[S_NUM];
 	struct timeval micros_time;				//time_t micros_time;
 	int micros_prev,micros_sec;
 #endif
+byte I2C_lcd=0x3E;								// LCD の I2C アドレス
 int ERROR_CHECK=1;								// 1:ACKを確認／0:ACKを無視する
 int SLOW_MODE=0;								// 0:高速転送／1:低速転送
 static byte _lcd_size_x=8;
 static byte _lcd_size_y=2;
+static byte _lcd_shadow[2][20];					// 液晶に表示中の内容(差分転送用)
+static byte _lcd_shadow_ok[2]={0,0};			// 0:表示内容が不明
+int LCD_DIFF=0;									// 1:文字列表示も差分転送する
+int LCD_SAVED=0;								// 差分転送で削減したバイト数(直近)
+unsigned long LCD_SAVED_SUM=0;					// 差分転送で削減したバイト数(累計)
+static byte _lcd_cgram[64];						// CGRAMに転送済みのフォント(8文字分)
+static byte _lcd_cgram_ok=0;					// 内容が既知のフォント番号(ビット毎)
 
 int _micros(){
 	#ifdef ARDUINO
@@ -184,9 +191,9 @@ byte pinMode(char *port, char *mode){
 	return 1;
   #else
 	int i=0;
-	char dir[]="/sys/class/gpio/gpio3/direction";
-			 // 01234567890123456789012345678901	22 Bytes
-	dir[20]=port[20];
+	char dir[48];
+	int len=strlen(port)-5;				// "/sys/class/gpio/gpioN/value" の value 前まで
+	snprintf(dir, sizeof(dir), "%.*sdirection", len, port);	// 2桁のポート番号にも対応
 	#ifdef DEBUG
 	//	fprintf(stderr,"pinMode %s %s\n",dir,mode);
 	#endif
@@ -287,6 +294,9 @@ byte digitalWrite(char *port, int value){
 #ifndef ARDUINO // Raspberry Pi, Linux
 byte i2c_hard_reset(int port){
 	// 戻り値：０の時はエラー
+	_lcd_cgram_ok = 0;							// リセット後のCGRAMと表示内容は不定
+	_lcd_shadow_ok[0] = 0;
+	_lcd_shadow_ok[1] = 0;
   #ifdef RASPI_GPIO  // 動作未確認
 	char com[]="/usr/bin/raspi-gpio set 00 dl 2>/dev/null";
 			//	012345678901234567890123456789012345678901	42 bytes
@@ -542,6 +552,15 @@ byte i2c_tx(const byte in){
 	return (byte)i;
 }
 
+#ifndef ARDUINO // Raspberry Pi, Linux
+void i2c_set_port(int sda){
+// I2Cポートの変更(複数の液晶を別々のI2Cバスで使用する時) SCLはSDA+1
+	PORT_SDANUM = sda;
+	snprintf(PORT_SDA, sizeof(PORT_SDA), "/sys/class/gpio/gpio%d/value", sda);
+	snprintf(PORT_SCL, sizeof(PORT_SCL), "/sys/class/gpio/gpio%d/value", sda + 1);
+}
+#endif
+
 byte i2c_init(void){
 // 戻り値：０の時はエラー
 	int i;
@@ -777,6 +796,59 @@ byte i2c_lcd_out(byte y,byte *lcd){
 			if(ret)fprintf(stderr,"ERROR LOD_OUT Y=%d [%s]\n",y,lcd);
 		#endif
 	}
+	memcpy(_lcd_shadow[y], lcd, _lcd_size_x);
+	_lcd_shadow_ok[y] = !ret;
+	return !ret;
+}
+
+byte i2c_lcd_out_diff(byte y,byte *lcd){
+// 前回の表示内容と比較し、変化したセルの範囲だけを転送する
+// 戻り値：０の時はエラー
+	byte data[22];
+	byte i, x, end, gap;
+	byte ret=0;
+	int full, sent=0;
+
+	if(y) y=1;
+	if(SLOW_MODE) full = 3 + 3 * _lcd_size_x;		// i2c_lcd_out の転送バイト数
+	else full = 3 + 10 * ((_lcd_size_x + 7) / 8);	// (I2Cアドレスを含む)
+	if(!_lcd_shadow_ok[y]){
+		LCD_SAVED = 0;
+		return i2c_lcd_out(y,lcd);
+	}
+	x=0;
+	while(x < _lcd_size_x){
+		if(lcd[x] == _lcd_shadow[y][x]){
+			x++;
+			continue;
+		}
+		end = x + 1;								// 変化したセルの範囲 x～end-1
+		for(i = end; i < _lcd_size_x; i++){
+			if(lcd[i] != _lcd_shadow[y][i]) end = i + 1;
+			gap = i - end + 1;						// 未変化セルの連続数
+			if(gap >= 5) break;						// アドレス設定より長ければ分割
+		}
+		data[0]=0x00;
+		data[1]=0x80 + 0x40 * y + x;				// DDRAMアドレス設定
+		ret += !i2c_write(I2C_lcd, data, 2);
+		sent += 3;
+		if(!SLOW_MODE){
+			data[0]=0x40;							// 書き込みモード
+			memcpy(data+1, lcd + x, end - x);
+			ret += !i2c_write(I2C_lcd, data, end - x + 1);
+			sent += end - x + 2;
+		}else for(i=x;i<end;i++){
+			data[0]=0x40;
+			data[1]=lcd[i];
+			ret += !i2c_write(I2C_lcd, data, 2);
+			sent += 3;
+		}
+		memcpy(_lcd_shadow[y] + x, lcd + x, end - x);
+		x = end;
+	}
+	if(ret) _lcd_shadow_ok[y] = 0;					// エラー時は次回に全転送
+	LCD_SAVED = full - sent;
+	LCD_SAVED_SUM += LCD_SAVED;
 	return !ret;
 }
 
@@ -881,6 +953,8 @@ byte i2c_lcd_init(void){
 		return;
 	#endif
 	byte ret=0;
+	_lcd_shadow_ok[0] = 0;						// 表示内容が不明になる
+	_lcd_shadow_ok[1] = 0;
 	/**************************** 8バイトをまとめて転送 ***********************/
 	//                 IS=1  OSC  Cnt  Pow   FC IS=0   ON
 	byte data[8]={0x00,0x39,0x14,0x70,0x50,0x6C,0x38,0x0C};	// 0x00 + コマンド7バイト
@@ -998,13 +1072,23 @@ byte i2c_lcd_set_fonts(const byte *s, int len){
 	}
 	*/
 	for(i=0;i<len;i+=8){
+		if( (_lcd_cgram_ok & (1 << (i/8))) && !memcmp(_lcd_cgram+i, s+i, 8) ){
+			LCD_SAVED_SUM += 3 + 10;			// 転送済みのフォントは省略(I2Cアドレスを含む)
+			continue;
+		}
 		data[0]= 0x00; // アドレス設定
 		data[1]= 0x40 + i; // アドレス設定
 		ret += !i2c_write(I2C_lcd, data, 2);	// CG-RAMのアドレス 0x40
 		data[0]= 0x40; // CG-RAM書き込み
 		memcpy(data+1, s+i, 8);
 		// for(j=0;j<9;j++) printf("%02x ",data[j]); printf("\n");
-		ret += !i2c_write(I2C_lcd, data, 9);	// CG-RAMへの転送
+		if( i2c_write(I2C_lcd, data, 9) ){		// CG-RAMへの転送
+			memcpy(_lcd_cgram+i, s+i, 8);
+			_lcd_cgram_ok |= 1 << (i/8);
+		}else{
+			_lcd_cgram_ok &= ~(1 << (i/8));		// 失敗時は次回に再転送
+			ret++;
+		}
 		// delay(1);
 	}
 	return !ret;
@@ -1016,6 +1100,60 @@ byte i2c_lcd_set_fonts(const byte *s, int len){
 	*/
 }
 
+#ifndef ARDUINO // Raspberry Pi, Linux
+byte i2c_lcd_state_load(const char *path){
+// CGRAMと表示内容を前回のプロセスから引き継ぐ  戻り値：保存時の桁数(０の時は引き継ぎなし)
+	FILE *fp;
+	byte buf[108], ret = 0;
+	fp = fopen(path, "rb");
+	if(!fp) return 0;
+	if(fread(buf, 1, 108, fp) == 108){
+		memcpy(_lcd_cgram, buf, 64);
+		_lcd_cgram_ok = buf[64];
+		_lcd_shadow_ok[0] = buf[66];
+		_lcd_shadow_ok[1] = buf[67];
+		memcpy(_lcd_shadow, buf + 68, 40);
+		ret = buf[65];
+	}
+	fclose(fp);
+	remove(path);								// 異常終了時に古い内容を引き継がない
+	return ret;
+}
+
+byte i2c_lcd_state_save(const char *path){
+// CGRAMと表示内容を次回のプロセスへ引き継ぐ  戻り値：０の時はエラー
+	FILE *fp;
+	byte buf[108];
+	memcpy(buf, _lcd_cgram, 64);
+	buf[64] = _lcd_cgram_ok;
+	buf[65] = _lcd_size_x;
+	buf[66] = _lcd_shadow_ok[0];
+	buf[67] = _lcd_shadow_ok[1];
+	memcpy(buf + 68, _lcd_shadow, 40);
+	fp = fopen(path, "wb");
+	if(!fp) return 0;
+	if(fwrite(buf, 1, 108, fp) != 108){
+		fclose(fp);
+		remove(path);
+		return 0;
+	}
+	fclose(fp);
+	return 1;
+}
+
+void i2c_lcd_state_clear(void){
+// 液晶を再初期化する時に、CGRAMと表示内容を不明にする
+	_lcd_cgram_ok = 0;
+	_lcd_shadow_ok[0] = 0;
+	_lcd_shadow_ok[1] = 0;
+}
+#endif
+
+byte _lcd_out(byte y,byte *lcd){
+	if(LCD_DIFF) return i2c_lcd_out_diff(y,lcd);
+	return i2c_lcd_out(y,lcd);
+}
+
 byte i2c_lcd_print(const char *s){
 // 戻り値：０の時はエラー
 	byte i,j;
@@ -1032,15 +1170,15 @@ byte i2c_lcd_print(const char *s){
 			lcd[i]=(byte)str[i+_lcd_size_x*j];
 			if(lcd[i]==0x00){
 				for(;i<_lcd_size_x;i++) lcd[i]=' ';
-				ret += !i2c_lcd_out(j,lcd);
+				ret += !_lcd_out(j,lcd);
 				if(j==0){
 					for(i=0;i<_lcd_size_x;i++) lcd[i]=' ';
-					ret += !i2c_lcd_out(1,lcd);
+					ret += !_lcd_out(1,lcd);
 				}
 				return !ret;
 			}
 		}
-		ret += !i2c_lcd_out(j,lcd);
+		ret += !_lcd_out(j,lcd);
 	}
 	return !ret;
 }
@@ -1060,11 +1198,11 @@ byte i2c_lcd_print2(const char *s){
 		lcd[i]=(byte)str[i];
 		if(lcd[i]==0x00){
 			for(;i<_lcd_size_x;i++) lcd[i]=' ';
-			ret += !i2c_lcd_out(1,lcd);
+			ret += !_lcd_out(1,lcd);
 			return !ret;
 		}
 	}
-	ret += !i2c_lcd_out(1,lcd);
+	ret += !_lcd_out(1,lcd);
 	return !ret;
 }
 
@@ -37,6 +37,7 @@ void i2c_error(const char *s);
 #ifndef ARDUINO // ## for Raspberry Pi, Linux, Cygwin
     byte i2c_hard_reset(int port);
     byte i2c_hard_quit(int port);
+    void i2c_set_port(int sda);
 #endif
 #ifdef ARDUINO
     void i2c_SCL(byte level);
@@ -53,6 +54,7 @@ byte i2c_check(byte adr);
 byte i2c_read(byte adr, byte *rx, byte len);
 byte i2c_write(byte adr, byte *tx, byte len);
 byte i2c_lcd_out(byte y,byte *lcd);
+byte i2c_lcd_out_diff(byte y,byte *lcd);
 void utf_del_uni(char *s);
 
 // LCD 初期化
@@ -63,6 +65,11 @@ void i2c_lcd_set_xy(byte x, byte y);
     void i2c_lcd_init_xy_sdascl(byte x,byte y,byte sda,byte scl);
 #endif
 byte i2c_lcd_set_fonts(const byte *s, int len);
+#ifndef ARDUINO // ## for Raspberry Pi, Linux, Cygwin
+    byte i2c_lcd_state_load(const char *path);
+    byte i2c_lcd_state_save(const char *path);
+    void i2c_lcd_state_clear(void);
+#endif
 
 // LCD 表示命令
 byte i2c_lcd_print(const char *s);
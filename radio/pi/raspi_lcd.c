@@ -12,6 +12,27 @@ I2C接続の小型液晶に文字を表示する
   -rPORT	液晶のリセット信号用GPIOポート番号
   -wWIDTH	液晶の表示桁数8または16
   -yROW		表示行1または2
+  -dSDA		I2C SDA用GPIOポート番号(SCLはSDA+1, 液晶を複数使う時)
+  -aADDR	液晶のI2Cアドレス(16進数, 初期値 3E)
+
+-f 使用時のフレーム(1行1フレーム、ESC=0x1B で始まる行はコマンド)
+  ESC b LV1 [LV2]	レベルメータ表示(LV=0～100)
+  ESC 1 text		1行目に文字列を表示(従来の1行入力と同じ)
+  ESC 2 text		2行目に文字列を表示
+  ESC g HEX		CGRAMへフォントを転送(16進数 最大64バイト)
+  ESC m MODE		表示モード t:文字, b:レベルメータ, s:目盛付きレベルメータ
+  ESC r ROW HEX	ROW行目(1または2)にフォント番号列を表示(16進数)
+  ESC R PORT		液晶をリセットして再初期化し、使用中のフォントを再転送
+  [EOF]			待ち受けを終了する
+  (上記以外)		従来通り文字列を表示
+
+CGRAMのフォントは転送済みの内容を記憶し、変化したフォントだけを転送します。
+終了時に表示内容と共に /tmp/raspi_lcd_SDA_ADDR.state へ保存し、次回の起動時に
+引き継ぐので、文字表示とレベルメータ表示を切り替えてもフォントを再転送せず、
+液晶の初期化も省略して変化した文字だけを転送します(-r や異常終了で破棄)。
+-f の常駐中は /tmp/raspi_lcd_SDA_ADDR.fifo でもフレームを受け付けます。常駐中に
+起動した raspi_lcd は、I2C を使わずに文字列(ESC 1/ESC 2)、レベル(ESC b)、
+リセット(ESC R)をこの FIFO へ転送するので、常駐側の記憶内容が古くなりません。
 										Copyright (c) 2014-2023 Wataru KUNINO
 										https://bokunimo.net/raspi/
 							 			https://bokunimo.net/
@@ -40,18 +61,31 @@ https://bokunimo.net/git/raspi_lcd/blob/master/raspi_lcd.c
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/select.h>
+#include <sys/stat.h>
 #include "raspi_i2c.h"  // ###################### 【要注意】パス確認 ############
 // #include "../libs/soft_i2c.h" // #############       元ファイル版 ############
 
 typedef unsigned char byte;
 extern int ERROR_CHECK;				// オプション -i
+extern byte I2C_lcd;				// オプション -a
 extern int SLOW_MODE;				// オプション -s
+extern int LCD_DIFF;				// 差分転送(-f 使用時)
+extern int LCD_SAVED;				// 差分転送で削減したバイト数(直近)
+extern unsigned long LCD_SAVED_SUM;	// 差分転送で削減したバイト数(累計)
 int LOOP=0;							// オプション -f
 int PORT=-1;						// オプション -rPORT
 int WIDTH=8;						// オプション -wWIDTH
 int ROW=0;							// オプション -yROW
 int NOINIT=0;						// オプション -n
 int BAR=0;							// オプション -b
+int SDA=2;							// オプション -dSDA
+int SCALE=1;						// 目盛付きレベルメータ(ESC m s)
+char STATE_FILE[64];				// CGRAMと表示内容の引き継ぎ用
+char FIFO_FILE[64];					// 常駐中(-f)のフレーム受付用
 
 const byte font_lv[64]={
 	0x00,0x10,0x00,0x10,0x00,0x10,0x00,0x10,
@@ -64,10 +98,197 @@ const byte font_lv[64]={
 	0x13,0x13,0x03,0x13,0x13,0x03,0x10,0x10
 };
 
+void lcd_bar_text(int lv, byte *s){
+// レベル値lv(0～100)を1行分のフォント番号に変換する
+	int i, i22, dispScale = 4;
+	int bar = (lv * WIDTH) / 50 - 1;
+	for(i=0;i<WIDTH;i++){
+		i22 = i * 2 + 1;				// セルの右側に相当するレベル値
+		if(i == 0){
+			if(bar < 0) s[0] = 0x00;
+			else if(bar == 0) s[0] = 0x01;
+			else s[0] = 0x02;
+		}else if(i < bar / 2){			// セル位置がレベル未満の時
+			s[i] = 0x02;				// セルの両側を点灯
+		}else if(i == bar / 2){	// セル位置がレベル位置の時
+			if(i22 == bar) s[i] = 0x02;
+			else if (bar>0) s[i] = 0x01;
+			else s[i] = 0x00;
+		}else{							// 点灯条件に該当しないとき
+			s[i] = 0x00;				// 非点灯表示
+		}
+		if(WIDTH >= 16 && SCALE && i % dispScale == 0 && s[i] < 0x04){
+			s[i] += 0x04;
+		}
+		// printf("s[%d]=%d\n",i,s[i]);
+	}
+}
+
+int FONT_LV=0;						// 1:CGRAMがレベルメータ用フォント
+byte FONT_USER[64];					// ESC g で受け取ったフォント(リセット後の再転送用)
+int FONT_USER_LEN=0;
+
+byte lcd_set_fonts(void){
+// 戻り値：０の時はエラー(転送済みのフォントは i2c_lcd_set_fonts が省略する)
+	int i=64; //フォント転送バイト数
+	if(WIDTH < 16 || !SCALE) i=32;
+	FONT_LV = i2c_lcd_set_fonts(font_lv, i);
+	FONT_USER_LEN = 0;
+	return FONT_LV;
+}
+
+byte lcd_reinit(int port){
+// 液晶をリセット(port<0 の時は省略)して再初期化し、使用中のフォントを再転送する
+	if(port >= 0) i2c_hard_reset(port);
+	i2c_lcd_state_clear();						// CGRAMと表示内容は不明
+	if( !i2c_lcd_init_xy(WIDTH,2) ) return 0;
+	if(FONT_LV) return lcd_set_fonts();
+	if(FONT_USER_LEN > 0) return i2c_lcd_set_fonts(FONT_USER, FONT_USER_LEN);
+	return 1;
+}
+
+int hex2bin(const char *s, byte *out, int max){
+// 16進数の文字列をバイト列に変換する  戻り値：バイト数
+	int n=0;
+	unsigned int v;
+	while(n < max && sscanf(s, "%2x", &v) == 1 && s[0] > ' ' && s[1] > ' '){
+		out[n++] = (byte)v;
+		s += 2;
+	}
+	return n;
+}
+
+byte lcd_command(char *s){
+// -f 用 1フレームの処理  戻り値：０の時はエラー
+	int y, lv;
+	char *p, *e;
+	byte bar[64];
+	if(s[0] != 0x1B) return i2c_lcd_print(s);	// 従来の文字列表示
+	switch(s[1]){
+		case 'b':								// ESC b LV1 [LV2]
+			if( !FONT_LV && !lcd_set_fonts() ) return 0;
+			p = s + 2;
+			for(y = ROW; y < 2; y++){
+				lv = (int)strtol(p, &e, 10);
+				if(e == p) break;
+				lcd_bar_text(lv, bar);
+				if( !i2c_lcd_out_diff(y, bar) ) return 0;
+				p = e;
+			}
+			return 1;
+		case '1':								// ESC 1 text
+			return i2c_lcd_print(s + 2);
+		case '2':								// ESC 2 text
+			return i2c_lcd_print2(s + 2);
+		case 'g':								// ESC g HEX (フォント)
+			p = s + 2;
+			while(*p == ' ') p++;
+			lv = hex2bin(p, bar, 64) / 8 * 8;
+			if(lv == 0) return 1;
+			FONT_LV = 0;
+			memcpy(FONT_USER, bar, lv);
+			FONT_USER_LEN = lv;
+			return i2c_lcd_set_fonts(bar, lv);
+		case 'm':								// ESC m MODE (表示モード)
+			p = s + 2;
+			while(*p == ' ') p++;
+			if(*p == 'b' || *p == 's'){			// レベルメータ用フォントは ESC b で転送
+				if(SCALE != (*p == 's')) FONT_LV = 0;
+				SCALE = (*p == 's');
+			}
+			return 1;							// 文字表示(t)はフォントを使用しない
+		case 'r':								// ESC r ROW HEX (フォント番号列)
+			y = (int)strtol(s + 2, &p, 10) - 1;
+			if(y != 1) y = 0;
+			while(*p == ' ') p++;
+			memset(bar, ' ', sizeof(bar));
+			hex2bin(p, bar, WIDTH);
+			return i2c_lcd_out_diff(y, bar);
+		case 'R':								// ESC R PORT (他のプロセスの -r)
+			lv = (int)strtol(s + 2, &e, 10);
+			if(e == s + 2) lv = PORT;
+			return lcd_reinit(lv);
+	}
+	return 1;									// 未定義のコマンドは無視
+}
+
+typedef struct {						// -f 用 1行単位の読み込み
+	int fd;								// -1:終了
+	int len;
+	char buf[256];
+} LINE_IN;
+
+int line_get(LINE_IN *in, char *line, int size){
+// 受信済みのデータから1行(改行を含む)を取り出す  戻り値：０の時は1行分のデータなし
+	char *p = memchr(in->buf, '\n', in->len);
+	int n;
+	if(p) n = p - in->buf + 1;
+	else if(in->len == sizeof(in->buf)) n = in->len;	// 長すぎる行は分割
+	else return 0;
+	if(n < size){
+		memcpy(line, in->buf, n);
+		line[n] = '\0';
+	}else{
+		memcpy(line, in->buf, size - 1);
+		line[size - 1] = '\0';
+	}
+	in->len -= n;
+	memmove(in->buf, in->buf + n, in->len);
+	return 1;
+}
+
+int line_read(LINE_IN *in, int n){
+// 標準入力(in[0])かFIFOにデータが届くまで待つ  戻り値：０の時は標準入力が終了
+	fd_set fds;
+	int i, len, max = -1;
+	if(in[0].fd < 0) return 0;
+	FD_ZERO(&fds);
+	for(i = 0; i < n; i++) if(in[i].fd >= 0){
+		FD_SET(in[i].fd, &fds);
+		if(in[i].fd > max) max = in[i].fd;
+	}
+	if(select(max + 1, &fds, NULL, NULL, NULL) < 0) return errno == EINTR;
+	for(i = 0; i < n; i++){
+		if(in[i].fd < 0 || !FD_ISSET(in[i].fd, &fds)) continue;
+		len = read(in[i].fd, in[i].buf + in[i].len, sizeof(in[i].buf) - in[i].len);
+		if(len > 0) in[i].len += len;
+		else if(i == 0 && (len == 0 || errno != EAGAIN)){
+			in[0].fd = -1;						// 標準入力の終了
+			if(in[0].len > 0) in[0].buf[in[0].len++] = '\n';	// 改行のない最終行
+		}
+	}
+	return 1;
+}
+
+int fifo_open(void){
+// 常駐中(-f)のフレーム受付用 FIFO を作成する  戻り値：-1 の時は FIFO なし
+	int fd;
+	unlink(FIFO_FILE);							// 異常終了時に残った FIFO
+	if(mkfifo(FIFO_FILE, 0666) != 0) return -1;
+	chmod(FIFO_FILE, 0666);						// umask に関わらず他のユーザからも転送可能に
+	fd = open(FIFO_FILE, O_RDWR | O_NONBLOCK);	// 自身も書き手になり EOF を受けない
+	if(fd < 0) unlink(FIFO_FILE);
+	return fd;
+}
+
+int lcd_forward(const char *frames){
+// 常駐中の raspi_lcd -f へフレームを転送する  戻り値：０の時は常駐プロセスなし
+	int fd, len, ret;
+	fd = open(FIFO_FILE, O_WRONLY | O_NONBLOCK);	// 読み手がいない時は失敗(ENXIO)
+	if(fd < 0) return 0;
+	len = strlen(frames);						// PIPE_BUF 以下なので分割されない
+	ret = write(fd, frames, len) == len;
+	close(fd);
+	return ret;
+}
+
 int main(int argc,char **argv){
-	int num=1, i, y, bar, i22, dispScale = 4;
+	int num=1, y, frames, valid=0, err=0;
 	// int peak;
 	char s[97]; s[0]='\0';
+	char line[256];						// -f 用 1フレーム
+	char fwd[256]; fwd[0]='\0';		// 常駐中の raspi_lcd -f への転送用
+	LINE_IN in[2];						// -f 用 標準入力と FIFO
 	while(argc >=num+1 && argv[num][0]=='-'){
 		if(argv[num][1]=='i') ERROR_CHECK=0;
 		if(argv[num][1]=='s') SLOW_MODE=1;
@@ -80,8 +301,6 @@ int main(int argc,char **argv){
 				num++;
 				PORT = atoi(argv[num]);
 			}
-			printf("reset (%d)\n",PORT);
-			i2c_hard_reset(PORT);
 		}
 		if(argv[num][1]=='q'){
 			PORT=atoi(&argv[num][2]);
@@ -93,6 +312,24 @@ int main(int argc,char **argv){
 			i2c_hard_quit(PORT);
 			return 0;
 		}
+		if(argv[num][1]=='d'){
+			SDA=atoi(&argv[num][2]);
+			if( SDA == 0 && argc > num+1 ){
+				num++;
+				SDA = atoi(argv[num]);
+			}
+			printf("I2C SDA (%d), SCL (%d)\n",SDA,SDA+1);
+			i2c_set_port(SDA);
+		}
+		if(argv[num][1]=='a'){
+			y=(int)strtol(&argv[num][2],NULL,16);
+			if( y == 0 && argc > num+1 ){
+				num++;
+				y = (int)strtol(argv[num],NULL,16);
+			}
+			if( y > 0 && y < 0x80 ) I2C_lcd = (byte)y;
+			printf("LCD I2C address (0x%02X)\n",I2C_lcd);
+		}
 		if(argv[num][1]=='w'){
 			WIDTH=atoi(&argv[num][2]);
 			if( WIDTH == 0 && argc > num+1 ){
@@ -113,44 +350,74 @@ int main(int argc,char **argv){
 		}
 		if(argv[num][1]=='h'){
 			printf("Usage:\n");
-			printf("  %s [-i] [-f] [-r port] [-w lcd_width] [-y row] [text...]\n",argv[0]);
-			printf("  echo text... | %s [-i] [-f] [-r port] [-w lcd_width] [-y row]\n",argv[0]);
+			printf("  %s [-i] [-f] [-r port] [-d sda] [-a addr] [-w lcd_width] [-y row] [text...]\n",argv[0]);
+			printf("  echo text... | %s [-i] [-f] [-r port] [-d sda] [-a addr] [-w lcd_width] [-y row]\n",argv[0]);
 			printf("  %s -h # for help\n",argv[0]);
 			printf("  %s -q # for release I2C ports\n\n",argv[0]);
 			printf("    options:\n");
 			printf("      -i      ignore I2C communication errors\n");
 			printf("      -s      slowdown I2C communication mode\n");
 			printf("      -rPORT  set GPIO port number of reset LCD pin; number for PORT\n");
+			printf("      -dSDA   set GPIO port number of I2C SDA (SCL=SDA+1)\n");
+			printf("      -aADDR  set I2C address of LCD in hex (default 3E)\n");
 			printf("      -wWIDTH set display digits; 8 or 16 for WITDH\n");
 			printf("      -yROW   set display row; 1 or 2 for ROW\n");
 			printf("      -b      display bar graph and values\n");
 			printf("      text... display text string on the LCD\n");
 			printf("      -n      skip initializing LCD\n");
 			printf("      -f      use standard input, continuously\n");
+			printf("              ESC b LV1 [LV2] / ESC 1 text / ESC 2 text / [EOF]\n");
+			printf("              ESC g HEX(fonts) / ESC r ROW HEX(font codes)\n");
+			printf("              ESC m t|b|s (text / bar / bar with scale)\n");
+			printf("              ESC R PORT (reset and re-initialize LCD)\n");
+			printf("              other instances forward text, bar and reset to it\n");
 			printf("      -qPORT  restore GPIO port and I2C ports\n");
 			printf("      -h      display this help on the terminal\n\n");
 			printf("    オプション(in Japanese):\n");
 			printf("      -i      I2C通信のエラーを無視する\n");
 			printf("      -rPORT  液晶のリセット信号用GPIOポート番号\n");
+			printf("      -dSDA   I2C SDA用GPIOポート番号(SCLはSDA+1)\n");
+			printf("      -aADDR  液晶のI2Cアドレス(16進数, 初期値 3E)\n");
 			printf("      -wWIDTH 液晶の表示桁数8または16\n");
 			printf("      -yROW   表示行1または2\n");
 			printf("      -b      レベルメータ表示\n");
 			printf("      text... 表示したい文字列\n");
 			printf("      -n      液晶の初期化を実行しない\n");
 			printf("      -f      標準入力から待ち受けを行う（終了しない）\n");
+			printf("              常駐中は他の raspi_lcd の表示とリセットを受け付ける\n");
 			printf("      -qPORT  使用していたGPIOポートの開放\n");
 			printf("      -h      本ヘルプの表示\n");
 			return 0;
 		}
 		num++;
 	}
+	snprintf(STATE_FILE, sizeof(STATE_FILE), "/tmp/raspi_lcd_%d_%02X.state", SDA, I2C_lcd);
+	snprintf(FIFO_FILE, sizeof(FIFO_FILE), "/tmp/raspi_lcd_%d_%02X.fifo", SDA, I2C_lcd);
+	if( !LOOP && PORT >= 0 ) snprintf(fwd, sizeof(fwd), "\x1bR%d\n", PORT);
 	/* レベルメータ用 ******************************************************* */
+	if(BAR > 0 && num < argc && !LOOP){			// 常駐中の raspi_lcd -f へ転送
+		strcat(fwd, "\x1b" "b");
+		for(y = ROW; y < 2 && num + y - ROW < argc; y++){
+			snprintf(line, sizeof(line), " %d", atoi(argv[num + y - ROW]));
+			strcat(fwd, line);
+		}
+		strcat(fwd, "\n");
+		if( lcd_forward(fwd) ){
+			printf("forwarded to LCD daemon\n");
+			return 0;
+		}
+	}
+	if( PORT >= 0 ){
+		printf("reset (%d)\n",PORT);
+		remove(STATE_FILE);						// リセット前の内容を引き継がない
+		i2c_hard_reset(PORT);
+	}else valid = i2c_lcd_state_load(STATE_FILE) == WIDTH;	// 前回のCGRAMと表示内容を引き継ぐ
 	if(BAR > 0 && num < argc){
 		if( !i2c_init() ){
 			fprintf(stderr,"I2C ERROR in INIT\n");
 			if( ERROR_CHECK ) return 1;
 		}
-		if( PORT < 0 && NOINIT ){
+		if( valid || (PORT < 0 && NOINIT) ){	// 初期化済みの時は初期化を省略
 			i2c_lcd_set_xy(WIDTH,2);
 		}else{
 			if( !i2c_lcd_init_xy(WIDTH,2) ){
@@ -158,41 +425,21 @@ int main(int argc,char **argv){
 				if( ERROR_CHECK ) return 2;
 			}else printf("LCD init\n");
 			// delay(199);
-			i=64; //フォント転送バイト数
-			if(WIDTH < 16) i=32;
-			if( !i2c_lcd_set_fonts(font_lv, i) ){
-				fprintf(stderr,"I2C ERROR in LCD_Set Fonts\n");
-				if( ERROR_CHECK ) return 4;
-			}
-			printf("send %d fonts\n",i/8);
-			// delay(199);
 		}
+		if( !lcd_set_fonts() ){					// 転送済みのフォントは省略される
+			fprintf(stderr,"I2C ERROR in LCD_Set Fonts\n");
+			if( ERROR_CHECK ) return 4;
+			err++;
+		}
+		printf("fonts (%d)\n",WIDTH < 16 ? 4 : 8);
+		// delay(199);
 		for(y = ROW; y < 2; y++){
-			bar = (atoi(argv[num]) * WIDTH) / 50 - 1;
-			printf("bar=%d\n",bar);
-			for(i=0;i<WIDTH;i++){
-				i22 = i * 2 + 1;				// セルの右側に相当するレベル値
-				if(i == 0){
-					if(bar < 0) s[0] = 0x00;
-					else if(bar == 0) s[0] = 0x01;
-					else s[0] = 0x02;
-				}else if(i < bar / 2){			// セル位置がレベル未満の時
-					s[i] = 0x02;				// セルの両側を点灯
-				}else if(i == bar / 2){	// セル位置がレベル位置の時
-					if(i22 == bar) s[i] = 0x02;
-					else if (bar>0) s[i] = 0x01;
-					else s[i] = 0x00;
-				}else{							// 点灯条件に該当しないとき
-					s[i] = 0x00;				// 非点灯表示
-				}
-				if(WIDTH >= 16 && i % dispScale == 0 && s[i] < 0x04){
-					s[i] += 0x04;
-				}
-				// printf("s[%d]=%d\n",i,s[i]);
-			}
-			if( !i2c_lcd_out(y, (byte*)s) ){
+			printf("bar=%d\n",(atoi(argv[num]) * WIDTH) / 50 - 1);
+			lcd_bar_text(atoi(argv[num]), (byte*)s);
+			if( !i2c_lcd_out_diff(y, (byte*)s) ){
 				fprintf(stderr,"I2C ERROR in LCD_OUT row=2\n");
 				if( ERROR_CHECK ) return 4;
+				err++;
 			}
 			num++;
 			if(num >= argc){
@@ -200,6 +447,7 @@ int main(int argc,char **argv){
 				break;
 			}
 		}
+		if( !err ) i2c_lcd_state_save(STATE_FILE);	// エラー時は次回に初期化
 		i2c_close();
 		/* 下記はpeak表示ありの場合
 		peak = WIDTH * 2;
@@ -236,31 +484,43 @@ int main(int argc,char **argv){
 	}
 
 	/* 通常表示用 *********************************************************** */
-	if(argc==num) fgets(s,sizeof(s),stdin);
-	else while(num<argc && strlen(s)<94){
+	if(argc==num){
+		if(!LOOP) fgets(s,sizeof(s),stdin);
+	}else while(num<argc && strlen(s)<94){
 		strncat(s,argv[num],95);
 		// utf_del_uni(s);
 		strncat(s," ",95);
 		num++;
 	}
-	if(strlen(s)==0){
+	if(strlen(s)==0 && !LOOP){
 		if(ERROR_CHECK) strncat(s,"ｴﾗｰ ｦ ﾑｼ ｼﾃ ｿｳｼﾝ",95);
 		else strncat(s,"ﾎﾞｸﾆﾓﾜｶﾙ Rasp.Pi",95);
 	}
+	if( !LOOP ){								// 常駐中の raspi_lcd -f へ転送
+		s[strcspn(s,"\r\n")] = '\0';
+		snprintf(line, sizeof(line), "\x1b%c%s\n", ROW ? '2' : '1', s);
+		strcat(fwd, line);
+		if( lcd_forward(fwd) ){
+			printf("forwarded to LCD daemon\n");
+			return 0;
+		}
+	}
 	if( !i2c_init() ){
 		fprintf(stderr,"I2C ERROR in INIT\n");
 		if( ERROR_CHECK ) return 1;
 	}
 //	if( !i2c_lcd_init() ){
+	LCD_DIFF = 1;							// 以降は変化したセルのみ転送
 	if( !ROW ){ // 1行目
-		if( PORT < 0 && NOINIT ) i2c_lcd_set_xy(WIDTH,2);
+		if( valid || (PORT < 0 && NOINIT) ) i2c_lcd_set_xy(WIDTH,2);
 		else if( !i2c_lcd_init_xy(WIDTH,2) ){
 			fprintf(stderr,"I2C ERROR in LCD_INIT\n");
 			if( ERROR_CHECK ) return 2;
 		} else printf("LCD init\n");
-		if( !i2c_lcd_print(s) ){
+		if( strlen(s) > 0 && !i2c_lcd_print(s) ){
 			fprintf(stderr,"I2C ERROR in LCD_PRINT row=1\n");
 			if( ERROR_CHECK ) return 3;
+			err++;
 		}
 	}else{		// 2行目が指定されている時
 		if( PORT < 0 || NOINIT )i2c_lcd_set_xy(WIDTH,2);
@@ -268,19 +528,40 @@ int main(int argc,char **argv){
 			fprintf(stderr,"I2C ERROR in LCD_INIT\n");
 			if( ERROR_CHECK ) return 2;
 		}else printf("LCD init\n");
-		if( !i2c_lcd_print2(s) ){
+		if( strlen(s) > 0 && !i2c_lcd_print2(s) ){
 			fprintf(stderr,"I2C ERROR in LCD_PRINT row=2\n");
 			if( ERROR_CHECK ) return 3;
+			err++;
 		}
 	}
-	while(LOOP && !feof(stdin) ){
-		fgets(s,sizeof(s),stdin);
-		if( !i2c_lcd_print(s) ){
-			i2c_hard_reset(PORT);
+	frames = 0;
+	if( LOOP ){
+		in[0].fd = fileno(stdin);				// 標準入力
+		in[1].fd = fifo_open();					// 他の raspi_lcd からの転送
+		in[0].len = in[1].len = 0;
+	}
+	while(LOOP){
+		if( !line_get(&in[0], line, sizeof(line)) && !line_get(&in[1], line, sizeof(line)) ){
+			if( !line_read(in, 2) ) break;
+			continue;
+		}
+		if(strncmp(line,"[EOF]",5)==0) break;
+		frames++;
+		if( !lcd_command(line) ){
 			fprintf(stderr,"I2C ERROR in LOOP mode\n");
+			err++;
+			if( PORT >= 0 ) lcd_reinit(PORT);	// 液晶をリセットして再初期化
 		}
-		if(strncmp(s,"[EOF]",5)==0) LOOP=0;
 	}
+	if(LOOP && in[1].fd >= 0){
+		close(in[1].fd);
+		unlink(FIFO_FILE);
+	}
+	if(LOOP && frames > 0){
+		printf("LCD frames=%d, saved=%lu bytes (%.1f bytes/frame)\n",
+			frames, LCD_SAVED_SUM, (double)LCD_SAVED_SUM / frames);
+	}
+	if( !err ) i2c_lcd_state_save(STATE_FILE);	// エラー時は次回に初期化
 	i2c_close();
 	return 0;
 }
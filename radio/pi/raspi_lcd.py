@@ -5,18 +5,26 @@ import sys
 import os
 import subprocess
 import datetime
-from time import sleep									# スリープ実行モジュールの取得
+from time import sleep,time								# スリープ実行モジュールの取得
 
 class RaspiLcd:
 
-	def __init__(self,ignoreError=False,x=16,reset=0):	# コンストラクタ作成
+	def __init__(self,ignoreError=False,x=16,reset=0,daemon=False,verbose=False,sda=0,addr=0):	# コンストラクタ作成
 		self.restoreUsedGpio = False					# 使用したGPIOを終了時に開放しない
 		self.title = "ﾎﾞｸﾆﾓﾜｶﾙ Rasp.Pi by bokunimo.net"
 		self.dir = os.path.dirname(__file__)
 		self.ignoreError = ignoreError
 		self.reset_port  = reset						# GPIO ポート番号
 		self.width = x									# LCD Digits
-		self.bar = None									# 棒グラフの初期化状態
+		self.sda_port = sda								# I2C SDA の GPIO 番号(0:既定値 GPIO2)
+		self.i2c_addr = addr							# LCD の I2C アドレス(0:既定値 0x3E)
+		self.bar = None									# 初期化状態(初回のみリセット)
+		self.glyphs = None								# CGRAMへ転送済みのフォント(常駐時)
+		self.fonts = None								# setFonts で指定されたフォント(再起動時に再転送)
+		self.mode = None								# 表示モード(常駐時)
+		self.daemon = daemon							# raspi_lcd -f を常駐させる
+		self.proc = None								# 常駐中の raspi_lcd プロセス
+		self.verbose = verbose							# printBar 毎にログを表示する
 		print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
 		print('LCD initialized')
 
@@ -35,21 +43,84 @@ class RaspiLcd:
 			raise Exception('ERROR: raspi_lcd, return data='+ret)
 		return data
 
+	def open(self):										# raspi_lcd -f を常駐起動する
+		if self.proc is not None and self.proc.poll() is None:
+			return self.proc
+		path = self.dir + '/raspi_lcd'					# raspi_lcd モジュールのパス
+		app = [path, '-f']								# 標準入力から待ち受け
+		if self.ignoreError == True:
+			app.append('-i')
+		app += self.i2c_args()
+		if self.width > 8:
+			app.append('-w'+str(self.width))
+		if self.reset_port > 0:
+			app.append('-r'+str(self.reset_port))		# 起動時に1回だけリセット
+		self.proc = subprocess.Popen(app, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+		self.glyphs = None								# 新しいプロセスへは再転送が必要
+		self.mode = None
+		if self.fonts is not None:						# リセットで消えたフォントを再転送
+			self.proc.stdin.write(b'\x1bg' + self.fonts.hex().encode() + b'\n')
+			self.proc.stdin.flush()
+			self.glyphs = self.fonts
+		print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
+		print('LCD daemon started, pid =', self.proc.pid)
+		return self.proc
+
+	def i2c_args(self):									# 複数のLCDを使う時の I2C バス・アドレス指定
+		app = []
+		if self.sda_port > 0:
+			app.append('-d'+str(self.sda_port))			# SCL は SDA+1
+		if self.i2c_addr > 0:
+			app.append('-a'+format(self.i2c_addr, 'X'))	# 16進数
+		return app
+
+	def close(self):									# 常駐中の raspi_lcd を終了する
+		if self.proc is None:
+			return
+		try:
+			self.proc.stdin.write(b'[EOF]\n')
+			self.proc.stdin.close()
+			self.proc.wait(timeout=5)
+		except (OSError, subprocess.TimeoutExpired):
+			self.proc.kill()
+		self.proc = None
+
+	def send(self, frame):								# 常駐中の raspi_lcd へ1フレーム送信
+		line = frame.replace('\n', ' ').encode() + b'\n'
+		for retry in range(2):
+			try:
+				proc = self.open()						# 起動できない時も OSError
+				proc.stdin.write(line)
+				proc.stdin.flush()
+				return 0
+			except OSError:								# BrokenPipe 等
+				self.proc = None
+		if self.ignoreError == True:
+			return 1
+		raise Exception('ERROR: LCD daemon')
+
 	def print(self, data=None, y=1):
 		if self.width != 8 and self.width != 16:
 			raise Exception('ERROR: LCD width')
 		if data is None:
 			data = self.title
+		if self.daemon:
+			ret = self.send('\x1b' + ('2' if y == 2 else '1') + data)
+			print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
+			print('LCD', data[0:self.width])
+			return ret
 		path = self.dir + '/raspi_lcd'					# raspi_lcd モジュールのパス
 		app = [path]	# 起動設定
 		if self.ignoreError == True:
 			app.append('-i')
+		app += self.i2c_args()
 		if self.width > 8:
 			app.append('-w'+str(self.width))
 		if y == 2:
 			app.append('-y'+str(y))
-		elif self.reset_port > 0:
-			app.append('-r'+str(self.reset_port))
+		elif self.bar is None and self.reset_port > 0:
+			app.append('-r'+str(self.reset_port))		# 初回のみ(CGRAMを引き継ぐため)
+		self.bar = 'inited'
 		app.append(data)
 		# print(app)									# DEBUG app引数確認用
 		res = subprocess.run(app,input=None,stdout=subprocess.PIPE)# サブプロセスとして起動
@@ -72,10 +143,18 @@ class RaspiLcd:
 	def printBar(self, data=[0], y=1):
 		if self.width != 8 and self.width != 16:
 			raise Exception('ERROR: LCD width')
+		if self.daemon:
+			ret = self.send('\x1bb ' + ' '.join([str(int(v)) for v in data[0:2]]))
+			self.glyphs = None							# レベルメータ用フォントに置き換わる
+			if self.verbose:
+				print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
+				print('LCD printBar', data)
+			return ret
 		path = self.dir + '/raspi_lcd'					# raspi_lcd モジュールのパス
 		app = [path]	# 起動設定
 		if self.ignoreError == True:
 			app.append('-i')
+		app += self.i2c_args()
 		if self.bar is None:
 			if self.reset_port > 0:
 				app.append('-r'+str(self.reset_port))
@@ -95,11 +174,57 @@ class RaspiLcd:
 		ret = res.returncode							# 終了コードをretへ代入
 		if ret != 0:
 			raise Exception('ERROR: bar')
-		print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
-		print('LCD printBar', data)
+		if self.verbose:
+			print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
+			print('LCD printBar', data)
+		return ret
+
+	def setFonts(self, fonts):							# CGRAMへフォントを転送(常駐時のみ)
+		if not self.daemon:
+			raise Exception('ERROR: setFonts requires daemon mode')
+		fonts = bytes(fonts[0:64])
+		if fonts == self.glyphs:
+			self.fonts = fonts
+			return 0									# 転送済み
+		ret = self.send('\x1bg' + fonts.hex())			# raspi_lcd は変化したフォントのみ転送
+		self.fonts = fonts								# 送信後に記憶(起動時の再転送と重複しない)
+		self.glyphs = fonts if ret == 0 else None
+		self.mode = None
+		return ret
+
+	def setMode(self, mode):							# 表示モード text, bar, scale(目盛付き)
+		if not self.daemon:
+			raise Exception('ERROR: setMode requires daemon mode')
+		if mode not in ('text', 'bar', 'scale'):
+			raise Exception('ERROR: LCD mode ' + str(mode))
+		if mode == self.mode:
+			return 0
+		ret = self.send('\x1bm' + mode[0])				# フォントは ESC b の時に差分のみ転送
+		self.mode = mode if ret == 0 else None
+		if mode != 'text':
+			self.glyphs = None							# レベルメータ用フォントに置き換わる
 		return ret
 
+	def printRaw(self, data, y=1):						# フォント番号列を表示(常駐時のみ)
+		if not self.daemon:
+			raise Exception('ERROR: printRaw requires daemon mode')
+		if self.glyphs is None and self.fonts is not None:
+			self.setFonts(self.fonts)					# レベルメータ用フォントに置き換わっていた時
+		return self.send('\x1br' + str(y) + ' ' + bytes(data[0:self.width]).hex())
+
+	def printTrack(self, db, num):						# Jukebox の曲番号からアーティスト・曲名を表示
+		import music_index								# 同じフォルダの楽曲メタデータ索引
+		index = music_index.MusicIndex(db)
+		track = index.get(num)
+		index.close()
+		if track is None:
+			raise Exception('ERROR: track ' + str(num))
+		self.print(track['artist'] or 'Jukebox_File' + str(num))
+		self.print(track['title'] or 'no title', y=2)
+		return track['path']
+
 	def __del__(self):									# インスタンスの削除
+		self.close()
 		if self.restoreUsedGpio and self.reset_port > 0:
 			print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), end=' ') # 日時
 			print('LCD restore GPIO'+str(self.reset_port), 'to free')
@@ -114,9 +239,29 @@ class RaspiLcd:
 		if sys.meta_path is not None:
 			print(datetime.datetime.today().strftime('%Y/%m/%d %H:%M:%S'), 'LCD Done')
 
+def fps(n=100):											# printBar の表示速度を測定する
+	res = []
+	for daemon in [False, True]:
+		raspiLcd = RaspiLcd(ignoreError=True,x=16,reset=16,daemon=daemon)
+		raspiLcd.printBar([0, 0])						# 初期化・フォント転送
+		t = time()
+		for i in range(n):
+			raspiLcd.printBar([i % 101, 100 - i % 101])
+		res.append(n / (time() - t))
+		raspiLcd.close()
+	print('printBar fps: subprocess =', round(res[0], 1), ', daemon =', round(res[1], 1))
+	return res
+
 def main():
 	s = ''
-	raspiLcd = RaspiLcd(ignoreError=True,x=16,reset=16) # raspiLcdの生成
+	if len(sys.argv) >= 2 and sys.argv[1] == '--fps':
+		fps()
+		return
+	if len(sys.argv) >= 4 and sys.argv[1] == '--track' and sys.argv[3].isnumeric():
+		raspiLcd = RaspiLcd(ignoreError=True,x=16,reset=16)
+		print(raspiLcd.printTrack(sys.argv[2], int(sys.argv[3])))	# 曲のパスを表示
+		return
+	raspiLcd = RaspiLcd(ignoreError=True,x=16,reset=16,verbose=True) # raspiLcdの生成
 	if len(sys.argv) >= 2 and sys.argv[1].isnumeric():
 		s = [int(sys.argv[1])]
 		if len(sys.argv) >= 3 and sys.argv[2].isnumeric():